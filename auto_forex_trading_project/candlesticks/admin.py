@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import Candlestick
+from .models import Bi5File, Candlestick, DirtyRange, IngestedDay, Prediction, TimeframeWatermark
 
 # Register your models here.
 admin.site.register(Candlestick)
+admin.site.register(Prediction)
+admin.site.register(Bi5File)
+admin.site.register(IngestedDay)
+admin.site.register(DirtyRange)
+admin.site.register(TimeframeWatermark)
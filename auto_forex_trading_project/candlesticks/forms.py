@@ -1,6 +1,7 @@
 from django import forms
 from .models import Candlestick
 from datetime import timedelta
+from utils.psql import get_period
 
 from uuid import UUID
 
@@ -27,6 +28,13 @@ period_input_attrs = {
     'class': 'form-control',
 }
 
+custom_period_input_attrs = {
+    'class': 'form-control',
+    'type': 'text',
+    'autocomplete': 'off',
+    'placeholder': 'e.g. H2, D3'
+}
+
 source_input_attrs = {
     'class': 'form-control',
 }
@@ -49,6 +57,7 @@ class HistoryForm(forms.Form):
     date_from = forms.DateTimeField(input_formats=['%d/%m/%Y'], widget=forms.DateTimeInput(attrs=date_from_input_attrs))
     date_before = forms.DateTimeField(input_formats=['%d/%m/%Y'], widget=forms.DateTimeInput(attrs=date_before_input_attrs))
     period = forms.TypedChoiceField(choices=Candlestick.PERIODS, widget=forms.Select(attrs=period_input_attrs), coerce=int)
+    custom_period = forms.CharField(required=False, max_length=8, widget=forms.TextInput(attrs=custom_period_input_attrs))
     price_type = forms.ChoiceField(choices=Candlestick.PRICE_TYPES, widget=forms.Select(attrs=price_type_input_attrs))
     source = forms.ChoiceField(choices=Candlestick.SOURCES, widget=forms.Select(attrs=source_input_attrs))
 
@@ -59,6 +68,18 @@ class HistoryForm(forms.Form):
         if not (date_from < date_before):
             raise forms.ValidationError('Start time must be before end time.')
         cleaned_data['date_before'] += timedelta(microseconds=-1)
+
+        # custom period overrides period, it is kept only if it is not stored in database
+        custom_period = cleaned_data.get('custom_period', '').upper()
+        if custom_period:
+            try:
+                minutes = get_period(custom_period)[0]
+            except ValueError:
+                raise forms.ValidationError('Invalid custom period.')
+            if any(value == minutes for value, _ in Candlestick.PERIODS):
+                cleaned_data['period'] = minutes
+                custom_period = ''
+        cleaned_data['custom_period'] = custom_period
         return cleaned_data
 
 
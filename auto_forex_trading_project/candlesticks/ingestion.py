@@ -0,0 +1,138 @@
+from .manifest import record_ingestion
+from .timeframes import record_dirty_range, update_timeframes
+
+from datetime import datetime
+from django.db import connection, connections, transaction
+from utils.bi5 import columns_to_rows, read_candles
+from utils.constants import PIPETTE_SCALES
+from utils.dukascopy import get_save_path
+from utils.psql import copy_candlesticks
+
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+'''
+Process-pool ingestion runner
+
+Decompression, decoding and resampling are CPU-bound, so threads of one process are serialized by the GIL.
+Work is sharded into up to DAYS_PER_SHARD days of one (symbol, price_type) and run by a pool of processes sized to the machine.
+Every worker opens its own database connection, and writes the M1 bars of a shard by one bulk write.
+'''
+
+# days of one series ingested and committed together
+DAYS_PER_SHARD = 31
+
+# seconds between progress lines
+REPORT_INTERVAL = 10
+
+
+def shard_bi5_files(bi5_files, days_per_shard=DAYS_PER_SHARD):
+    # group files by series, and split each series into runs of at most days_per_shard files in date order
+    series_to_files = {}
+    for bi5_file in bi5_files:
+        series_to_files.setdefault((bi5_file.symbol, bi5_file.price_type), []).append(bi5_file)
+
+    shards = []
+    for files in series_to_files.values():
+        files.sort(key=lambda bi5_file: bi5_file.date)
+        shards += [files[i:i + days_per_shard] for i in range(0, len(files), days_per_shard)]
+    return shards
+
+
+def ingest_bi5_files(bi5_files, data_root, source='Dukascopy'):
+    '''
+    Write M1 bars of bi5 files of one series. Return (number of files, number of bars, number of bytes read)
+    Bars, coverage and dirty range are committed together, so that an interrupted run is re-ingested next time
+    '''
+    period = 1  # minute bars are expected
+    symbol, price_type = bi5_files[0].symbol, bi5_files[0].price_type
+
+    rows = []
+    number_of_bars = []
+    for bi5_file in bi5_files:
+        start_datetime = datetime.combine(bi5_file.date, datetime.min.time())
+        columns = read_candles(get_save_path(data_root, symbol, bi5_file.date, price_type), start_datetime, PIPETTE_SCALES[symbol])
+        rows += columns_to_rows(columns, symbol, period, source, price_type)
+        number_of_bars.append(len(columns['time']))
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            changed_times = copy_candlesticks(cursor, rows, returning=True)
+        record_dirty_range(symbol, price_type, changed_times, source=source)
+        for bi5_file, n in zip(bi5_files, number_of_bars):
+            record_ingestion(bi5_file, n, source=source)
+
+    return len(bi5_files), len(rows), sum(bi5_file.size for bi5_file in bi5_files)
+
+
+def update_timeframes_of_series(symbol, price_type, source='Dukascopy'):
+    # same result shape as ingest_bi5_files, so that both run by run_in_process_pool
+    with connection.cursor() as cursor:
+        number_of_bars = update_timeframes(cursor, symbol, price_type, source=source)
+    return 1, number_of_bars, 0
+
+
+class ProgressReport:
+    '''
+    Print units done, bars written and throughput every `interval` seconds, and a summary at the end
+    '''
+    def __init__(self, label, total, interval=REPORT_INTERVAL):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.units = 0
+        self.bars = 0
+        self.size = 0
+        self.errors = 0
+        self.started_at = self.reported_at = time.perf_counter()
+
+    def update(self, units, bars, size):
+        self.units += units
+        self.bars += bars
+        self.size += size
+        if time.perf_counter() - self.reported_at >= self.interval:
+            self.report()
+
+    def report(self):
+        self.reported_at = time.perf_counter()
+        elapsed = max(self.reported_at - self.started_at, 1e-9)
+        eta = (self.total - self.units) * elapsed / self.units if self.units else float('nan')
+        print(f'{self.label}: {self.units}/{self.total} done, {self.errors} errors, {self.bars} bars in {elapsed:.1f}s '
+              f'({self.bars / elapsed:,.0f} bars/s, {self.size / elapsed / 2 ** 20:.2f} MiB/s), ETA {eta:.0f}s', flush=True)
+
+
+def run_in_process_pool(function, jobs, total, label, max_workers=None):
+    '''
+    Run function(*job) of every job in a pool of processes. function returns (units, bars, size) for the report
+    Return ProgressReport of the run. A failed job is reported and left for the next run.
+    '''
+    # workers are forked with Django set up already, and must not share the connection of the parent
+    connections.close_all()
+
+    progress = ProgressReport(label, total)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                                mp_context=multiprocessing.get_context('fork')) as executor:
+        future_to_job = {executor.submit(function, *job): job for job in jobs}
+        for future in concurrent.futures.as_completed(future_to_job):
+            try:
+                progress.update(*future.result())
+            except Exception as e:
+                progress.errors += 1
+                print(f'{label}: {future_to_job[future]!r} failed: {e!r}', flush=True)
+
+    progress.report()
+    return progress
+
+
+def ingest_in_parallel(bi5_files, data_root, source='Dukascopy', max_workers=None, days_per_shard=DAYS_PER_SHARD):
+    shards = shard_bi5_files(bi5_files, days_per_shard)
+    return run_in_process_pool(ingest_bi5_files, [(shard, data_root, source) for shard in shards],
+                               total=len(bi5_files), label='ingestion', max_workers=max_workers)
+
+
+def update_timeframes_in_parallel(symbols, price_types, source='Dukascopy', max_workers=None):
+    jobs = [(symbol, price_type, source) for price_type in price_types for symbol in symbols]
+    return run_in_process_pool(update_timeframes_of_series, jobs,
+                               total=len(jobs), label='timeframes', max_workers=max_workers)
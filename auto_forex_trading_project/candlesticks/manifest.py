@@ -0,0 +1,79 @@
+from .models import Bi5File, IngestedDay
+
+from datetime import date, timedelta
+from django.db.models import Q
+
+import hashlib
+
+'''
+Planner of downloads and ingestion based on the manifest of local bi5 archive
+
+Bi5File records every downloaded file with its size and hash, and dates which source has no data of.
+IngestedDay records which file content the M1 bars of a (symbol, price_type, date) were written from.
+Planning is then a few indexed queries instead of walking the archive and re-ingesting every day.
+'''
+
+# source may publish a date late, so dates without data are asked again for a while
+RECHECK_MISSING_DAYS = 7
+
+
+def get_file_digest(path):
+    with open(path, 'rb') as f:
+        content = f.read()
+    return len(content), hashlib.sha256(content).hexdigest()
+
+
+def plan_downloads(symbols, price_types, dates):
+    # return (symbol, date, price_type) jobs not in the manifest yet
+    dates = sorted(dates)
+    if not dates:
+        return []
+
+    recheck_from = date.today() - timedelta(days=RECHECK_MISSING_DAYS)
+    query_results = Bi5File.objects.filter(Q(size__isnull=False) | Q(date__lt=recheck_from),
+                                           symbol__in=symbols,
+                                           price_type__in=price_types,
+                                           date__range=(dates[0], dates[-1]),
+                                           )
+    known_jobs = set(query_results.values_list('symbol', 'date', 'price_type'))
+
+    return [(symbol, d, price_type) for d in dates for price_type in price_types for symbol in symbols
+            if (symbol, d, price_type) not in known_jobs]
+
+
+def record_downloads(jobs, paths, missing_jobs=()):
+    # paths are results of DukascopyDownloader.download(jobs), None for jobs without a file
+    for (symbol, d, price_type), path in zip(jobs, paths):
+        if path is None:
+            continue
+
+        size, sha256 = get_file_digest(path)
+        Bi5File.objects.update_or_create(symbol=symbol, date=d, price_type=price_type,
+                                         defaults={'size': size, 'sha256': sha256})
+
+    for symbol, d, price_type in missing_jobs:
+        Bi5File.objects.update_or_create(symbol=symbol, date=d, price_type=price_type,
+                                         defaults={'size': None, 'sha256': ''})
+
+
+def plan_ingestion(symbols, price_types, dates, source='Dukascopy'):
+    # return Bi5File of files never ingested, or ingested from a different content
+    dates = sorted(dates)
+    if not dates:
+        return []
+
+    query_filter = {'symbol__in': symbols,
+                    'price_type__in': price_types,
+                    'date__range': (dates[0], dates[-1]),
+                    }
+    ingested_hashes = {(symbol, d, price_type): sha256 for symbol, d, price_type, sha256 in
+                       IngestedDay.objects.filter(source=source, **query_filter).values_list('symbol', 'date', 'price_type', 'sha256')}
+
+    dates = set(dates)
+    return [bi5_file for bi5_file in Bi5File.objects.filter(size__isnull=False, **query_filter).order_by('date', 'price_type', 'symbol')
+            if bi5_file.date in dates and ingested_hashes.get((bi5_file.symbol, bi5_file.date, bi5_file.price_type)) != bi5_file.sha256]
+
+
+def record_ingestion(bi5_file, number_of_bars, source='Dukascopy'):
+    IngestedDay.objects.update_or_create(symbol=bi5_file.symbol, date=bi5_file.date, price_type=bi5_file.price_type, source=source,
+                                         defaults={'sha256': bi5_file.sha256, 'number_of_bars': number_of_bars})
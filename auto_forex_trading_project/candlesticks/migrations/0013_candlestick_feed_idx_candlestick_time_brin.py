@@ -0,0 +1,26 @@
+# Generated by Django 4.0.4 on 2026-10-18 10:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # indexes are built concurrently, so the table keeps serving reads and writes
+    atomic = False
+
+    dependencies = [
+        ('candlesticks', '0012_candlestick_predicted_volume_alter_candlestick_close_and_more'),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name='candlestick',
+            index=models.Index(condition=models.Q(('volume__gt', 0)), fields=['symbol', 'period', 'price_type', 'source', 'time'], include=('open', 'high', 'low', 'close', 'volume'), name='candlestick_feed_idx'),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name='candlestick',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['time'], name='candlestick_time_brin'),
+        ),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 4.0.4 on 2026-10-18 11:03
+
+from django.db import migrations
+
+'''
+Convert candlesticks_candlestick into a table partitioned by LIST (period)
+M1 bars, which are the overwhelming majority of rows, are further partitioned by RANGE (time) per year
+
+Django model state is unchanged, but the primary key has to include the partition keys,
+so it becomes (id, period, time). The unique constraint already contains both partition keys.
+'''
+
+TABLE_NAME = 'candlesticks_candlestick'
+OLD_TABLE_NAME = 'candlesticks_candlestick_unpartitioned'
+
+PERIOD_PARTITIONS = {
+    'tick': 0,
+    'm5': 5,
+    'm15': 15,
+    'm30': 30,
+    'h1': 60,
+    'h4': 240,
+    'd1': 1440,
+    'w1': 10080,
+    'mn': 43200,
+}
+
+M1_FIRST_YEAR = 2003  # first year of Dukascopy data
+M1_LAST_YEAR = 2035  # later bars go to the default partition of M1
+
+INDEXES_SQL = f'''
+CREATE INDEX candlestick_feed_idx ON {TABLE_NAME} (symbol, period, price_type, source, time)
+    INCLUDE (open, high, low, close, volume) WHERE volume > 0;
+CREATE INDEX candlestick_time_brin ON {TABLE_NAME} USING BRIN (time);
+'''
+
+
+def partition_sql():
+    statements = [
+        # free the names used by Django state for the new table
+        f'ALTER TABLE {TABLE_NAME} RENAME TO {OLD_TABLE_NAME};',
+        f'ALTER TABLE {OLD_TABLE_NAME} RENAME CONSTRAINT {TABLE_NAME}_pkey TO {OLD_TABLE_NAME}_pkey;',
+        f'ALTER TABLE {OLD_TABLE_NAME} RENAME CONSTRAINT one_candlestick_per_timeframe_per_source TO one_candlestick_per_timeframe_per_source_old;',
+        'ALTER INDEX candlestick_feed_idx RENAME TO candlestick_feed_idx_old;',
+        'ALTER INDEX candlestick_time_brin RENAME TO candlestick_time_brin_old;',
+
+        f'''CREATE TABLE {TABLE_NAME} (
+            LIKE {OLD_TABLE_NAME} INCLUDING DEFAULTS INCLUDING STORAGE,
+            CONSTRAINT {TABLE_NAME}_pkey PRIMARY KEY (id, period, time),
+            CONSTRAINT one_candlestick_per_timeframe_per_source UNIQUE (symbol, time, period, price_type, source)
+        ) PARTITION BY LIST (period);''',
+
+        # keep the id sequence alive after the old table is dropped
+        f'ALTER SEQUENCE {TABLE_NAME}_id_seq OWNED BY {TABLE_NAME}.id;',
+    ]
+
+    for name, period in PERIOD_PARTITIONS.items():
+        statements.append(f'CREATE TABLE {TABLE_NAME}_{name} PARTITION OF {TABLE_NAME} FOR VALUES IN ({period});')
+
+    statements.append(f'CREATE TABLE {TABLE_NAME}_m1 PARTITION OF {TABLE_NAME} FOR VALUES IN (1) PARTITION BY RANGE (time);')
+    for year in range(M1_FIRST_YEAR, M1_LAST_YEAR + 1):
+        statements.append(f'CREATE TABLE {TABLE_NAME}_m1_{year} PARTITION OF {TABLE_NAME}_m1 '
+                          f'FOR VALUES FROM (\'{year}-01-01\') TO (\'{year + 1}-01-01\');')
+    statements.append(f'CREATE TABLE {TABLE_NAME}_m1_default PARTITION OF {TABLE_NAME}_m1 DEFAULT;')
+    statements.append(f'CREATE TABLE {TABLE_NAME}_default PARTITION OF {TABLE_NAME} DEFAULT;')
+
+    statements += [
+        INDEXES_SQL,
+        f'INSERT INTO {TABLE_NAME} SELECT * FROM {OLD_TABLE_NAME};',
+        f'DROP TABLE {OLD_TABLE_NAME};',
+        f'ANALYZE {TABLE_NAME};',
+    ]
+
+    return '\n'.join(statements)
+
+
+def unpartition_sql():
+    statements = [
+        f'ALTER TABLE {TABLE_NAME} RENAME TO {OLD_TABLE_NAME};',
+        f'ALTER TABLE {OLD_TABLE_NAME} RENAME CONSTRAINT {TABLE_NAME}_pkey TO {OLD_TABLE_NAME}_pkey;',
+        f'ALTER TABLE {OLD_TABLE_NAME} RENAME CONSTRAINT one_candlestick_per_timeframe_per_source TO one_candlestick_per_timeframe_per_source_old;',
+        'ALTER INDEX candlestick_feed_idx RENAME TO candlestick_feed_idx_old;',
+        'ALTER INDEX candlestick_time_brin RENAME TO candlestick_time_brin_old;',
+
+        f'''CREATE TABLE {TABLE_NAME} (
+            LIKE {OLD_TABLE_NAME} INCLUDING DEFAULTS INCLUDING STORAGE,
+            CONSTRAINT {TABLE_NAME}_pkey PRIMARY KEY (id),
+            CONSTRAINT one_candlestick_per_timeframe_per_source UNIQUE (symbol, time, period, price_type, source)
+        );''',
+        f'ALTER SEQUENCE {TABLE_NAME}_id_seq OWNED BY {TABLE_NAME}.id;',
+
+        INDEXES_SQL,
+        f'INSERT INTO {TABLE_NAME} SELECT * FROM {OLD_TABLE_NAME};',
+        f'DROP TABLE {OLD_TABLE_NAME};',
+        f'ANALYZE {TABLE_NAME};',
+    ]
+
+    return '\n'.join(statements)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candlesticks', '0013_candlestick_feed_idx_candlestick_time_brin'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=partition_sql(), reverse_sql=unpartition_sql()),
+    ]
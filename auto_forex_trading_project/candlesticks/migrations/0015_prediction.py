@@ -0,0 +1,91 @@
+# Generated by Django 4.0.4 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+PREDICTION_FIELDS = ('predicted_open', 'predicted_high', 'predicted_low', 'predicted_close', 'predicted_volume')
+
+
+def move_predictions_out_of_candlesticks(apps, schema_editor):
+    Candlestick = apps.get_model('candlesticks', 'Candlestick')
+    Prediction = apps.get_model('candlesticks', 'Prediction')
+
+    query_results = Candlestick.objects.filter(predicted_volume__isnull=False)
+    Prediction.objects.bulk_create(
+        (Prediction(symbol=candlestick.symbol,
+                    time=candlestick.time,
+                    period=candlestick.period,
+                    source=candlestick.source,
+                    price_type=candlestick.price_type,
+                    **{field: getattr(candlestick, field) for field in PREDICTION_FIELDS})
+         for candlestick in query_results.iterator()),
+        batch_size=1000,
+    )
+
+    # rows of future bars created only to hold predictions
+    query_results.filter(volume__isnull=True).delete()
+
+
+def move_predictions_into_candlesticks(apps, schema_editor):
+    Candlestick = apps.get_model('candlesticks', 'Candlestick')
+    Prediction = apps.get_model('candlesticks', 'Prediction')
+
+    for prediction in Prediction.objects.iterator():
+        Candlestick.objects.update_or_create(symbol=prediction.symbol,
+                                             time=prediction.time,
+                                             period=prediction.period,
+                                             source=prediction.source,
+                                             price_type=prediction.price_type,
+                                             defaults={field: getattr(prediction, field) for field in PREDICTION_FIELDS},
+                                             )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candlesticks', '0014_partition_candlestick_by_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Prediction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(choices=[('EURUSD', 'EURUSD'), ('USDJPY', 'USDJPY'), ('GBPUSD', 'GBPUSD'), ('AUDUSD', 'AUDUSD'), ('USDCAD', 'USDCAD'), ('USDCHF', 'USDCHF'), ('NZDUSD', 'NZDUSD'), ('EURJPY', 'EURJPY'), ('GBPJPY', 'GBPJPY'), ('EURGBP', 'EURGBP'), ('AUDJPY', 'AUDJPY'), ('EURAUD', 'EURAUD'), ('EURCHF', 'EURCHF'), ('AUDNZD', 'AUDNZD'), ('NZDJPY', 'NZDJPY'), ('GBPAUD', 'GBPAUD'), ('GBPCAD', 'GBPCAD'), ('EURNZD', 'EURNZD'), ('AUDCAD', 'AUDCAD'), ('GBPCHF', 'GBPCHF'), ('AUDCHF', 'AUDCHF'), ('EURCAD', 'EURCAD'), ('CADJPY', 'CADJPY'), ('GBPNZD', 'GBPNZD'), ('CADCHF', 'CADCHF'), ('CHFJPY', 'CHFJPY'), ('NZDCAD', 'NZDCAD'), ('NZDCHF', 'NZDCHF')], default='EURUSD', max_length=6, verbose_name='Symbol')),
+                ('time', models.DateTimeField(verbose_name='Datetime')),
+                ('period', models.IntegerField(choices=[(0, 'Tick'), (1, 'M1'), (5, 'M5'), (15, 'M15'), (30, 'M30'), (60, 'H1'), (240, 'H4'), (1440, 'D1'), (10080, 'W1'), (43200, 'MN')], default=1440, verbose_name='Period')),
+                ('source', models.CharField(choices=[('Dukascopy', 'Dukascopy'), ('Pandas', 'Pandas')], default='Dukascopy', max_length=16, verbose_name='Source')),
+                ('price_type', models.CharField(choices=[('BID', 'Bid'), ('ASK', 'Ask')], default='BID', max_length=3, verbose_name='Price type')),
+                ('model_version', models.CharField(default='day_bar_predict_5_bar_training_lr_0.005', max_length=64, verbose_name='Model version')),
+                ('predicted_open', models.FloatField(blank=True, default=None, null=True, verbose_name='Predicted Open')),
+                ('predicted_high', models.FloatField(blank=True, default=None, null=True, verbose_name='Predicted High')),
+                ('predicted_low', models.FloatField(blank=True, default=None, null=True, verbose_name='Predicted Low')),
+                ('predicted_close', models.FloatField(blank=True, default=None, null=True, verbose_name='Predicted Close')),
+                ('predicted_volume', models.FloatField(blank=True, default=None, null=True, verbose_name='Predicted Volume (M)')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='prediction',
+            constraint=models.UniqueConstraint(fields=('symbol', 'period', 'price_type', 'source', 'time', 'model_version'), name='one_prediction_per_timeframe_per_model'),
+        ),
+        migrations.RunPython(move_predictions_out_of_candlesticks, move_predictions_into_candlesticks),
+        migrations.RemoveField(
+            model_name='candlestick',
+            name='predicted_close',
+        ),
+        migrations.RemoveField(
+            model_name='candlestick',
+            name='predicted_high',
+        ),
+        migrations.RemoveField(
+            model_name='candlestick',
+            name='predicted_low',
+        ),
+        migrations.RemoveField(
+            model_name='candlestick',
+            name='predicted_open',
+        ),
+        migrations.RemoveField(
+            model_name='candlestick',
+            name='predicted_volume',
+        ),
+    ]
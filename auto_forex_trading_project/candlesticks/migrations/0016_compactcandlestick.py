@@ -0,0 +1,34 @@
+# Generated by Django 4.0.4 on 2026-10-18 17:17
+
+import candlesticks.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candlesticks', '0015_prediction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompactCandlestick',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute', models.IntegerField(verbose_name='Minutes since epoch')),
+                ('open_pipettes', models.IntegerField(verbose_name='Open (pipettes)')),
+                ('high_pipettes', models.IntegerField(verbose_name='High (pipettes)')),
+                ('low_pipettes', models.IntegerField(verbose_name='Low (pipettes)')),
+                ('close_pipettes', models.IntegerField(verbose_name='Close (pipettes)')),
+                ('volume', candlesticks.models.RealField(verbose_name='Volume (M)')),
+                ('period', models.IntegerField(choices=[(0, 'Tick'), (1, 'M1'), (5, 'M5'), (15, 'M15'), (30, 'M30'), (60, 'H1'), (240, 'H4'), (1440, 'D1'), (10080, 'W1'), (43200, 'MN')], default=0, verbose_name='Period')),
+                ('symbol', models.CharField(choices=[('EURUSD', 'EURUSD'), ('USDJPY', 'USDJPY'), ('GBPUSD', 'GBPUSD'), ('AUDUSD', 'AUDUSD'), ('USDCAD', 'USDCAD'), ('USDCHF', 'USDCHF'), ('NZDUSD', 'NZDUSD'), ('EURJPY', 'EURJPY'), ('GBPJPY', 'GBPJPY'), ('EURGBP', 'EURGBP'), ('AUDJPY', 'AUDJPY'), ('EURAUD', 'EURAUD'), ('EURCHF', 'EURCHF'), ('AUDNZD', 'AUDNZD'), ('NZDJPY', 'NZDJPY'), ('GBPAUD', 'GBPAUD'), ('GBPCAD', 'GBPCAD'), ('EURNZD', 'EURNZD'), ('AUDCAD', 'AUDCAD'), ('GBPCHF', 'GBPCHF'), ('AUDCHF', 'AUDCHF'), ('EURCAD', 'EURCAD'), ('CADJPY', 'CADJPY'), ('GBPNZD', 'GBPNZD'), ('CADCHF', 'CADCHF'), ('CHFJPY', 'CHFJPY'), ('NZDCAD', 'NZDCAD'), ('NZDCHF', 'NZDCHF')], default='EURUSD', max_length=6, verbose_name='Symbol')),
+                ('source', models.CharField(choices=[('Dukascopy', 'Dukascopy'), ('Pandas', 'Pandas')], default='Dukascopy', max_length=16, verbose_name='Source')),
+                ('price_type', models.CharField(choices=[('BID', 'Bid'), ('ASK', 'Ask')], default='BID', max_length=3, verbose_name='Price type')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='compactcandlestick',
+            constraint=models.UniqueConstraint(fields=('symbol', 'period', 'price_type', 'source', 'minute'), include=('open_pipettes', 'high_pipettes', 'low_pipettes', 'close_pipettes', 'volume'), name='one_compact_candlestick_per_timeframe_per_source'),
+        ),
+    ]
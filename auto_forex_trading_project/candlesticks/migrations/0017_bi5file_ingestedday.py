@@ -0,0 +1,46 @@
+# Generated by Django 4.0.4 on 2026-10-18 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candlesticks', '0016_compactcandlestick'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Bi5File',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(choices=[('EURUSD', 'EURUSD'), ('USDJPY', 'USDJPY'), ('GBPUSD', 'GBPUSD'), ('AUDUSD', 'AUDUSD'), ('USDCAD', 'USDCAD'), ('USDCHF', 'USDCHF'), ('NZDUSD', 'NZDUSD'), ('EURJPY', 'EURJPY'), ('GBPJPY', 'GBPJPY'), ('EURGBP', 'EURGBP'), ('AUDJPY', 'AUDJPY'), ('EURAUD', 'EURAUD'), ('EURCHF', 'EURCHF'), ('AUDNZD', 'AUDNZD'), ('NZDJPY', 'NZDJPY'), ('GBPAUD', 'GBPAUD'), ('GBPCAD', 'GBPCAD'), ('EURNZD', 'EURNZD'), ('AUDCAD', 'AUDCAD'), ('GBPCHF', 'GBPCHF'), ('AUDCHF', 'AUDCHF'), ('EURCAD', 'EURCAD'), ('CADJPY', 'CADJPY'), ('GBPNZD', 'GBPNZD'), ('CADCHF', 'CADCHF'), ('CHFJPY', 'CHFJPY'), ('NZDCAD', 'NZDCAD'), ('NZDCHF', 'NZDCHF')], default='EURUSD', max_length=6, verbose_name='Symbol')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('price_type', models.CharField(choices=[('BID', 'Bid'), ('ASK', 'Ask')], default='BID', max_length=3, verbose_name='Price type')),
+                ('size', models.IntegerField(blank=True, default=None, null=True, verbose_name='Size (bytes)')),
+                ('sha256', models.CharField(blank=True, default='', max_length=64, verbose_name='SHA-256')),
+                ('downloaded_at', models.DateTimeField(auto_now=True, verbose_name='Downloaded at')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IngestedDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(choices=[('EURUSD', 'EURUSD'), ('USDJPY', 'USDJPY'), ('GBPUSD', 'GBPUSD'), ('AUDUSD', 'AUDUSD'), ('USDCAD', 'USDCAD'), ('USDCHF', 'USDCHF'), ('NZDUSD', 'NZDUSD'), ('EURJPY', 'EURJPY'), ('GBPJPY', 'GBPJPY'), ('EURGBP', 'EURGBP'), ('AUDJPY', 'AUDJPY'), ('EURAUD', 'EURAUD'), ('EURCHF', 'EURCHF'), ('AUDNZD', 'AUDNZD'), ('NZDJPY', 'NZDJPY'), ('GBPAUD', 'GBPAUD'), ('GBPCAD', 'GBPCAD'), ('EURNZD', 'EURNZD'), ('AUDCAD', 'AUDCAD'), ('GBPCHF', 'GBPCHF'), ('AUDCHF', 'AUDCHF'), ('EURCAD', 'EURCAD'), ('CADJPY', 'CADJPY'), ('GBPNZD', 'GBPNZD'), ('CADCHF', 'CADCHF'), ('CHFJPY', 'CHFJPY'), ('NZDCAD', 'NZDCAD'), ('NZDCHF', 'NZDCHF')], default='EURUSD', max_length=6, verbose_name='Symbol')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('source', models.CharField(choices=[('Dukascopy', 'Dukascopy'), ('Pandas', 'Pandas')], default='Dukascopy', max_length=16, verbose_name='Source')),
+                ('price_type', models.CharField(choices=[('BID', 'Bid'), ('ASK', 'Ask')], default='BID', max_length=3, verbose_name='Price type')),
+                ('sha256', models.CharField(blank=True, default='', max_length=64, verbose_name='SHA-256')),
+                ('number_of_bars', models.IntegerField(default=0, verbose_name='Number of bars')),
+                ('ingested_at', models.DateTimeField(auto_now=True, verbose_name='Ingested at')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ingestedday',
+            constraint=models.UniqueConstraint(fields=('symbol', 'price_type', 'source', 'date'), name='one_ingested_day_per_source'),
+        ),
+        migrations.AddConstraint(
+            model_name='bi5file',
+            constraint=models.UniqueConstraint(fields=('symbol', 'price_type', 'date'), name='one_bi5_file_per_date'),
+        ),
+    ]
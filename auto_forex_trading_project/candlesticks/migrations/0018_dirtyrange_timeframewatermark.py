@@ -0,0 +1,42 @@
+# Generated by Django 4.0.4 on 2026-10-18 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candlesticks', '0017_bi5file_ingestedday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyRange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(choices=[('EURUSD', 'EURUSD'), ('USDJPY', 'USDJPY'), ('GBPUSD', 'GBPUSD'), ('AUDUSD', 'AUDUSD'), ('USDCAD', 'USDCAD'), ('USDCHF', 'USDCHF'), ('NZDUSD', 'NZDUSD'), ('EURJPY', 'EURJPY'), ('GBPJPY', 'GBPJPY'), ('EURGBP', 'EURGBP'), ('AUDJPY', 'AUDJPY'), ('EURAUD', 'EURAUD'), ('EURCHF', 'EURCHF'), ('AUDNZD', 'AUDNZD'), ('NZDJPY', 'NZDJPY'), ('GBPAUD', 'GBPAUD'), ('GBPCAD', 'GBPCAD'), ('EURNZD', 'EURNZD'), ('AUDCAD', 'AUDCAD'), ('GBPCHF', 'GBPCHF'), ('AUDCHF', 'AUDCHF'), ('EURCAD', 'EURCAD'), ('CADJPY', 'CADJPY'), ('GBPNZD', 'GBPNZD'), ('CADCHF', 'CADCHF'), ('CHFJPY', 'CHFJPY'), ('NZDCAD', 'NZDCAD'), ('NZDCHF', 'NZDCHF')], default='EURUSD', max_length=6, verbose_name='Symbol')),
+                ('source', models.CharField(choices=[('Dukascopy', 'Dukascopy'), ('Pandas', 'Pandas')], default='Dukascopy', max_length=16, verbose_name='Source')),
+                ('price_type', models.CharField(choices=[('BID', 'Bid'), ('ASK', 'Ask')], default='BID', max_length=3, verbose_name='Price type')),
+                ('time_from', models.DateTimeField(verbose_name='From')),
+                ('time_before', models.DateTimeField(verbose_name='Before')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TimeframeWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(choices=[('EURUSD', 'EURUSD'), ('USDJPY', 'USDJPY'), ('GBPUSD', 'GBPUSD'), ('AUDUSD', 'AUDUSD'), ('USDCAD', 'USDCAD'), ('USDCHF', 'USDCHF'), ('NZDUSD', 'NZDUSD'), ('EURJPY', 'EURJPY'), ('GBPJPY', 'GBPJPY'), ('EURGBP', 'EURGBP'), ('AUDJPY', 'AUDJPY'), ('EURAUD', 'EURAUD'), ('EURCHF', 'EURCHF'), ('AUDNZD', 'AUDNZD'), ('NZDJPY', 'NZDJPY'), ('GBPAUD', 'GBPAUD'), ('GBPCAD', 'GBPCAD'), ('EURNZD', 'EURNZD'), ('AUDCAD', 'AUDCAD'), ('GBPCHF', 'GBPCHF'), ('AUDCHF', 'AUDCHF'), ('EURCAD', 'EURCAD'), ('CADJPY', 'CADJPY'), ('GBPNZD', 'GBPNZD'), ('CADCHF', 'CADCHF'), ('CHFJPY', 'CHFJPY'), ('NZDCAD', 'NZDCAD'), ('NZDCHF', 'NZDCHF')], default='EURUSD', max_length=6, verbose_name='Symbol')),
+                ('source', models.CharField(choices=[('Dukascopy', 'Dukascopy'), ('Pandas', 'Pandas')], default='Dukascopy', max_length=16, verbose_name='Source')),
+                ('price_type', models.CharField(choices=[('BID', 'Bid'), ('ASK', 'Ask')], default='BID', max_length=3, verbose_name='Price type')),
+                ('time', models.DateTimeField(blank=True, default=None, null=True, verbose_name='Datetime')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='timeframewatermark',
+            constraint=models.UniqueConstraint(fields=('symbol', 'price_type', 'source'), name='one_watermark_per_series'),
+        ),
+        migrations.AddIndex(
+            model_name='dirtyrange',
+            index=models.Index(fields=['symbol', 'price_type', 'source'], name='dirty_range_series_idx'),
+        ),
+    ]
@@ -1,4 +1,15 @@
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
+from django.utils import timezone
+from utils.constants import PIPETTE_SCALES
+
+
+class RealField(models.FloatField):
+    # single precision float, i.e. float4 in PSQL
+    def db_type(self, connection):
+        return 'real'
 
 
 class Candlestick(models.Model):
@@ -86,6 +97,40 @@ class Candlestick(models.Model):
     source = models.CharField('Source', max_length=16, choices=SOURCES, default=Dukascopy)
     price_type = models.CharField('Price type', max_length=3, choices=PRICE_TYPES, default=BID)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['symbol', 'time', 'period', 'price_type', 'source'], name='one_candlestick_per_timeframe_per_source')
+        ]
+        indexes = [
+            # covering index in the column order of feed and view queries, equality columns before range column
+            models.Index(fields=['symbol', 'period', 'price_type', 'source', 'time'],
+                         include=['open', 'high', 'low', 'close', 'volume'],
+                         condition=models.Q(volume__gt=0),
+                         name='candlestick_feed_idx'),
+            # bars are appended in time order, so a tiny BRIN index is enough for time range scans
+            BrinIndex(fields=['time'], name='candlestick_time_brin'),
+        ]
+
+    def __str__(self):
+        return ''.join((self.symbol, ' ', str(self.time)))
+
+
+class Prediction(models.Model):
+    # Model version lookup variables
+    LSTM_5_BARS_LR_0_005 = 'day_bar_predict_5_bar_training_lr_0.005'
+
+    # Model version used by scripts/add_prediction.py and prediction plot
+    CURRENT_MODEL_VERSION = LSTM_5_BARS_LR_0_005
+
+    symbol = models.CharField('Symbol', max_length=6, choices=Candlestick.SYMBOLS, default=Candlestick.EURUSD)
+    time = models.DateTimeField('Datetime')
+
+    period = models.IntegerField('Period', choices=Candlestick.PERIODS, default=Candlestick.D1)
+    source = models.CharField('Source', max_length=16, choices=Candlestick.SOURCES, default=Candlestick.Dukascopy)
+    price_type = models.CharField('Price type', max_length=3, choices=Candlestick.PRICE_TYPES, default=Candlestick.BID)
+    model_version = models.CharField('Model version', max_length=64, default=CURRENT_MODEL_VERSION)
+
     predicted_open = models.FloatField('Predicted Open', null=True, blank=True, default=None)
     predicted_high = models.FloatField('Predicted High', null=True, blank=True, default=None)
     predicted_low = models.FloatField('Predicted Low', null=True, blank=True, default=None)
@@ -95,8 +140,160 @@ class Candlestick(models.Model):
     class Meta:
         constraints = [
             models.UniqueConstraint(
-                fields=['symbol', 'time', 'period', 'price_type', 'source'], name='one_candlestick_per_timeframe_per_source')
+                fields=['symbol', 'period', 'price_type', 'source', 'time', 'model_version'], name='one_prediction_per_timeframe_per_model')
         ]
 
+    def __str__(self):
+        return ''.join((self.symbol, ' ', str(self.time), ' ', self.model_version))
+
+
+class CompactCandlestick(models.Model):
+    '''
+    Compact representation of Candlestick
+    prices are stored as integer pipettes, time as integer minutes since epoch and volume as float4,
+    which are exposed back as float prices and datetime by properties
+    '''
+    # fixed width columns go first, so that no alignment padding is needed between them
+    minute = models.IntegerField('Minutes since epoch')
+
+    open_pipettes = models.IntegerField('Open (pipettes)')
+    high_pipettes = models.IntegerField('High (pipettes)')
+    low_pipettes = models.IntegerField('Low (pipettes)')
+    close_pipettes = models.IntegerField('Close (pipettes)')
+    volume = RealField('Volume (M)')
+
+    period = models.IntegerField('Period', choices=Candlestick.PERIODS, default=Candlestick.Tick)
+    symbol = models.CharField('Symbol', max_length=6, choices=Candlestick.SYMBOLS, default=Candlestick.EURUSD)
+    source = models.CharField('Source', max_length=16, choices=Candlestick.SOURCES, default=Candlestick.Dukascopy)
+    price_type = models.CharField('Price type', max_length=3, choices=Candlestick.PRICE_TYPES, default=Candlestick.BID)
+
+    class Meta:
+        constraints = [
+            # in the column order of feed queries, and covering so that they are index only scans
+            models.UniqueConstraint(
+                fields=['symbol', 'period', 'price_type', 'source', 'minute'],
+                include=['open_pipettes', 'high_pipettes', 'low_pipettes', 'close_pipettes', 'volume'],
+                name='one_compact_candlestick_per_timeframe_per_source')
+        ]
+
+    @staticmethod
+    def get_pipette_scale(symbol):
+        # same scales as compact feeds convert pipettes back to prices with
+        return PIPETTE_SCALES[symbol]
+
+    @staticmethod
+    def to_minute(bar_time):
+        # naive datetimes are in default time zone, same as how they are written to Candlestick.time
+        if timezone.is_naive(bar_time):
+            bar_time = timezone.make_aware(bar_time)
+        return int(bar_time.timestamp()) // 60
+
+    @staticmethod
+    def to_pipettes(price, scale):
+        return round(price * scale)
+
+    @property
+    def time(self):
+        bar_time = datetime.fromtimestamp(self.minute * 60, tz=dt_timezone.utc)
+        return bar_time if settings.USE_TZ else timezone.make_naive(bar_time)
+
+    @property
+    def open(self):
+        return self.open_pipettes / self.get_pipette_scale(self.symbol)
+
+    @property
+    def high(self):
+        return self.high_pipettes / self.get_pipette_scale(self.symbol)
+
+    @property
+    def low(self):
+        return self.low_pipettes / self.get_pipette_scale(self.symbol)
+
+    @property
+    def close(self):
+        return self.close_pipettes / self.get_pipette_scale(self.symbol)
+
     def __str__(self):
         return ''.join((self.symbol, ' ', str(self.time)))
+
+
+class Bi5File(models.Model):
+    '''
+    Manifest of bi5 files in local archive, size is None when source has no data of the date
+    '''
+    symbol = models.CharField('Symbol', max_length=6, choices=Candlestick.SYMBOLS, default=Candlestick.EURUSD)
+    date = models.DateField('Date')
+    price_type = models.CharField('Price type', max_length=3, choices=Candlestick.PRICE_TYPES, default=Candlestick.BID)
+
+    size = models.IntegerField('Size (bytes)', null=True, blank=True, default=None)
+    sha256 = models.CharField('SHA-256', max_length=64, blank=True, default='')
+    downloaded_at = models.DateTimeField('Downloaded at', auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['symbol', 'price_type', 'date'], name='one_bi5_file_per_date')
+        ]
+
+    def __str__(self):
+        return ''.join((self.symbol, ' ', self.price_type, ' ', str(self.date)))
+
+
+class IngestedDay(models.Model):
+    '''
+    Coverage of M1 bars written from bi5 files, with hash of the file they were decoded from
+    '''
+    symbol = models.CharField('Symbol', max_length=6, choices=Candlestick.SYMBOLS, default=Candlestick.EURUSD)
+    date = models.DateField('Date')
+    source = models.CharField('Source', max_length=16, choices=Candlestick.SOURCES, default=Candlestick.Dukascopy)
+    price_type = models.CharField('Price type', max_length=3, choices=Candlestick.PRICE_TYPES, default=Candlestick.BID)
+
+    sha256 = models.CharField('SHA-256', max_length=64, blank=True, default='')
+    number_of_bars = models.IntegerField('Number of bars', default=0)
+    ingested_at = models.DateTimeField('Ingested at', auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['symbol', 'price_type', 'source', 'date'], name='one_ingested_day_per_source')
+        ]
+
+    def __str__(self):
+        return ''.join((self.symbol, ' ', self.price_type, ' ', str(self.date)))
+
+
+class DirtyRange(models.Model):
+    '''
+    M1 bars within [time_from, time_before] were inserted or changed after longer bars were built
+    '''
+    symbol = models.CharField('Symbol', max_length=6, choices=Candlestick.SYMBOLS, default=Candlestick.EURUSD)
+    source = models.CharField('Source', max_length=16, choices=Candlestick.SOURCES, default=Candlestick.Dukascopy)
+    price_type = models.CharField('Price type', max_length=3, choices=Candlestick.PRICE_TYPES, default=Candlestick.BID)
+
+    time_from = models.DateTimeField('From')
+    time_before = models.DateTimeField('Before')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['symbol', 'price_type', 'source'], name='dirty_range_series_idx'),
+        ]
+
+    def __str__(self):
+        return ''.join((self.symbol, ' ', self.price_type, ' ', str(self.time_from), ' - ', str(self.time_before)))
+
+
+class TimeframeWatermark(models.Model):
+    '''
+    Time of the latest M1 bar aggregated into longer bars of a series
+    '''
+    symbol = models.CharField('Symbol', max_length=6, choices=Candlestick.SYMBOLS, default=Candlestick.EURUSD)
+    source = models.CharField('Source', max_length=16, choices=Candlestick.SOURCES, default=Candlestick.Dukascopy)
+    price_type = models.CharField('Price type', max_length=3, choices=Candlestick.PRICE_TYPES, default=Candlestick.BID)
+
+    time = models.DateTimeField('Datetime', null=True, blank=True, default=None)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['symbol', 'price_type', 'source'], name='one_watermark_per_series')
+        ]
+
+    def __str__(self):
+        return ''.join((self.symbol, ' ', self.price_type, ' ', str(self.time)))
@@ -1,7 +1,9 @@
+from utils.barcache import get_stats
 from utils.commissions import ForexCommission
 from utils.constants import *
 from utils.datafeeds import PSQLData
 from utils.optimizations import OptimizerCelery, CeleryCerebro
+from utils.psql import get_period, get_period_name
 from utils.strategies import MovingAveragesCrossover
 from utils.testcases import sma_testcase_generator
 
@@ -11,16 +13,18 @@ from backtrader_plotly.scheme import PlotScheme
 from celery import shared_task
 
 from datetime import datetime, date, timedelta
+import json
 import plotly.io
 
 
 @shared_task(bind=True)
-def celery_backtest(self, symbol, fromdate, todate, period, strategy, optimization=False, **parameters):
+def celery_backtest(self, symbol, fromdate, todate, period, strategy, optimization=False, engine='backtrader', **parameters):
 
     fromdate = datetime.strptime(fromdate, '%Y-%m-%dT%H:%M:%S')
     todate = datetime.strptime(todate, '%Y-%m-%dT%H:%M:%S.%f')
 
-    period, timeframe, compression, = next(((key, value[1], value[2]) for key, value in PERIODS.items() if value[0] == period), PERIODS['H1'])
+    period = get_period_name(period)
+    _, timeframe, compression, = get_period(period)
 
     cerebro = CeleryCerebro()
 
@@ -34,7 +38,8 @@ def celery_backtest(self, symbol, fromdate, todate, period, strategy, optimizati
                     timeframe=timeframe,
                     compression=compression,
                     fromdate=fromdate,
-                    todate=todate)
+                    todate=todate,
+                    cache=True)
 
     # progress_recorder = ProgressRecorder(self)
     # progress_recorder.set_progress(0, len(data))
@@ -55,7 +60,7 @@ def celery_backtest(self, symbol, fromdate, todate, period, strategy, optimizati
 
     if not optimization:
         cerebro.addstrategy(MovingAveragesCrossover, **parameters)
-        cerebro.run(runonce=False, stdstats=False)
+        cerebro.run(runonce=True, stdstats=False)
 
         scheme = PlotScheme(decimal_places=5, max_legend_text_width=16)
 
@@ -69,9 +74,17 @@ def celery_backtest(self, symbol, fromdate, todate, period, strategy, optimizati
                                     cerebro=cerebro,
                                     strategy=MovingAveragesCrossover,
                                     generator=sma_testcase_generator,
+                                    engine=engine,
                                     **parameters,
                                     )
         optimizer.start()
 
         df = optimizer.strats_df
-        return df.to_json()
+        # lookups of indicator caches over the sweep, None for the vectorized engine
+        return dict(strats=json.loads(df.to_json()), indicator_cache_stats=optimizer.indicator_cache_stats)
+
+
+@shared_task
+def celery_bar_cache_stats():
+    # hit and miss counts of the bar cache of the worker running the task
+    return get_stats()
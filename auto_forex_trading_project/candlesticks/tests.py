@@ -1,3 +1,363 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .timeframes import get_dates_of_ranges, get_time_runs
+
+from utils.barcache import BarCache
+from utils.commissions import ForexCommission
+from utils.dukascopy import DukascopyDownloader, download_candles, get_candle_url, get_save_path
+from utils.optimizations import CeleryCerebro, Optimizer
+from utils.psql import ConnectionPool
+from utils.strategies import MovingAveragesCrossover, RSIPositionSizing
+from utils.vectorized import get_engine
+
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+import backtrader as bt
+import collections
+import itertools
+import lzma
+import math
+import os
+import numpy as np
+import pandas as pd
+import struct
+import tempfile
+import threading
+
+
+def get_bars(n=600, start=datetime(2019, 1, 1), freq='h', seed=0):
+    # random walk of EURUSD like bars, with moves wide enough for crossovers of bands and moving averages
+    random = np.random.default_rng(seed)
+    close = 1.15 + np.cumsum(random.normal(0.0, 0.0012, n))
+    opens = np.concatenate(([close[0]], close[:-1])) + random.normal(0.0, 0.0002, n)
+    high = np.maximum(opens, close) + random.uniform(0.0, 0.0005, n)
+    low = np.minimum(opens, close) - random.uniform(0.0, 0.0005, n)
+    return pd.DataFrame(dict(open=opens, high=high, low=low, close=close, volume=random.integers(100, 1000, n), openinterest=0.0),
+                        index=pd.date_range(start, periods=n, freq=freq))
+
+
+class ParityOptimizer(Optimizer):
+    def __init__(self, cerebro, strategy, testcases, engine):
+        self.cerebro = cerebro
+        self.strategy, self.generator, self.kwargs, self.engine = strategy, lambda: testcases, {}, engine
+
+        self.cerebro.optstrategy(strategy, optimization_dict=testcases)
+
+    def bt_opt_callback(self, cb):
+        return
+
+
+class VectorizedEngineParityTest(SimpleTestCase):
+    '''
+    strats_df of a sweep by the vectorized engine of utils.vectorized against the sweep by backtrader,
+    set up like the optimization of celery_backtest, on bars of an in-memory data
+    '''
+    # timeframes of the data, H1 given explicitly like celery_backtest and the default of a feed
+    timeframes = (
+        (bt.TimeFrame.Minutes, 60),
+        (bt.TimeFrame.Days, 1),
+    )
+
+    rel_tol = 1e-6
+
+    def get_cerebro(self, cash, timeframe, compression):
+        cerebro = CeleryCerebro(maxcpus=1)
+        cerebro.broker.setcash(cash)
+        cerebro.broker.addcommissioninfo(ForexCommission(leverage=1, margin=cash))
+        cerebro.adddata(bt.feeds.PandasData(dataname=get_bars(), timeframe=timeframe, compression=compression), name='EURUSD')
+        cerebro.addanalyzer(bt.analyzers.DrawDown)
+        cerebro.addanalyzer(bt.analyzers.Returns)
+        cerebro.addanalyzer(bt.analyzers.SharpeRatio)
+        cerebro.addanalyzer(bt.analyzers.TradeAnalyzer)
+        cerebro.addanalyzer(bt.analyzers.Transactions, headers=True)
+        return cerebro
+
+    def run_sweep(self, strategy, testcases, engine, cash, timeframe, compression):
+        optimizer = ParityOptimizer(self.get_cerebro(cash, timeframe, compression), strategy, testcases, engine)
+        optimizer.start()
+        return optimizer.strats_df
+
+    def assertSweepsEqual(self, strategy, testcases, cash=200000):
+        for timeframe, compression in self.timeframes:
+            with self.subTest(timeframe=bt.TimeFrame.getname(timeframe, compression), cash=cash):
+                expected_df = self.run_sweep(strategy, testcases, 'backtrader', cash, timeframe, compression)
+                vectorized_df = self.run_sweep(strategy, testcases, 'vectorized', cash, timeframe, compression)
+                self.assertEqual(list(vectorized_df.columns), list(expected_df.columns))
+                self.assertEqual(len(vectorized_df), len(testcases))
+
+                mismatches = [(i, column, expected_df.at[i, column], vectorized_df.at[i, column])
+                              for i in expected_df.index for column in expected_df.columns
+                              if not self.is_close(expected_df.at[i, column], vectorized_df.at[i, column])]
+                self.assertEqual(mismatches, [])
+
+    def assertRejected(self, strategy, testcases, cash):
+        # some test case has an order that the broker rejects for cash, which the engine simulates by an Account
+        engine = get_engine(strategy)(self.get_cerebro(cash, bt.TimeFrame.Minutes, 60))
+        positions, ends = engine.get_positions([engine.get_params(testcase) for testcase in testcases])
+        cash, _ = engine.get_account(positions)
+        self.assertTrue(engine.get_rejected(positions, ends, cash).any())
+
+    def is_close(self, expected, value):
+        if isinstance(expected, float) and isinstance(value, float):
+            return (math.isnan(expected) and math.isnan(value)) or math.isclose(expected, value, rel_tol=self.rel_tol, abs_tol=self.rel_tol)
+        return expected == value
+
+
+class MovingAveragesCrossoverEngineTest(VectorizedEngineParityTest):
+    def get_testcases(self, use_strength):
+        testcases = []
+        for fast_ma_period, slow_ma_period in itertools.permutations((1, 3, 8, 20), 2):
+            for strength in ((0.0002, 0.0008) if use_strength else (0.0005,)):
+                testcases.append(dict(use_strength=use_strength, strength=strength,
+                                      fast_ma_period=fast_ma_period, slow_ma_period=slow_ma_period))
+        return testcases
+
+    def test_crossover(self):
+        self.assertSweepsEqual(MovingAveragesCrossover, self.get_testcases(use_strength=False))
+
+    def test_strength(self):
+        self.assertSweepsEqual(MovingAveragesCrossover, self.get_testcases(use_strength=True))
+
+    def test_window(self):
+        windows = (
+            (datetime(2019, 1, 5, 13), datetime(2019, 1, 20, 7)),
+            (datetime(2019, 1, 3), datetime(2019, 1, 3, 12)),
+            (datetime(2019, 1, 24), datetime(2019, 2, 1)),  # past the last bar
+        )
+        testcases = [dict(testcase, datetime_from=datetime_from, datetime_before=datetime_before)
+                     for datetime_from, datetime_before in windows
+                     for testcase in self.get_testcases(use_strength=False) + self.get_testcases(use_strength=True)]
+        self.assertSweepsEqual(MovingAveragesCrossover, testcases)
+
+
+class RSIPositionSizingEngineTest(VectorizedEngineParityTest):
+    def get_testcases(self, use_strength):
+        testcases = []
+        for period, (lowerband, upperband) in itertools.product((3, 7, 14), ((30.0, 70.0), (40.0, 60.0), (55.0, 45.0))):
+            for size_multiplier in ((0.0, 0.05, 0.2) if use_strength else (0.05,)):
+                testcases.append(dict(use_strength=use_strength, period=period, lowerband=lowerband, upperband=upperband,
+                                      size_multiplier=size_multiplier))
+        return testcases
+
+    def test_bands(self):
+        self.assertSweepsEqual(RSIPositionSizing, self.get_testcases(use_strength=False))
+
+    def test_sizing(self):
+        self.assertSweepsEqual(RSIPositionSizing, self.get_testcases(use_strength=True))
+
+    def test_rejections(self):
+        for use_strength in (False, True):
+            testcases = self.get_testcases(use_strength)
+            self.assertRejected(RSIPositionSizing, testcases, cash=115000)
+            self.assertSweepsEqual(RSIPositionSizing, testcases, cash=115000)
+
+    def test_window(self):
+        testcases = [dict(testcase, datetime_from=datetime(2019, 1, 5, 13), datetime_before=datetime(2019, 1, 20, 7))
+                     for testcase in self.get_testcases(use_strength=False) + self.get_testcases(use_strength=True)]
+        self.assertSweepsEqual(RSIPositionSizing, testcases)
+
+
+class DirtyRangeTest(SimpleTestCase):
+    def test_runs_of_consecutive_days(self):
+        # a shard with a gap of years gives one range per run of days, which do not cover the days between them
+        changed_times = np.array(['2019-01-01T00:00', '2019-01-01T23:59', '2019-01-02T05:00',
+                                  '2021-06-01T00:00', '2021-06-03T01:00'], dtype='datetime64[s]')
+        runs = get_time_runs(changed_times)
+        self.assertEqual([(run[0], run[-1]) for run in runs], [
+            (np.datetime64('2019-01-01T00:00'), np.datetime64('2019-01-02T05:00')),
+            (np.datetime64('2021-06-01T00:00'), np.datetime64('2021-06-01T00:00')),
+            (np.datetime64('2021-06-03T01:00'), np.datetime64('2021-06-03T01:00')),
+        ])
+        self.assertEqual(len(get_dates_of_ranges([(run[0], run[-1]) for run in runs])), 4)
+
+
+class BarCacheDiskTest(SimpleTestCase):
+    series_key = ('dukascopy', 'EURUSD', 'BID', 'H1', False)
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+
+    def put(self, cache, fromdate, todate):
+        datetimes = np.arange(fromdate, todate + 1.0)
+        cache.put(self.series_key, 0, fromdate, todate, dict(datetime=datetimes, close=np.full(len(datetimes), 1.15)))
+        return next(Path(self.root.name).glob(f'*/*/*/*/0_{fromdate!r}_{todate!r}.npz'))
+
+    def test_least_recently_used_evicted(self):
+        # distinct ranges are evicted oldest first once the files exceed the budget, a disk hit renews its file
+        cache = BarCache(root=self.root.name, max_disk_bytes=2 ** 30)
+        paths = [self.put(cache, fromdate, fromdate + 9.0) for fromdate in (1000.0, 2000.0)]
+        for n, path in enumerate(paths):
+            os.utime(path, (n, n))
+
+        self.assertIsNotNone(BarCache(root=self.root.name).get(self.series_key, 1000.0, 1009.0))
+
+        cache.max_disk_bytes = sum(path.stat().st_size for path in paths) + 1
+        new_path = self.put(cache, 3000.0, 3009.0)
+        self.assertEqual([path.exists() for path in paths + [new_path]], [True, False, True])
+        self.assertEqual(cache.get_stats()['disk_evictions'], 1)
+
+    def test_new_file_kept(self):
+        cache = BarCache(root=self.root.name, max_disk_bytes=0)
+        old_path = self.put(cache, 1000.0, 1009.0)
+        new_path = self.put(cache, 2000.0, 2009.0)
+        self.assertEqual((old_path.exists(), new_path.exists()), (False, True))
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        # stub connections, a new one per connect
+        patcher = mock.patch('utils.psql.psycopg2.connect', side_effect=lambda **kwargs: mock.MagicMock(closed=False))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_feeds(self, pool, n=56, rounds=3):
+        # n feeds streaming at once in every round
+        for _ in range(rounds):
+            conns = [pool.getconn() for _ in range(n)]
+            for conn in conns:
+                pool.putconn(conn)
+
+    def test_reused_while_idle(self):
+        pool = ConnectionPool(maxconn=64, max_idle=56)
+        self.run_feeds(pool)
+        self.assertEqual(pool.stats, {'connected': 56, 'reused': 112, 'replaced': 0, 'closed': 0})
+        self.assertEqual((len(pool.connections), len(pool.idle)), (56, 56))
+
+    def test_idle_bounded(self):
+        pool = ConnectionPool(maxconn=64, max_idle=10)
+        self.run_feeds(pool)
+        self.assertEqual(pool.stats, {'connected': 148, 'reused': 20, 'replaced': 0, 'closed': 138})
+        self.assertEqual((len(pool.connections), len(pool.idle)), (10, 10))
+
+    def test_broken_replaced(self):
+        pool = ConnectionPool(maxconn=64, max_idle=56)
+        self.run_feeds(pool, n=2, rounds=1)
+        pool.idle[-1][0].closed = True
+        self.run_feeds(pool, n=2, rounds=1)
+        self.assertEqual(pool.stats, {'connected': 3, 'reused': 1, 'replaced': 1, 'closed': 0})
+        self.assertEqual(len(pool.connections), 2)
+
+
+class DatafeedHandler(BaseHTTPRequestHandler):
+    '''
+    Local stand-in of the Dukascopy datafeed, whose server has `bodies` by path and `responses` scripted by path,
+    such as 503 or 'truncated' for the first requests, before the body or a 404 is served
+    '''
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests[self.path] += 1
+            script = server.responses.get(self.path, [])
+            response = script.pop(0) if script else None
+
+        body = server.bodies.get(self.path)
+        if response == 'truncated':
+            # a body cut short of its Content-Length, as by a dropped connection
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+        elif response is not None or body is None:
+            self.send_error(response or 404)
+        else:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DukascopyDownloaderTest(SimpleTestCase):
+    max_retries = 3
+
+    def setUp(self):
+        self.data_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.data_root.cleanup)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), DatafeedHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = collections.Counter()
+        self.server.bodies, self.server.responses = {}, {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.dates = [date(2021, 3, 1) + timedelta(days=n) for n in range(3)]
+        for d in self.dates:
+            for price_type in ('BID', 'ASK'):
+                self.add_file('EURUSD', d, price_type)
+
+    def add_file(self, symbol, d, price_type, responses=()):
+        path = get_candle_url('', symbol, d, price_type)
+        self.server.bodies[path] = lzma.compress(b''.join(struct.pack('!5if', i * 60, 1, 1, 1, 1, 1.0) for i in range(1440)))
+        self.server.responses[path] = list(responses)
+        return path
+
+    def download(self, jobs):
+        downloader = DukascopyDownloader(self.data_root.name, base_url=self.base_url, rate=1000, burst=100,
+                                         max_retries=self.max_retries, backoff=0.001)
+        try:
+            paths = downloader.download(jobs)
+        finally:
+            downloader.close()
+        return downloader, paths
+
+    def get_jobs(self):
+        return [('EURUSD', d, price_type) for d in self.dates for price_type in ('BID', 'ASK')]
+
+    def assertSaved(self, symbol, d, price_type):
+        save_path = get_save_path(self.data_root.name, symbol, d, price_type)
+        self.assertEqual(save_path.read_bytes(), self.server.bodies[get_candle_url('', symbol, d, price_type)])
+
+    def test_retries(self):
+        # two 503 before every file, a truncated body, a file failing every attempt, and a missing one
+        for symbol, d, price_type in self.get_jobs():
+            self.add_file(symbol, d, price_type, responses=[503, 503])
+        self.add_file('USDJPY', self.dates[0], 'BID', responses=['truncated'])
+        self.add_file('GBPUSD', self.dates[0], 'BID', responses=[503] * (self.max_retries + 1))
+
+        jobs = self.get_jobs() + [('USDJPY', self.dates[0], 'BID'), ('GBPUSD', self.dates[0], 'BID'), ('GBPUSD', self.dates[0], 'ASK')]
+        downloader, paths = self.download(jobs)
+
+        self.assertEqual(downloader.stats, {'downloaded': 7, 'skipped': 0, 'missing': 1, 'failed': 1,
+                                            'retries': 2 * 6 + 1 + self.max_retries})
+        self.assertEqual(downloader.missing, [('GBPUSD', self.dates[0], 'ASK')])
+        self.assertEqual(paths[-2:], [None, None])
+        for job in jobs[:7]:
+            self.assertSaved(*job)
+        self.assertFalse(get_save_path(self.data_root.name, 'GBPUSD', self.dates[0], 'BID').exists())
+
+    def test_skip_existing(self):
+        stats = download_candles(self.data_root.name, ['EURUSD'], ['BID', 'ASK'], self.dates, base_url=self.base_url, rate=1000, burst=100)
+        self.assertEqual(stats['downloaded'], 6)
+        requests = sum(self.server.requests.values())
+
+        stats = download_candles(self.data_root.name, ['EURUSD'], ['BID', 'ASK'], self.dates, base_url=self.base_url, rate=1000, burst=100)
+        self.assertEqual((stats['downloaded'], stats['skipped']), (0, 6))
+        self.assertEqual(sum(self.server.requests.values()), requests)
+
+    def test_atomic_writes(self):
+        # a truncated body is never written, and a write interrupted before its rename leaves no file at the save path
+        self.add_file('EURUSD', self.dates[0], 'BID', responses=['truncated'] * (self.max_retries + 1))
+        with mock.patch('utils.dukascopy.os.replace', side_effect=OSError('interrupted')):
+            with self.assertRaises(OSError):
+                self.download([('EURUSD', self.dates[1], 'BID')])
+        downloader, paths = self.download([('EURUSD', self.dates[0], 'BID')])
+
+        self.assertEqual(downloader.stats['failed'], 1)
+        self.assertFalse(get_save_path(self.data_root.name, 'EURUSD', self.dates[0], 'BID').exists())
+        self.assertFalse(get_save_path(self.data_root.name, 'EURUSD', self.dates[1], 'BID').exists())
+
+        # the next run is not fooled by the leftover of the interrupted write
+        downloader, paths = self.download([('EURUSD', self.dates[1], 'BID')])
+        self.assertEqual(downloader.stats['downloaded'], 1)
+        self.assertSaved('EURUSD', self.dates[1], 'BID')
+        self.assertEqual([path.name for path in Path(self.data_root.name).rglob('*') if path.is_file()], ['03_02.bi5'])
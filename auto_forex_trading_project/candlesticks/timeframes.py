@@ -0,0 +1,166 @@
+from .models import Candlestick, DirtyRange, TimeframeWatermark
+
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.db.models import Max
+from utils.barcache import invalidate_series
+from utils.bi5 import columns_to_rows
+from utils.psql import copy_candlesticks, read_candlestick_columns
+from utils.resample import (concatenate_columns, get_day_runs, get_start_of_month, get_start_of_next_month, get_start_of_week,
+                            merge_appended, merge_columns, resample_cascade, resample_months, resample_weeks, select_buckets,
+                            select_overlapping)
+
+import numpy as np
+
+'''
+Incremental maintenance of M5 to MN bars
+
+Every write of M1 bars records the time range of bars it inserted or changed as a DirtyRange,
+and TimeframeWatermark keeps the time of the latest M1 bar aggregated into longer bars.
+Then only buckets touched by dirty ranges are rebuilt:
+    - M1 bars after the watermark are appended bars, their aggregates are merged into stored bars
+      without reading the rest of the buckets
+    - days with late or corrected M1 bars, i.e. not after the watermark, are read again,
+      and only buckets overlapping dirty ranges are written
+W1 and MN bars of touched weeks and months are rebuilt from D1 bars.
+'''
+
+
+def to_datetime64(value):
+    return np.datetime64(value, 's')
+
+
+def to_datetime(value):
+    return value.astype('datetime64[us]').item()
+
+
+def get_time_runs(times):
+    # split sorted times into runs on consecutive days, so that a range does not span days without changed bars
+    days = times.astype('datetime64[D]')
+    return np.split(times, np.flatnonzero(np.diff(days) > np.timedelta64(1, 'D')) + 1)
+
+
+def record_dirty_range(symbol, price_type, changed_times, source='Dukascopy'):
+    # changed_times are returned by copy_candlesticks(..., returning=True), sorted
+    # one range per run of consecutive days, as a shard of files may have gaps of years between them
+    if len(changed_times):
+        DirtyRange.objects.bulk_create([DirtyRange(symbol=symbol, price_type=price_type, source=source,
+                                                   time_from=to_datetime(run[0]),
+                                                   time_before=to_datetime(run[-1]))
+                                        for run in get_time_runs(changed_times)])
+        # cached bars are dropped once the new ones are visible to readers
+        transaction.on_commit(lambda: invalidate_series(symbol, price_type, source=source))
+
+
+def get_dates_of_ranges(ranges, watermark=None):
+    # dates covered by ranges, only up to watermark if given
+    dates = set()
+    for time_from, time_before in ranges:
+        if watermark is not None:
+            if time_from > watermark:
+                continue
+            time_before = min(time_before, watermark)
+        days = np.arange(time_from.astype('datetime64[D]'), time_before.astype('datetime64[D]') + 1)
+        dates.update(day.item() for day in days)
+    return sorted(dates)
+
+
+def read_appended_columns(cursor, symbol, price_type, ranges, watermark, excluded_dates, source='Dukascopy'):
+    # M1 bars of dirty ranges after watermark, except those on excluded_dates which are read again anyway
+    columns_list = []
+    for time_from, time_before in ranges:
+        if time_before <= watermark:
+            continue
+        time_from = max(time_from, watermark + np.timedelta64(1, 's'))
+        columns_list.append(read_candlestick_columns(cursor, symbol, 1, price_type, to_datetime(time_from), to_datetime(time_before), source=source))
+
+    if not columns_list:
+        return None
+
+    columns = concatenate_columns(columns_list)
+    # dirty ranges may overlap
+    _, unique = np.unique(columns['time'], return_index=True)
+    kept = unique[~np.isin(columns['time'][unique].astype('datetime64[D]'), np.array(excluded_dates, dtype='datetime64[D]'))]
+    return {name: column[kept] for name, column in columns.items()}
+
+
+def update_timeframes(cursor, symbol, price_type, source='Dukascopy'):
+    '''
+    Rebuild buckets of M5 to MN touched by dirty ranges of a series. Return number of bars written.
+    '''
+    number_of_bars = 0
+    with transaction.atomic():
+        # serialize updates of the same series
+        watermark, _ = TimeframeWatermark.objects.select_for_update().get_or_create(symbol=symbol, price_type=price_type, source=source)
+        dirty_ranges = list(DirtyRange.objects.filter(symbol=symbol, price_type=price_type, source=source))
+        if not dirty_ranges:
+            return 0
+
+        ranges = [(to_datetime64(dirty_range.time_from), to_datetime64(dirty_range.time_before)) for dirty_range in dirty_ranges]
+        watermark_time = to_datetime64(watermark.time) if watermark.time else None
+        latest_time = watermark_time
+
+        # without watermark, every dirty date is read again
+        late_dates = get_dates_of_ranges(ranges, watermark_time)
+        d1_columns_list = []
+
+        for run in get_day_runs(late_dates):
+            time_from = datetime.combine(run[0], datetime.min.time())
+            time_before = datetime.combine(run[-1], datetime.min.time()) + timedelta(days=1, microseconds=-1)
+            m1_columns = read_candlestick_columns(cursor, symbol, 1, price_type, time_from, time_before, source=source)
+            if not len(m1_columns['time']):
+                continue
+
+            resampled = {period: select_overlapping(columns, period, ranges) for period, columns in resample_cascade(m1_columns).items()}
+            d1_columns_list.append(resampled[1440])
+
+            rows = [row for period, columns in resampled.items() for row in columns_to_rows(columns, symbol, period, source, price_type)]
+            number_of_bars += copy_candlesticks(cursor, rows)
+            latest_time = max(latest_time, m1_columns['time'][-1]) if latest_time is not None else m1_columns['time'][-1]
+
+        appended_dates = []
+        if watermark_time is not None:
+            m1_columns = read_appended_columns(cursor, symbol, price_type, ranges, watermark_time, late_dates, source=source)
+            if m1_columns is not None and len(m1_columns['time']):
+                resampled = {}
+                for period, delta_columns in resample_cascade(m1_columns).items():
+                    old_columns = read_candlestick_columns(cursor, symbol, period, price_type,
+                                                           to_datetime(delta_columns['time'][0]), to_datetime(delta_columns['time'][-1]),
+                                                           source=source)
+                    resampled[period] = merge_appended(old_columns, delta_columns)
+                d1_columns_list.append(resampled[1440])
+
+                rows = [row for period, columns in resampled.items() for row in columns_to_rows(columns, symbol, period, source, price_type)]
+                number_of_bars += copy_candlesticks(cursor, rows)
+                latest_time = max(latest_time, m1_columns['time'][-1])
+                appended_dates = [day.item() for day in np.unique(m1_columns['time'].astype('datetime64[D]'))]
+
+        touched_dates = sorted(set(late_dates) | set(appended_dates))
+        if d1_columns_list and touched_dates:
+            # D1 of the whole weeks and months touched, with D1 just built in place of stored ones
+            span_from = datetime.combine(min(get_start_of_week(touched_dates[0]), get_start_of_month(touched_dates[0])), datetime.min.time())
+            span_before = datetime.combine(max(get_start_of_week(touched_dates[-1]) + timedelta(days=7), get_start_of_next_month(touched_dates[-1])),
+                                           datetime.min.time()) - timedelta(microseconds=1)
+            d1_columns = read_candlestick_columns(cursor, symbol, 1440, price_type, span_from, span_before, source=source)
+            d1_columns = merge_columns(d1_columns, concatenate_columns(d1_columns_list))
+
+            resampled = {10080: select_buckets(resample_weeks(d1_columns), {get_start_of_week(d) for d in touched_dates}),
+                         43200: select_buckets(resample_months(d1_columns), {get_start_of_month(d) for d in touched_dates})}
+            rows = [row for period, columns in resampled.items() for row in columns_to_rows(columns, symbol, period, source, price_type)]
+            number_of_bars += copy_candlesticks(cursor, rows)
+
+        if watermark_time is None:
+            # bars stored before tracking started are taken as aggregated already
+            latest_stored_time = Candlestick.objects.filter(symbol=symbol, period=Candlestick.M1, price_type=price_type,
+                                                            source=source).aggregate(Max('time'))['time__max']
+            if latest_stored_time is not None:
+                latest_time = to_datetime64(latest_stored_time)
+
+        if latest_time is not None:
+            watermark.time = to_datetime(latest_time)
+            watermark.save()
+        if number_of_bars:
+            transaction.on_commit(lambda: invalidate_series(symbol, price_type, source=source))
+        DirtyRange.objects.filter(id__in=[dirty_range.id for dirty_range in dirty_ranges]).delete()
+
+    return number_of_bars
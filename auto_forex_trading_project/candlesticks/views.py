@@ -1,4 +1,5 @@
 from unicodedata import name
+from django.db import connection
 from django.db.models import F, Func, Value, CharField
 from django.http import HttpResponse, Http404, StreamingHttpResponse
 from django.shortcuts import redirect
@@ -9,9 +10,10 @@ from rest_framework import viewsets
 from forex.celery import app
 
 from .forms import HistoryForm, SMACrossoverForm, TaskIDForm
-from .models import Candlestick
+from .models import Candlestick, Prediction
 from .serializers import CandlestickSerializer
 from .tasks import celery_backtest
+from utils.psql import aggregate_candlesticks, get_period
 
 from datetime import datetime, date, timedelta
 from celery.result import AsyncResult
@@ -45,6 +47,20 @@ class CandlestickViewSet(viewsets.ModelViewSet):
     queryset = Candlestick.objects.none()
     serializer_class = CandlestickSerializer
 
+    def filter_queryset(self, queryset):
+        # bars of custom periods are a list in time order already, datatables only pages through them
+        if isinstance(queryset, list):
+            self._datatables_total_count = self._datatables_filtered_count = len(queryset)
+            return queryset
+        return super().filter_queryset(queryset)
+
+
+# aggregate bars of a custom period in PSQL, as a list of dicts in place of a queryset
+def get_custom_period_bars(symbol, period, source, price_type, date_from, date_before):
+    with connection.cursor() as cursor:
+        rows = aggregate_candlesticks(cursor, symbol, period, price_type, date_from, date_before, source=source)
+    return [dict(zip(('time', 'open', 'high', 'low', 'close', 'volume'), row)) for row in rows]
+
 
 # estimate and limit number of query results by adjusting {date_before}
 def bar_number_limiter(date_from, date_before, period):
@@ -66,6 +82,7 @@ def index(request):
                                                     'date_from': (date.today() + timedelta(days=-1) + timedelta(days=-365)).strftime('%d/%m/%Y'),
                                                     'date_before': (date.today() + timedelta(days=-1)).strftime('%d/%m/%Y'),
                                                     'period': 1440,
+                                                    'custom_period': '',
                                                     'source': 'Dukascopy',
                                                     'price_type': 'BID',
                                                     }
@@ -83,6 +100,9 @@ def index(request):
                 date_from = history_form.cleaned_data['date_from']
                 date_before = history_form.cleaned_data['date_before']
                 period = history_form.cleaned_data['period']
+                custom_period = history_form.cleaned_data['custom_period']
+                if custom_period:
+                    period = get_period(custom_period)[0]
                 price_type = history_form.cleaned_data['price_type']
                 source = history_form.cleaned_data['source']
 
@@ -93,23 +113,26 @@ def index(request):
                 request.session['saved_history_form'] = json.dumps(history_form.cleaned_data, default=str)
 
                 # filter result based on limited date_before
-                query_results = Candlestick.objects.filter(symbol__exact=symbol,
-                                                           period__exact=period,
-                                                           source__exact=source,
-                                                           price_type__exact=price_type,
-                                                           time__range=(date_from, maximum_date_before),
-                                                           volume__gt=0,
-                                                           ).order_by('time')
+                if custom_period:
+                    query_results = get_custom_period_bars(symbol, period, source, price_type, date_from, maximum_date_before)
+                else:
+                    query_results = Candlestick.objects.filter(symbol__exact=symbol,
+                                                               period__exact=period,
+                                                               source__exact=source,
+                                                               price_type__exact=price_type,
+                                                               time__range=(date_from, maximum_date_before),
+                                                               volume__gt=0,
+                                                               ).order_by('time')
 
                 if query_results:
                     # save query result into ModelViewSet for html rendering
                     CandlestickViewSet.queryset = query_results
 
-                    context['number_of_bars'] = query_results.count()
+                    context['number_of_bars'] = len(query_results)
 
                     # check if {query_results} is limited
                     if maximum_date_before < date_before:
-                        context['limit_of_result'] = query_results.count()
+                        context['limit_of_result'] = len(query_results)
 
                     # determine maximum decimal place for one pipette
                     if 'JPY' in symbol:
@@ -125,6 +148,7 @@ def index(request):
                                                            'date_from': request.POST['date_from'],
                                                            'date_before': request.POST['date_before'],
                                                            'period': request.POST['period'],
+                                                           'custom_period': request.POST.get('custom_period', ''),
                                                            'source': request.POST['source'],
                                                            'price_type': request.POST['price_type'],
                                                            }
@@ -154,35 +178,48 @@ def index(request):
                     date_from = saved_history_form.cleaned_data['date_from']
                     date_before = saved_history_form.cleaned_data['date_before']
                     period = saved_history_form.cleaned_data['period']
+                    custom_period = saved_history_form.cleaned_data['custom_period']
+                    if custom_period:
+                        period = get_period(custom_period)[0]
                     price_type = saved_history_form.cleaned_data['price_type']
                     source = saved_history_form.cleaned_data['source']
 
-                    query_results = Candlestick.objects.filter(symbol__exact=symbol,
-                                                               period__exact=period,
-                                                               source__exact=source,
-                                                               price_type__exact=price_type,
-                                                               time__range=(date_from, date_before),
-                                                               volume__gt=0,
-                                                               ).order_by('time')
+                    if custom_period:
+                        query_results = get_custom_period_bars(symbol, period, source, price_type, date_from, date_before)
+                    else:
+                        query_results = Candlestick.objects.filter(symbol__exact=symbol,
+                                                                   period__exact=period,
+                                                                   source__exact=source,
+                                                                   price_type__exact=price_type,
+                                                                   time__range=(date_from, date_before),
+                                                                   volume__gt=0,
+                                                                   ).order_by('time')
 
                     # if there is result, generate the csv file from streaming
                     if query_results:
 
-                        readable_period = query_results[0].get_period_display()
+                        if custom_period:
+                            readable_period = custom_period
+                        else:
+                            readable_period = query_results[0].get_period_display()
                         filename = f'{symbol}_from_{date_from.strftime("%Y%m%d")}_to_{date_before.strftime("%Y%m%d")}_{readable_period}_{price_type}'
 
                         # construst csv file
                         rows = [('Datetime', 'Open', 'High', 'Low', 'Close', 'Volume(Millions)')]  # header row
 
-                        # add datetime string by annotating
-                        query_results = query_results.annotate(formatted_time=Func(F('time'),
-                                                                                   Value('YYYY-MM-DD HH24:MI:SS'),
-                                                                                   function='to_char',
-                                                                                   output_field=CharField()
-                                                                                   )
-                                                               )
+                        if custom_period:
+                            rows += [(bar['time'].strftime('%Y-%m-%d %H:%M:%S'), bar['open'], bar['high'], bar['low'], bar['close'], bar['volume'])
+                                     for bar in query_results]
+                        else:
+                            # add datetime string by annotating
+                            query_results = query_results.annotate(formatted_time=Func(F('time'),
+                                                                                       Value('YYYY-MM-DD HH24:MI:SS'),
+                                                                                       function='to_char',
+                                                                                       output_field=CharField()
+                                                                                       )
+                                                                   )
 
-                        rows += list(query_results.values_list('formatted_time', 'open', 'high', 'low', 'close', 'volume'))
+                            rows += list(query_results.values_list('formatted_time', 'open', 'high', 'low', 'close', 'volume'))
 
                         pseudo_buffer = Echo()
                         writer = csv.writer(pseudo_buffer)
@@ -221,6 +258,8 @@ def backtest(request):
                     date_from = saved_history_form.cleaned_data['date_from']
                     date_before = saved_history_form.cleaned_data['date_before']
                     period = saved_history_form.cleaned_data['period']
+                    if saved_history_form.cleaned_data['custom_period']:
+                        period = get_period(saved_history_form.cleaned_data['custom_period'])[0]
                     source = saved_history_form.cleaned_data['source']
                     price_type = saved_history_form.cleaned_data['price_type']
 
@@ -293,6 +332,8 @@ def optimization(request):
                     date_from = saved_history_form.cleaned_data['date_from']
                     date_before = saved_history_form.cleaned_data['date_before']
                     period = saved_history_form.cleaned_data['period']
+                    if saved_history_form.cleaned_data['custom_period']:
+                        period = get_period(saved_history_form.cleaned_data['custom_period'])[0]
                     source = saved_history_form.cleaned_data['source']
                     price_type = saved_history_form.cleaned_data['price_type']
 
@@ -336,10 +377,14 @@ def optimization_result(request):
             if task_id_form.is_valid():
                 task_id = task_id_form.cleaned_data['task_id']
                 res = AsyncResult(task_id)
-                df = pd.DataFrame.from_dict(json.loads(res.get()))
+                result = res.get()
+                df = pd.DataFrame.from_dict(result['strats'])
                 best_row = df.loc[df['returns_rtot'] == df['returns_rtot'].max()]
+                stats = result['indicator_cache_stats']
                 context = {'best_row': best_row.to_html(classes='table table-striped table-bordered table-sm'),
                            'table': df.to_html(classes='table table-striped table-bordered table-sm'),
+                           'indicator_cache_stats': stats,
+                           'indicator_cache_hit_ratio': f'{stats["hit_ratio"]:.1%}' if stats and stats['hit_ratio'] is not None else None,
                            }
 
         return HttpResponse(template.render(context, request))
@@ -372,13 +417,14 @@ def get_prediction_plot(symbol, period, source, price_type):
         # prediction shall start from Sunday
         prediction_startsfrom = prediction_startsfrom + timedelta(days=1)
 
-    query_results = Candlestick.objects.filter(symbol__exact=symbol,
-                                               period__exact=period,
-                                               source__exact=source,
-                                               price_type__exact=price_type,
-                                               time__gte=fromdate,
-                                               predicted_volume__gt=0,
-                                               ).order_by('time')
+    query_results = Prediction.objects.filter(symbol__exact=symbol,
+                                              period__exact=period,
+                                              source__exact=source,
+                                              price_type__exact=price_type,
+                                              model_version__exact=Prediction.CURRENT_MODEL_VERSION,
+                                              time__gte=fromdate,
+                                              predicted_volume__gt=0,
+                                              ).order_by('time')
 
     query_results = query_results.values_list('time', 'predicted_open', 'predicted_high', 'predicted_low', 'predicted_close', 'predicted_volume')
     predicted_df = pd.DataFrame(query_results, columns=['time', 'predicted_open', 'predicted_high', 'predicted_low', 'predicted_close', 'predicted_volume'])
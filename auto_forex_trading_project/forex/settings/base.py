@@ -89,6 +89,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': 'forex',
+        # keep connection of a uWSGI or celery worker open across requests and tasks, instead of connecting per request
+        # an unusable connection is dropped at the end of the request it failed in
+        'CONN_MAX_AGE': int(os.environ.get('FOREX_CONN_MAX_AGE', 600)),
     }
 }
 
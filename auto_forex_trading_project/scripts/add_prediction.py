@@ -10,7 +10,7 @@ django.setup()
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # make tf report error silent only
 
-from candlesticks.models import Candlestick
+from candlesticks.models import Candlestick, Prediction
 
 from datetime import datetime, date, timedelta
 from tensorflow import keras
@@ -42,6 +42,7 @@ def add_prediction(d=0):
     period = 1440
     price_type = 'BID'
     source = 'Dukascopy'
+    model_version = Prediction.CURRENT_MODEL_VERSION
 
     start_date = datetime.combine(date.today() - timedelta(days=2 * n), datetime.min.time())
     end_date = start_date + timedelta(days=2 * n, microseconds=-1)
@@ -93,40 +94,44 @@ def add_prediction(d=0):
         # add prediction to database
         bar_time = prediction_startsfrom
         for predicted_close_price in predicted_close_prices:
-            Candlestick.objects.update_or_create(symbol=symbol,
-                                                 time=bar_time,
-                                                 period=period,
-                                                 source=source,
-                                                 price_type=price_type,
-                                                 defaults={'symbol': symbol,
-                                                           'time': bar_time,
-                                                           'predicted_close': predicted_close_price,
-                                                           'predicted_volume': 1,
-                                                           'period': period,
-                                                           'source': source,
-                                                           'price_type': price_type,
-                                                           }
-                                                 )
+            Prediction.objects.update_or_create(symbol=symbol,
+                                                time=bar_time,
+                                                period=period,
+                                                source=source,
+                                                price_type=price_type,
+                                                model_version=model_version,
+                                                defaults={'symbol': symbol,
+                                                          'time': bar_time,
+                                                          'predicted_close': predicted_close_price,
+                                                          'predicted_volume': 1,
+                                                          'period': period,
+                                                          'source': source,
+                                                          'price_type': price_type,
+                                                          'model_version': model_version,
+                                                          }
+                                                )
             bar_time += timedelta(days=1)
             if bar_time.isoweekday() == 6:
                 bar_time += timedelta(days=1)
 
         bar_time = prediction_startsfrom
         for predicted_open_price in predicted_open_prices:
-            Candlestick.objects.update_or_create(symbol=symbol,
-                                                 time=bar_time,
-                                                 period=period,
-                                                 source=source,
-                                                 price_type=price_type,
-                                                 defaults={'symbol': symbol,
-                                                           'time': bar_time,
-                                                           'predicted_open': predicted_open_price,
-                                                           'predicted_volume': 1,
-                                                           'period': period,
-                                                           'source': source,
-                                                           'price_type': price_type,
-                                                           }
-                                                 )
+            Prediction.objects.update_or_create(symbol=symbol,
+                                                time=bar_time,
+                                                period=period,
+                                                source=source,
+                                                price_type=price_type,
+                                                model_version=model_version,
+                                                defaults={'symbol': symbol,
+                                                          'time': bar_time,
+                                                          'predicted_open': predicted_open_price,
+                                                          'predicted_volume': 1,
+                                                          'period': period,
+                                                          'source': source,
+                                                          'price_type': price_type,
+                                                          'model_version': model_version,
+                                                          }
+                                                )
             bar_time += timedelta(days=1)
             if bar_time.isoweekday() == 6:
                 bar_time += timedelta(days=1)
@@ -0,0 +1,123 @@
+#!/home/paullam/auto_forex_trading_project/venv/bin/python3
+from datetime import timedelta
+from psycopg2 import sql
+
+import argparse
+import psycopg2
+
+'''
+Compare query plans of the feed query before and after adding
+candlestick_feed_idx and candlestick_time_brin (migration 0013)
+
+Synthetic M1 bars of 28 symbols are generated into a scratch table,
+so that the benchmark does not touch candlesticks_candlestick
+'''
+
+SYMBOLS = [
+    'AUDCAD', 'AUDCHF', 'AUDJPY', 'AUDNZD', 'AUDUSD', 'CADCHF',
+    'CADJPY', 'CHFJPY', 'EURAUD', 'EURCAD', 'EURCHF', 'EURGBP',
+    'EURJPY', 'EURNZD', 'EURUSD', 'GBPAUD', 'GBPCAD', 'GBPCHF',
+    'GBPJPY', 'GBPNZD', 'GBPUSD', 'NZDCAD', 'NZDCHF', 'NZDJPY',
+    'NZDUSD', 'USDCAD', 'USDCHF', 'USDJPY',
+]
+
+BENCHMARK_TABLE_NAME = 'benchmark_candlesticks_candlestick'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark indexes of candlesticks table')
+
+    parser.add_argument('--rows', '-n', type=int,
+                        default=5000000, required=False,
+                        help='number of synthetic bars.')
+
+    parser.add_argument('--symbol', '-s', choices=SYMBOLS,
+                        default='EURUSD', required=False,
+                        help='symbol of the benchmark query.')
+
+    parser.add_argument('--days', '-d', type=int,
+                        default=30, required=False,
+                        help='number of days covered by the benchmark query.')
+
+    return parser.parse_args()
+
+
+def explain(curs, query, params):
+    curs.execute(sql.SQL('EXPLAIN (ANALYZE, BUFFERS) ') + query, params)
+    return '\n'.join(row[0] for row in curs.fetchall())
+
+
+def main():
+    args = parse_args()
+    table = sql.Identifier(BENCHMARK_TABLE_NAME)
+
+    conn = psycopg2.connect(database='forex')
+    conn.autocommit = True
+    with conn.cursor() as curs:
+        # same columns and unique constraint as candlesticks_candlestick, but none of the new indexes
+        curs.execute(sql.SQL('DROP TABLE IF EXISTS {table}').format(table=table))
+        curs.execute(sql.SQL('CREATE TABLE {table} (LIKE {source_table})').format(table=table,
+                                                                                   source_table=sql.Identifier('candlesticks_candlestick')))
+
+        print(f'Generating {args.rows} bars...')
+        curs.execute(sql.SQL('INSERT INTO {table} (id, symbol, time, open, high, low, close, volume, period, source, price_type) '
+                             'SELECT g, (%s::varchar[])[1 + g %% 28], '
+                             'TIMESTAMP \'2003-05-04\' + (g / 28) * INTERVAL \'1 minute\', '
+                             '1.0, 1.0, 1.0, 1.0, CASE WHEN (g / 28) %% 7 = 0 THEN 0 ELSE 1 END, '
+                             '1, \'Dukascopy\', \'BID\' '
+                             'FROM generate_series(0, %s - 1) AS g').format(table=table),
+                     (SYMBOLS, args.rows))
+        curs.execute(sql.SQL('ALTER TABLE {table} ADD PRIMARY KEY (id)').format(table=table))
+        curs.execute(sql.SQL('ALTER TABLE {table} ADD UNIQUE (symbol, time, period, price_type, source)').format(table=table))
+        curs.execute(sql.SQL('VACUUM ANALYZE {table}').format(table=table))
+
+        # feed query of PSQLData
+        query = sql.SQL('SELECT {time}, {open}, {high}, {low}, {close}, {volume}, {price_type} '
+                        'FROM {table} '
+                        'WHERE ({period} = %s AND '
+                        '{price_type} = %s AND '
+                        '{symbol} = %s AND '
+                        '{source} = %s AND '
+                        '{volume} > 0 AND '
+                        '{time} BETWEEN %s AND %s)'
+                        'ORDER BY {time}').format(table=table,
+                                                  symbol=sql.Identifier('symbol'),
+                                                  price_type=sql.Identifier('price_type'),
+                                                  source=sql.Identifier('source'),
+                                                  time=sql.Identifier('time'),
+                                                  open=sql.Identifier('open'),
+                                                  high=sql.Identifier('high'),
+                                                  low=sql.Identifier('low'),
+                                                  close=sql.Identifier('close'),
+                                                  volume=sql.Identifier('volume'),
+                                                  period=sql.Identifier('period'),)
+
+        curs.execute(sql.SQL('SELECT MIN(time), MAX(time) FROM {table}').format(table=table))
+        time_from, time_before = curs.fetchone()
+        time_from = time_from + (time_before - time_from) / 2  # query the middle of the table
+        params = (1, 'BID', args.symbol, 'Dukascopy', time_from, time_from + timedelta(days=args.days))
+
+        print('=' * 32, 'Before', '=' * 32)
+        print(explain(curs, query, params))
+
+        curs.execute(sql.SQL('CREATE INDEX ON {table} (symbol, period, price_type, source, time) '
+                             'INCLUDE (open, high, low, close, volume) WHERE volume > 0').format(table=table))
+        curs.execute(sql.SQL('CREATE INDEX ON {table} USING BRIN (time)').format(table=table))
+        curs.execute(sql.SQL('VACUUM ANALYZE {table}').format(table=table))
+
+        print('=' * 32, 'After', '=' * 32)
+        print(explain(curs, query, params))
+
+        curs.execute(sql.SQL('SELECT indexrelname, pg_size_pretty(pg_relation_size(indexrelid)) '
+                             'FROM pg_stat_user_indexes WHERE relname = %s'), (BENCHMARK_TABLE_NAME,))
+        print('=' * 32, 'Index sizes', '=' * 32)
+        for name, size in curs.fetchall():
+            print(f'{name}: {size}')
+
+        curs.execute(sql.SQL('DROP TABLE {table}').format(table=table))
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
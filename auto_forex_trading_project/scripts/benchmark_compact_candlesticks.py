@@ -0,0 +1,127 @@
+#!/home/paullam/auto_forex_trading_project/venv/bin/python3
+from psycopg2 import sql
+
+import argparse
+import psycopg2
+
+'''
+Compare table size, index size and feed query time of candlesticks_candlestick
+against the compact integer-pipette layout of candlesticks_compactcandlestick (migration 0016)
+
+Synthetic M1 bars of 28 symbols are generated into scratch tables,
+so that the benchmark does not touch the real tables
+'''
+
+SYMBOLS = [
+    'AUDCAD', 'AUDCHF', 'AUDJPY', 'AUDNZD', 'AUDUSD', 'CADCHF',
+    'CADJPY', 'CHFJPY', 'EURAUD', 'EURCAD', 'EURCHF', 'EURGBP',
+    'EURJPY', 'EURNZD', 'EURUSD', 'GBPAUD', 'GBPCAD', 'GBPCHF',
+    'GBPJPY', 'GBPNZD', 'GBPUSD', 'NZDCAD', 'NZDCHF', 'NZDJPY',
+    'NZDUSD', 'USDCAD', 'USDCHF', 'USDJPY',
+]
+
+BENCHMARK_TABLE_NAME = 'benchmark_candlesticks_candlestick'
+BENCHMARK_COMPACT_TABLE_NAME = 'benchmark_candlesticks_compactcandlestick'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark compact candlesticks table')
+
+    parser.add_argument('--rows', '-n', type=int,
+                        default=5000000, required=False,
+                        help='number of synthetic bars.')
+
+    parser.add_argument('--symbol', '-s', choices=SYMBOLS,
+                        default='EURUSD', required=False,
+                        help='symbol of the benchmark query.')
+
+    parser.add_argument('--days', '-d', type=int,
+                        default=30, required=False,
+                        help='number of days covered by the benchmark query.')
+
+    return parser.parse_args()
+
+
+def explain(curs, query, params):
+    curs.execute(sql.SQL('EXPLAIN (ANALYZE, BUFFERS) ') + query, params)
+    return '\n'.join(row[0] for row in curs.fetchall())
+
+
+def print_sizes(curs, table_name):
+    curs.execute('SELECT pg_size_pretty(pg_table_size(%s)), pg_size_pretty(pg_indexes_size(%s))', (table_name, table_name))
+    table_size, indexes_size = curs.fetchone()
+    print(f'{table_name}: table {table_size}, indexes {indexes_size}')
+
+
+def main():
+    args = parse_args()
+    table = sql.Identifier(BENCHMARK_TABLE_NAME)
+    compact_table = sql.Identifier(BENCHMARK_COMPACT_TABLE_NAME)
+
+    conn = psycopg2.connect(database='forex')
+    conn.autocommit = True
+    with conn.cursor() as curs:
+        curs.execute(sql.SQL('DROP TABLE IF EXISTS {table}, {compact_table}').format(table=table, compact_table=compact_table))
+        curs.execute(sql.SQL('CREATE TABLE {table} (LIKE {source_table})').format(table=table,
+                                                                                   source_table=sql.Identifier('candlesticks_candlestick')))
+        curs.execute(sql.SQL('CREATE TABLE {table} (LIKE {source_table})').format(table=compact_table,
+                                                                                   source_table=sql.Identifier('candlesticks_compactcandlestick')))
+
+        print(f'Generating {args.rows} bars...')
+        curs.execute(sql.SQL('INSERT INTO {table} (id, symbol, time, open, high, low, close, volume, period, source, price_type) '
+                             'SELECT g, (%s::varchar[])[1 + g %% 28], '
+                             'TIMESTAMP \'2003-05-04\' + (g / 28) * INTERVAL \'1 minute\', '
+                             '1.10001, 1.10011, 1.09991, 1.10005, 1.5, '
+                             '1, \'Dukascopy\', \'BID\' '
+                             'FROM generate_series(0, %s - 1) AS g').format(table=table),
+                     (SYMBOLS, args.rows))
+        curs.execute(sql.SQL('INSERT INTO {compact_table} (id, symbol, minute, open_pipettes, high_pipettes, low_pipettes, close_pipettes, '
+                             'volume, period, source, price_type) '
+                             'SELECT id, symbol, FLOOR(EXTRACT(EPOCH FROM time) / 60)::INTEGER, '
+                             'ROUND(open * 100000)::INTEGER, ROUND(high * 100000)::INTEGER, '
+                             'ROUND(low * 100000)::INTEGER, ROUND(close * 100000)::INTEGER, '
+                             'volume::REAL, period, source, price_type FROM {table}').format(table=table, compact_table=compact_table))
+
+        # same feed indexes as the real tables
+        curs.execute(sql.SQL('ALTER TABLE {table} ADD PRIMARY KEY (id)').format(table=table))
+        curs.execute(sql.SQL('CREATE INDEX ON {table} (symbol, period, price_type, source, time) '
+                             'INCLUDE (open, high, low, close, volume) WHERE volume > 0').format(table=table))
+        curs.execute(sql.SQL('ALTER TABLE {table} ADD PRIMARY KEY (id)').format(table=compact_table))
+        curs.execute(sql.SQL('CREATE UNIQUE INDEX ON {table} (symbol, period, price_type, source, minute) '
+                             'INCLUDE (open_pipettes, high_pipettes, low_pipettes, close_pipettes, volume)').format(table=compact_table))
+        curs.execute(sql.SQL('VACUUM ANALYZE {table}').format(table=table))
+        curs.execute(sql.SQL('VACUUM ANALYZE {table}').format(table=compact_table))
+
+        print('=' * 32, 'Sizes', '=' * 32)
+        print_sizes(curs, BENCHMARK_TABLE_NAME)
+        print_sizes(curs, BENCHMARK_COMPACT_TABLE_NAME)
+
+        curs.execute(sql.SQL('SELECT MIN(time), MAX(time) FROM {table}').format(table=table))
+        time_from, time_before = curs.fetchone()
+        time_from = time_from + (time_before - time_from) / 2  # query the middle of the table
+        minute_from = int(time_from.timestamp()) // 60
+        minute_before = minute_from + args.days * 1440
+
+        query = sql.SQL('SELECT time, open, high, low, close, volume FROM {table} '
+                        'WHERE (symbol = %s AND period = 1 AND price_type = \'BID\' AND source = \'Dukascopy\' AND '
+                        'volume > 0 AND time BETWEEN TO_TIMESTAMP(%s * 60) AND TO_TIMESTAMP(%s * 60)) '
+                        'ORDER BY time').format(table=table)
+        compact_query = sql.SQL('SELECT minute, open_pipettes, high_pipettes, low_pipettes, close_pipettes, volume FROM {table} '
+                                'WHERE (symbol = %s AND period = 1 AND price_type = \'BID\' AND source = \'Dukascopy\' AND '
+                                'volume > 0 AND minute BETWEEN %s AND %s) '
+                                'ORDER BY minute').format(table=compact_table)
+        params = (args.symbol, minute_from, minute_before)
+
+        print('=' * 32, 'Candlestick', '=' * 32)
+        print(explain(curs, query, params))
+
+        print('=' * 32, 'CompactCandlestick', '=' * 32)
+        print(explain(curs, compact_query, params))
+
+        curs.execute(sql.SQL('DROP TABLE {table}, {compact_table}').format(table=table, compact_table=compact_table))
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/home/paullam/auto_forex_trading_project/venv/bin/python3
+import sys
+# Connect to existing project utilities
+sys.path.append('/home/paullam/auto_forex_trading_project/auto_forex_trading_project/')
+
+from utils.constants import *
+from utils.datafeeds import PSQLData
+from utils.psql import get_pool
+
+from datetime import datetime
+
+import argparse
+import psycopg2
+import time
+
+'''
+Compare connection setup of feeds connecting one by one against feeds checking out connections of the pool
+
+A strategy on 28 pairs of bid and ask prices, like CurrencyStrength or ACSTrailing, streams 56 feeds at once,
+so every feed holds a connection until all of them have been queried, and bars are loaded by turns like cerebro does.
+'''
+
+
+class ConnectingPSQLData(PSQLData):
+    # a connection of its own per feed, as before the pool
+    def _connect_db(self):
+        return psycopg2.connect(database=DATABASE_NAME)
+
+    def _close_db(self):
+        if self.cursor is not None:
+            self.cursor.close()
+        if self.conn is not None:
+            self.conn.close()
+        self.cursor = None
+        self.conn = None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark connection pool of feeds')
+
+    parser.add_argument('--feeds', '-n', type=int,
+                        default=2 * len(SYMBOLS), required=False,
+                        help='number of feeds streamed at once.')
+
+    parser.add_argument('--period', '-p', choices=PERIODS.keys(),
+                        default='H1', required=False,
+                        help='timeframe period to be loaded.')
+
+    parser.add_argument('--fromdate', '-f', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2021, 1, 4), required=False,
+                        help='first date to be loaded, in YYYY-MM-DD.')
+
+    parser.add_argument('--todate', '-t', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2021, 1, 9), required=False,
+                        help='date to be loaded before, in YYYY-MM-DD.')
+
+    parser.add_argument('--repeat', '-r', type=int,
+                        default=5, required=False,
+                        help='number of runs, the best is reported.')
+
+    return parser.parse_args()
+
+
+def connect(n):
+    conns = [psycopg2.connect(database=DATABASE_NAME) for _ in range(n)]
+    for conn in conns:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    for conn in conns:
+        conn.close()
+
+
+def check_out(n):
+    # all n connections are held at once, as by feeds streaming together
+    pool = get_pool()
+    conns = [pool.getconn() for _ in range(n)]
+    for conn in conns:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    for conn in conns:
+        pool.putconn(conn)
+
+
+def load_feeds(feed_class, args):
+    # every feed of the run is open together, like feeds added to one cerebro
+    feeds = []
+    for i in range(args.feeds):
+        data = feed_class(symbol=SYMBOLS[i // 2 % len(SYMBOLS)], period=args.period, price_type=('BID', 'ASK')[i % 2],
+                          fromdate=args.fromdate, todate=args.todate, stream=True)
+        bt.Cerebro().adddata(data)  # feeds get calendar and timezone settings from cerebro
+        data._start()
+        feeds.append(data)
+
+    # every feed is queried before any bar is loaded, so that all of them hold a connection at once
+    for data in feeds:
+        data._execute()
+
+    number_of_bars = 0
+    loading = feeds
+    while loading:
+        loading = [data for data in loading if data.load()]
+        number_of_bars += len(loading)
+
+    for data in feeds:
+        data.stop()
+    return number_of_bars
+
+
+def best_time(function, repeat):
+    elapsed = []
+    for _ in range(repeat):
+        time_start = time.perf_counter()
+        result = function()
+        elapsed.append(time.perf_counter() - time_start)
+    return min(elapsed), result
+
+
+def main():
+    # get command *args
+    args = parse_args()
+
+    # connecting runs first, as connections kept idle by the pool count against max_connections of the server
+    connect_time, _ = best_time(lambda: connect(args.feeds), args.repeat)
+    connecting_time, expected = best_time(lambda: load_feeds(ConnectingPSQLData, args), args.repeat)
+
+    # fill the pool, so that checkouts measure reuse rather than the first connections
+    load_feeds(PSQLData, args)
+    print(f'pool after first run: {get_pool().stats}')
+
+    check_out_time, _ = best_time(lambda: check_out(args.feeds), args.repeat)
+    pooled_time, number_of_bars = best_time(lambda: load_feeds(PSQLData, args), args.repeat)
+    assert number_of_bars == expected
+
+    print(f'{args.feeds} connections: connect {connect_time * 1000:.1f}ms, pool {check_out_time * 1000:.1f}ms, '
+          f'saved {(connect_time - check_out_time) * 1000:.1f}ms')
+    print(f'{args.feeds} feeds, {number_of_bars} bars: connect {connecting_time * 1000:.1f}ms, pool {pooled_time * 1000:.1f}ms, '
+          f'saved {(connecting_time - pooled_time) * 1000:.1f}ms')
+    print(f'pool: {get_pool().stats}')
+
+
+if __name__ == '__main__':
+    main()
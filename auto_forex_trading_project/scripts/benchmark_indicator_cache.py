@@ -0,0 +1,161 @@
+#!/home/paullam/auto_forex_trading_project/venv/bin/python3
+import sys
+# Connect to existing project utilities
+sys.path.append('/home/paullam/auto_forex_trading_project/auto_forex_trading_project/')
+
+from utils.constants import *
+from utils.datafeeds import PSQLData
+from utils.indicators import CachedRSI, PrecomputedSMA
+from utils.optimizations import CeleryCerebro
+from utils.testcases import rsi_testcase_generator, sma_testcase_generator
+
+from datetime import datetime
+
+import argparse
+import math
+import os
+import time
+
+'''
+Compare the indicator time of a sweep by CeleryCerebro, computing the indicators of backtrader for every test case
+against reading them from the IndicatorCache of the data, see utils.indicatorcache,
+and check that the crossovers are identical
+
+Strategies only compute the indicators and a crossover, so that the time is that of the indicators.
+'''
+
+
+class CrossoverSweep(bt.Strategy):
+    params = (
+        ('optimization_dict', dict()),
+        ('indicator', bt.ind.SMA),
+
+        ('fast_ma_period', 50),
+        ('slow_ma_period', 200),
+    )
+
+    def __init__(self):
+        for key, value in self.p.optimization_dict.items():
+            setattr(self.p, key, value)
+
+        self.indicators = [self.p.indicator(period=self.p.fast_ma_period), self.p.indicator(period=self.p.slow_ma_period)]
+        self.crossover = bt.ind.CrossOver(*self.indicators)
+
+
+class BandsSweep(bt.Strategy):
+    params = (
+        ('optimization_dict', dict()),
+        ('indicator', bt.ind.RSI),
+
+        ('use_strength', False),
+        ('period', 14),
+        ('upperband', 70.0),
+        ('lowerband', 30.0),
+    )
+
+    def __init__(self):
+        for key, value in self.p.optimization_dict.items():
+            setattr(self.p, key, value)
+
+        self.indicators = [self.p.indicator(period=self.p.period, upperband=self.p.upperband, lowerband=self.p.lowerband,
+                                            safediv=True)]
+        self.crossover = bt.ind.CrossOver(self.indicators[0], self.p.lowerband) - bt.ind.CrossOver(self.indicators[0], self.p.upperband)
+
+
+# strategy, test case generator, and indicators of backtrader and of the cache of every sweep
+SWEEPS = {
+    'sma': (CrossoverSweep, sma_testcase_generator, bt.ind.SMA, PrecomputedSMA),
+    'rsi': (BandsSweep, rsi_testcase_generator, bt.ind.RSI, CachedRSI),
+}
+
+
+class Crossovers(bt.Analyzer):
+    def start(self):
+        self.rets['crossovers'] = []
+        self.rets['sums'] = [0.0] * len(self.strategy.indicators)
+
+    def next(self):
+        if self.strategy.crossover[0] != 0:
+            self.rets['crossovers'].append((len(self.strategy), self.strategy.crossover[0]))
+
+        for i, indicator in enumerate(self.strategy.indicators):
+            if not math.isnan(indicator[0]):
+                self.rets['sums'][i] += indicator[0]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark indicator cache of optimization')
+
+    parser.add_argument('--sweep', choices=SWEEPS.keys(),
+                        default='sma', required=False,
+                        help='strategy and test case generator to be swept.')
+
+    parser.add_argument('--symbol', '-s', choices=SYMBOLS,
+                        default='EURUSD', required=False,
+                        help='symbol to be loaded.')
+
+    parser.add_argument('--period', '-p', choices=PERIODS.keys(),
+                        default='M1', required=False,
+                        help='timeframe period to be loaded.')
+
+    parser.add_argument('--fromdate', '-f', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2019, 1, 1), required=False,
+                        help='first date to be loaded, in YYYY-MM-DD.')
+
+    parser.add_argument('--todate', '-t', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2019, 2, 1), required=False,
+                        help='date to be loaded before, in YYYY-MM-DD.')
+
+    parser.add_argument('--max_period', '-m', type=int,
+                        default=20, required=False,
+                        help='maximum period of moving averages, or of RSI.')
+
+    parser.add_argument('--wind_step', type=float,
+                        default=5.0, required=False,
+                        help='step of the bands of RSI.')
+
+    parser.add_argument('--runonce', action='store_true',
+                        help='run indicators by once() rather than next().')
+
+    parser.add_argument('--maxcpus', '-c', type=int,
+                        default=os.cpu_count(), required=False,
+                        help='number of worker processes.')
+
+    return parser.parse_args()
+
+
+def run_sweep(args, strategy, testcases, indicator):
+    cerebro = CeleryCerebro(maxcpus=max(args.maxcpus, 2), optreturn=True)  # a single cpu would keep the cache for later runs
+    cerebro.adddata(PSQLData(symbol=args.symbol, period=args.period, fromdate=args.fromdate, todate=args.todate, cache=True),
+                    name=args.symbol)
+    cerebro.addanalyzer(Crossovers)
+    cerebro.optstrategy(strategy, indicator=indicator, optimization_dict=testcases)
+
+    time_start = time.perf_counter()
+    runstrats = cerebro.run(runonce=args.runonce, stdstats=False)
+    elapsed = time.perf_counter() - time_start
+
+    results = [(strats[0].p.optimization_dict, strats[0].analyzers.crossovers.get_analysis()) for strats in runstrats]
+    hits = sum(strats[0].indicator_cache_stats['hits'] for strats in runstrats)
+    lookups = hits + sum(strats[0].indicator_cache_stats['misses'] for strats in runstrats)
+    return results, elapsed, hits / lookups if lookups else None
+
+
+def main():
+    # get command *args
+    args = parse_args()
+
+    strategy, generator, indicator, cached_indicator = SWEEPS[args.sweep]
+    testcases = list(generator(max_period=args.max_period, **(dict(wind_step=args.wind_step) if args.sweep == 'rsi' else {})))
+
+    expected, expected_time, _ = run_sweep(args, strategy, testcases, indicator)
+    results, elapsed, hit_ratio = run_sweep(args, strategy, testcases, cached_indicator)
+    assert repr(results) == repr(expected)
+
+    print(f'{len(expected)} test cases, {args.maxcpus} workers')
+    print(f'{indicator.__name__}: {expected_time:.1f}s')
+    print(f'{cached_indicator.__name__}: {elapsed:.1f}s, hit ratio {hit_ratio:.1%}')
+
+
+if __name__ == '__main__':
+    main()
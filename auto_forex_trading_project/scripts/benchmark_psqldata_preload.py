@@ -0,0 +1,74 @@
+#!/home/paullam/auto_forex_trading_project/venv/bin/python3
+import sys
+# Connect to existing project utilities
+sys.path.append('/home/paullam/auto_forex_trading_project/auto_forex_trading_project/')
+
+from utils.constants import *
+from utils.datafeeds import PSQLData
+
+from datetime import datetime
+
+import argparse
+import time
+
+'''
+Compare preload time of PSQLData by the per-bar _load loop of backtrader
+against the bulk preload filling line buffers from numpy columns, and check that the lines are identical
+'''
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark bulk preload of PSQLData')
+
+    parser.add_argument('--symbol', '-s', choices=SYMBOLS,
+                        default='EURUSD', required=False,
+                        help='symbol to be loaded.')
+
+    parser.add_argument('--period', '-p', choices=PERIODS.keys(),
+                        default='M1', required=False,
+                        help='timeframe period to be loaded.')
+
+    parser.add_argument('--fromdate', '-f', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2019, 1, 1), required=False,
+                        help='first date to be loaded, in YYYY-MM-DD.')
+
+    parser.add_argument('--todate', '-t', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2021, 1, 1), required=False,
+                        help='date to be loaded before, in YYYY-MM-DD.')
+
+    parser.add_argument('--compact', '-c', action='store_true',
+                        help='read compact candlesticks.')
+
+    return parser.parse_args()
+
+
+def load(args, preload):
+    data = PSQLData(symbol=args.symbol, period=args.period, fromdate=args.fromdate, todate=args.todate, compact=args.compact)
+    bt.Cerebro().adddata(data)  # feeds get calendar and timezone settings from cerebro
+
+    time_start = time.perf_counter()
+    data._start()
+    preload(data)
+    elapsed = time.perf_counter() - time_start
+
+    return {datafield: getattr(data.lines, datafield).array for datafield in data.getlinealiases()}, elapsed
+
+
+def main():
+    # get command *args
+    args = parse_args()
+
+    # preload of backtrader calls load() and _load() once per bar
+    expected, per_bar_time = load(args, lambda data: bt.feed.AbstractDataBase.preload(data))
+    lines, bulk_time = load(args, lambda data: data.preload())
+
+    assert all(len(lines[datafield]) == len(expected[datafield]) for datafield in expected)
+    assert all(repr(lines[datafield]) == repr(expected[datafield]) for datafield in expected)  # NaN compares by repr
+
+    print(f'{len(lines["datetime"])} bars')
+    print(f'per-bar preload: {per_bar_time:.2f}s')
+    print(f'bulk preload: {bulk_time:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
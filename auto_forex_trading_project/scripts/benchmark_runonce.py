@@ -0,0 +1,154 @@
+#!/home/paullam/auto_forex_trading_project/venv/bin/python3
+import sys
+# Connect to existing project utilities
+sys.path.append('/home/paullam/auto_forex_trading_project/auto_forex_trading_project/')
+
+from utils.commissions import ForexCommission
+from utils.constants import *
+from utils.datafeeds import PSQLData
+from utils.optimizations import CeleryCerebro, Optimizer
+from utils.strategies import MovingAveragesCrossover, RSIPositionSizing
+from utils.testcases import rsi_sizing_testcase_generator, rsi_testcase_generator, sma_testcase_generator
+
+from datetime import datetime
+
+import argparse
+import numpy as np
+import os
+import pandas as pd
+import time
+
+'''
+Compare a sweep by backtrader run bar by bar against the same sweep in runonce mode,
+set up like the optimization of celery_backtest, and check that strats_df are identical
+
+With --synthetic, bars are a random walk over weekdays of the date range instead of bars of the database,
+so that multi-year sweeps can be timed where the database holds fewer years
+'''
+
+# strategy and test case generator of every sweep
+SWEEPS = {
+    'sma': (MovingAveragesCrossover, sma_testcase_generator),
+    'rsi': (RSIPositionSizing, rsi_testcase_generator),
+    'rsi_sizing': (RSIPositionSizing, rsi_sizing_testcase_generator),
+}
+
+
+class OptimizerBenchmark(Optimizer):
+    def __init__(self, cerebro, strategy, testcases):
+        # the same test cases for both modes, as random pairs of the generator differ by call
+        self.cerebro = cerebro
+        self.strategy, self.generator, self.kwargs, self.engine = strategy, lambda: testcases, {}, 'backtrader'
+
+        self.cerebro.optstrategy(strategy, optimization_dict=testcases)
+
+    def bt_opt_callback(self, cb):
+        return
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark runonce mode of optimization')
+
+    parser.add_argument('--sweep', choices=SWEEPS.keys(),
+                        default='sma', required=False,
+                        help='strategy and test case generator to be swept.')
+
+    parser.add_argument('--symbol', '-s', choices=SYMBOLS,
+                        default='EURUSD', required=False,
+                        help='symbol to be loaded.')
+
+    parser.add_argument('--period', '-p', choices=PERIODS.keys(),
+                        default='H1', required=False,
+                        help='timeframe period to be loaded.')
+
+    parser.add_argument('--fromdate', '-f', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2018, 1, 1), required=False,
+                        help='first date to be loaded, in YYYY-MM-DD.')
+
+    parser.add_argument('--todate', '-t', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2021, 1, 1), required=False,
+                        help='date to be loaded before, in YYYY-MM-DD.')
+
+    parser.add_argument('--max_period', '-m', type=int,
+                        default=20, required=False,
+                        help='maximum period of moving averages, or of RSI.')
+
+    parser.add_argument('--n', '-n', type=int,
+                        default=0, required=False,
+                        help='number of random test cases of the generator, 0 for every test case.')
+
+    parser.add_argument('--cash', type=float,
+                        default=200000, required=False,
+                        help='starting cash, low cash makes the broker reject orders.')
+
+    parser.add_argument('--maxcpus', '-c', type=int,
+                        default=os.cpu_count(), required=False,
+                        help='number of worker processes of backtrader.')
+
+    parser.add_argument('--synthetic', action='store_true',
+                        help='random walk bars instead of bars of the database.')
+
+    return parser.parse_args()
+
+
+def get_synthetic_data(args):
+    # random walk of EURUSD like bars, one every period on weekdays
+    minutes, timeframe, compression = PERIODS[args.period]
+    index = pd.date_range(args.fromdate, args.todate, freq=f'{minutes}min', inclusive='left')
+    index = index[index.dayofweek < 5]
+
+    random = np.random.default_rng(0)
+    close = 1.15 + np.cumsum(random.normal(0.0, 0.0001 * minutes ** 0.5, len(index)))
+    opens = np.concatenate(([close[0]], close[:-1]))
+    spread = random.uniform(0.0, 0.00005 * minutes ** 0.5, len(index))
+    df = pd.DataFrame(dict(open=opens, high=np.maximum(opens, close) + spread, low=np.minimum(opens, close) - spread, close=close,
+                           volume=random.integers(100, 1000, len(index)), openinterest=0.0), index=index)
+    return bt.feeds.PandasData(dataname=df, timeframe=timeframe, compression=compression)
+
+
+def run_sweep(args, strategy, testcases, runonce):
+    # same cerebro as celery_backtest
+    cerebro = CeleryCerebro(maxcpus=max(args.maxcpus, 2))  # a single cpu would start datas again for every test case
+    cerebro.broker.setcash(args.cash)
+    cerebro.broker.addcommissioninfo(ForexCommission(leverage=1, margin=args.cash))
+    if args.synthetic:
+        data = get_synthetic_data(args)
+    else:
+        data = PSQLData(symbol=args.symbol, period=args.period, fromdate=args.fromdate, todate=args.todate, cache=True)
+    cerebro.adddata(data, name=args.symbol)
+    cerebro.addanalyzer(bt.analyzers.DrawDown)
+    cerebro.addanalyzer(bt.analyzers.Returns)
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio)
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer)
+    cerebro.addanalyzer(bt.analyzers.Transactions, headers=True)
+
+    optimizer = OptimizerBenchmark(cerebro, strategy, testcases)
+    time_start = time.perf_counter()
+    optimizer.start(runonce=runonce)
+    return optimizer.strats_df, time.perf_counter() - time_start
+
+
+def main():
+    # get command *args
+    args = parse_args()
+
+    strategy, generator = SWEEPS[args.sweep]
+    testcases = list(generator(n=args.n, max_period=args.max_period))
+    expected_df, next_time = run_sweep(args, strategy, testcases, False)
+    runonce_df, runonce_time = run_sweep(args, strategy, testcases, True)
+
+    # NaN of analyzers are compared by their repr
+    mismatches = [(i, column, expected_df.at[i, column], runonce_df.at[i, column])
+                  for i in expected_df.index for column in expected_df.columns
+                  if repr(expected_df.at[i, column]) != repr(runonce_df.at[i, column])]
+    for mismatch in mismatches:
+        print('mismatch', *mismatch)
+
+    print(f'{len(expected_df)} test cases')
+    print(f'next: {next_time:.2f}s')
+    print(f'runonce: {runonce_time:.2f}s')
+    assert list(runonce_df.columns) == list(expected_df.columns) and not mismatches
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/home/paullam/auto_forex_trading_project/venv/bin/python3
+import sys
+# Connect to existing project utilities
+sys.path.append('/home/paullam/auto_forex_trading_project/auto_forex_trading_project/')
+
+from utils.constants import *
+from utils.datafeeds import PSQLData, PSQLSeriesLoader
+
+from datetime import datetime
+
+import argparse
+import time
+
+'''
+Compare setup time of 56 feeds of 28 symbols of bid and ask prices, as CurrencyStrength and ACSTrailing use,
+by a PSQLData per series against PSQLSeriesLoader reading all series by one query, and check that the lines are identical
+'''
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark multi-series loader')
+
+    parser.add_argument('--period', '-p', choices=PERIODS.keys(),
+                        default='H1', required=False,
+                        help='timeframe period to be loaded.')
+
+    parser.add_argument('--fromdate', '-f', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2019, 1, 1), required=False,
+                        help='first date to be loaded, in YYYY-MM-DD.')
+
+    parser.add_argument('--todate', '-t', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2021, 1, 1), required=False,
+                        help='date to be loaded before, in YYYY-MM-DD.')
+
+    parser.add_argument('--price_types', '-pt', choices=PRICE_TYPES, nargs='+',
+                        default=['BID', 'ASK'], required=False,
+                        help='price types to be loaded.')
+
+    parser.add_argument('--source', '-src', default='Dukascopy', required=False,
+                        help='source of bars to be loaded.')
+
+    return parser.parse_args()
+
+
+def preload(datas):
+    cerebro = bt.Cerebro()
+    for data in datas:
+        cerebro.adddata(data)  # feeds get calendar and timezone settings from cerebro
+        data._start()
+        data.preload()
+
+    return [{datafield: getattr(data.lines, datafield).array for datafield in data.getlinealiases()} for data in datas]
+
+
+def main():
+    # get command *args
+    args = parse_args()
+
+    time_start = time.perf_counter()
+    expected = preload([PSQLData(symbol=symbol, period=args.period, price_type=price_type, fromdate=args.fromdate, todate=args.todate,
+                                 source=args.source)
+                        for price_type in args.price_types for symbol in SYMBOLS])
+    per_feed_time = time.perf_counter() - time_start
+
+    time_start = time.perf_counter()
+    loader = PSQLSeriesLoader(SYMBOLS, price_types=args.price_types, period=args.period, fromdate=args.fromdate, todate=args.todate,
+                              source=args.source)
+    lines = preload(loader.getdatas())
+    loader_time = time.perf_counter() - time_start
+
+    for expected_lines, series_lines in zip(expected, lines):
+        assert all(repr(series_lines[datafield]) == repr(expected_lines[datafield]) for datafield in expected_lines)  # NaN compares by repr
+
+    print(f'{len(lines)} feeds, {sum(len(series_lines["datetime"]) for series_lines in lines)} bars')
+    print(f'feed per series: {per_feed_time:.2f}s')
+    print(f'single query: {loader_time:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
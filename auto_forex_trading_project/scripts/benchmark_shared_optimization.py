@@ -0,0 +1,162 @@
+#!/home/paullam/auto_forex_trading_project/venv/bin/python3
+import sys
+# Connect to existing project utilities
+sys.path.append('/home/paullam/auto_forex_trading_project/auto_forex_trading_project/')
+
+from utils.commissions import ForexCommission
+from utils.constants import *
+from utils.datafeeds import PSQLData
+from utils.optimizations import CeleryCerebro
+from utils.strategies import MovingAveragesCrossover
+from utils.testcases import sma_testcase_generator
+
+from datetime import datetime
+
+import argparse
+import numpy as np
+import os
+import pandas as pd
+import threading
+import time
+
+'''
+Compare wall time and peak memory of an SMA sweep by CeleryCerebro,
+pickling preloaded datas to workers for every test case against sharing their lines in shared memory,
+and check that the results are identical
+
+Memory is the sum of proportional set size (PSS) of the process and its workers, sampled while the sweep runs,
+so that pages shared by workers are counted once.
+
+With --synthetic, bars are a random walk over weekdays of the date range instead of bars of the database.
+'''
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark shared-memory datas of optimization')
+
+    parser.add_argument('--symbol', '-s', choices=SYMBOLS,
+                        default='EURUSD', required=False,
+                        help='symbol to be loaded.')
+
+    parser.add_argument('--period', '-p', choices=PERIODS.keys(),
+                        default='M1', required=False,
+                        help='timeframe period to be loaded.')
+
+    parser.add_argument('--fromdate', '-f', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2019, 1, 1), required=False,
+                        help='first date to be loaded, in YYYY-MM-DD.')
+
+    parser.add_argument('--todate', '-t', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2019, 4, 1), required=False,
+                        help='date to be loaded before, in YYYY-MM-DD.')
+
+    parser.add_argument('--max_period', '-m', type=int,
+                        default=100, required=False,
+                        help='maximum period of moving averages, max_period * (max_period - 1) test cases.')
+
+    parser.add_argument('--maxcpus', '-c', type=int,
+                        default=os.cpu_count(), required=False,
+                        help='number of worker processes.')
+
+    parser.add_argument('--synthetic', action='store_true',
+                        help='random walk bars instead of bars of the database.')
+
+    return parser.parse_args()
+
+
+def get_pss(pid):
+    # kB of proportional set size, 0 if the process is gone
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1])
+    except (FileNotFoundError, ProcessLookupError):
+        pass
+    return 0
+
+
+def get_children(pid):
+    children = []
+    try:
+        for task in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                children += [int(child) for child in f.read().split()]
+    except FileNotFoundError:
+        pass
+    return children + [grandchild for child in children for grandchild in get_children(child)]
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        pid = os.getpid()
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, sum(get_pss(p) for p in [pid] + get_children(pid)))
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def get_synthetic_data(args):
+    # random walk of EURUSD like bars, one every period on weekdays
+    minutes, timeframe, compression = PERIODS[args.period]
+    index = pd.date_range(args.fromdate, args.todate, freq=f'{minutes}min', inclusive='left')
+    index = index[index.dayofweek < 5]
+
+    random = np.random.default_rng(0)
+    close = 1.15 + np.cumsum(random.normal(0.0, 0.0001 * minutes ** 0.5, len(index)))
+    opens = np.concatenate(([close[0]], close[:-1]))
+    spread = random.uniform(0.0, 0.00005 * minutes ** 0.5, len(index))
+    df = pd.DataFrame(dict(open=opens, high=np.maximum(opens, close) + spread, low=np.minimum(opens, close) - spread, close=close,
+                           volume=random.integers(100, 1000, len(index)), openinterest=0.0), index=index)
+    return bt.feeds.PandasData(dataname=df, timeframe=timeframe, compression=compression)
+
+
+def run_sweep(args, shareddatas):
+    cerebro = CeleryCerebro(maxcpus=args.maxcpus, shareddatas=shareddatas, optreturn=True)
+    cerebro.broker.setcash(200000)
+    cerebro.broker.addcommissioninfo(ForexCommission(leverage=1, margin=200000))
+    if args.synthetic:
+        data = get_synthetic_data(args)
+    else:
+        data = PSQLData(symbol=args.symbol, period=args.period, fromdate=args.fromdate, todate=args.todate)
+    cerebro.adddata(data, name=args.symbol)
+    cerebro.addanalyzer(bt.analyzers.Returns)
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer)
+    cerebro.optstrategy(MovingAveragesCrossover, optimization_dict=sma_testcase_generator(max_period=args.max_period))
+
+    sampler = MemorySampler()
+    sampler.start()
+    time_start = time.perf_counter()
+    runstrats = cerebro.run(runonce=False, stdstats=False)
+    elapsed = time.perf_counter() - time_start
+    sampler.stop()
+
+    results = [(strats[0].p.optimization_dict, strats[0].analyzers.returns.get_analysis(),
+                strats[0].analyzers.tradeanalyzer.get_analysis().get('total')) for strats in runstrats]
+    return results, elapsed, sampler.peak
+
+
+def main():
+    # get command *args
+    args = parse_args()
+
+    expected, pickled_time, pickled_peak = run_sweep(args, shareddatas=False)
+    results, shared_time, shared_peak = run_sweep(args, shareddatas=True)
+    assert repr(results) == repr(expected)
+
+    print(f'{len(results)} test cases, {args.maxcpus} workers')
+    print(f'pickled datas: {pickled_time:.1f}s, peak PSS {pickled_peak / 1024:.0f} MiB')
+    print(f'shared datas: {shared_time:.1f}s, peak PSS {shared_peak / 1024:.0f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/home/paullam/auto_forex_trading_project/venv/bin/python3
+import sys
+# Connect to existing project utilities
+sys.path.append('/home/paullam/auto_forex_trading_project/auto_forex_trading_project/')
+
+from utils.commissions import ForexCommission
+from utils.constants import *
+from utils.datafeeds import PSQLData
+from utils.optimizations import CeleryCerebro, Optimizer
+from utils.psql import get_period
+from utils.strategies import MovingAveragesCrossover, RSIPositionSizing
+from utils.testcases import rsi_sizing_testcase_generator, rsi_testcase_generator, sma_testcase_generator
+
+from datetime import datetime
+
+import argparse
+import math
+import numbers
+import os
+import time
+
+'''
+Compare a sweep by backtrader against the vectorized engine of utils.vectorized,
+set up like the optimization of celery_backtest, and check that strats_df agree within tolerance
+'''
+
+# strategy and test case generator of every sweep
+SWEEPS = {
+    'sma': (MovingAveragesCrossover, sma_testcase_generator),
+    'rsi': (RSIPositionSizing, rsi_testcase_generator),
+    'rsi_sizing': (RSIPositionSizing, rsi_sizing_testcase_generator),
+}
+
+
+class OptimizerBenchmark(Optimizer):
+    def __init__(self, cerebro, strategy, testcases, engine):
+        # the same test cases for both engines, as random pairs of the generator differ by call
+        self.cerebro = cerebro
+        self.strategy, self.generator, self.kwargs, self.engine = strategy, lambda: testcases, {}, engine
+
+        self.cerebro.optstrategy(strategy, optimization_dict=testcases)
+
+    def bt_opt_callback(self, cb):
+        return
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark vectorized engine of optimization')
+
+    parser.add_argument('--sweep', choices=SWEEPS.keys(),
+                        default='sma', required=False,
+                        help='strategy and test case generator to be swept.')
+
+    parser.add_argument('--symbol', '-s', choices=SYMBOLS,
+                        default='EURUSD', required=False,
+                        help='symbol to be loaded.')
+
+    parser.add_argument('--period', '-p', choices=PERIODS.keys(),
+                        default='H1', required=False,
+                        help='timeframe period to be loaded.')
+
+    parser.add_argument('--fromdate', '-f', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2019, 1, 1), required=False,
+                        help='first date to be loaded, in YYYY-MM-DD.')
+
+    parser.add_argument('--todate', '-t', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime(2020, 1, 1), required=False,
+                        help='date to be loaded before, in YYYY-MM-DD.')
+
+    parser.add_argument('--max_period', '-m', type=int,
+                        default=20, required=False,
+                        help='maximum period of moving averages, or of RSI.')
+
+    parser.add_argument('--n', '-n', type=int,
+                        default=0, required=False,
+                        help='number of random test cases of the generator, 0 for every test case.')
+
+    parser.add_argument('--cash', type=float,
+                        default=200000, required=False,
+                        help='starting cash, low cash makes the broker reject orders.')
+
+    parser.add_argument('--maxcpus', '-c', type=int,
+                        default=os.cpu_count(), required=False,
+                        help='number of worker processes of backtrader.')
+
+    parser.add_argument('--rel_tol', type=float,
+                        default=1e-6, required=False,
+                        help='relative tolerance of analyzer values.')
+
+    return parser.parse_args()
+
+
+def run_sweep(args, strategy, testcases, engine):
+    # same cerebro as celery_backtest
+    cerebro = CeleryCerebro(maxcpus=max(args.maxcpus, 2))  # a single cpu would start datas again for every test case
+    cerebro.broker.setcash(args.cash)
+    cerebro.broker.addcommissioninfo(ForexCommission(leverage=1, margin=args.cash))
+    # timeframe of the period like celery_backtest, which Returns counts periods of
+    _, timeframe, compression = get_period(args.period)
+    cerebro.adddata(PSQLData(symbol=args.symbol, period=args.period, timeframe=timeframe, compression=compression,
+                             fromdate=args.fromdate, todate=args.todate, cache=True),
+                    name=args.symbol)
+    cerebro.addanalyzer(bt.analyzers.DrawDown)
+    cerebro.addanalyzer(bt.analyzers.Returns)
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio)
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer)
+    cerebro.addanalyzer(bt.analyzers.Transactions, headers=True)
+
+    optimizer = OptimizerBenchmark(cerebro, strategy, testcases, engine)
+    time_start = time.perf_counter()
+    optimizer.start()
+    return optimizer.strats_df, time.perf_counter() - time_start
+
+
+def is_close(expected, value, rel_tol):
+    if isinstance(expected, numbers.Number) and isinstance(value, numbers.Number):
+        return math.isclose(expected, value, rel_tol=rel_tol, abs_tol=rel_tol)
+    return expected == value
+
+
+def main():
+    # get command *args
+    args = parse_args()
+
+    strategy, generator = SWEEPS[args.sweep]
+    testcases = list(generator(n=args.n, max_period=args.max_period))
+    vectorized_df, vectorized_time = run_sweep(args, strategy, testcases, 'vectorized')
+    expected_df, backtrader_time = run_sweep(args, strategy, testcases, 'backtrader')
+    assert list(vectorized_df.columns) == list(expected_df.columns)
+
+    mismatches = [(i, column, expected_df.at[i, column], vectorized_df.at[i, column])
+                  for i in expected_df.index for column in expected_df.columns
+                  if not is_close(expected_df.at[i, column], vectorized_df.at[i, column], args.rel_tol)]
+    for mismatch in mismatches:
+        print('mismatch', *mismatch)
+
+    print(f'{len(expected_df)} test cases')
+    print(f'backtrader: {backtrader_time:.2f}s')
+    print(f'vectorized: {vectorized_time:.2f}s')
+    assert not mismatches
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/home/paullam/auto_forex_trading_project/venv/bin/python3
+import sys
+# Connect to existing project utilities
+sys.path.append('/home/paullam/auto_forex_trading_project/auto_forex_trading_project/')
+
+from utils.barcache import invalidate_series
+from utils.constants import *
+from utils.psql import compact_candlesticks, get_pool
+
+from datetime import date, datetime, timedelta
+
+import argparse
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Copy candlesticks into compact integer-pipette table')
+
+    parser.add_argument('--symbols', '-s', choices=SYMBOLS, nargs='+',
+                        default=SYMBOLS, required=False,
+                        help='symbols to be copied.')
+
+    parser.add_argument('--price_types', '-pt', choices=PRICE_TYPES, nargs='+',
+                        default=PRICE_TYPES, required=False,
+                        help='price_types to be copied.')
+
+    parser.add_argument('--fromdate', '-from', type=date.fromisoformat,
+                        default=date(2003, 5, 4), required=False,
+                        help='date starting the copy (inclusive), in ISO format.')
+
+    parser.add_argument('--todate', '-to', type=date.fromisoformat,
+                        default=date.today(), required=False,
+                        help='date ending the copy (inclusive), in ISO format.')
+
+    return parser.parse_args()
+
+
+def main():
+    # get command *args
+    args = parse_args()
+
+    time_from = datetime.combine(args.fromdate, datetime.min.time())
+    time_before = datetime.combine(args.todate, datetime.min.time()) + timedelta(days=1, microseconds=-1)
+
+    with get_pool().connection() as conn, conn:
+        with conn.cursor() as cursor:
+            for symbol in args.symbols:
+                for price_type in args.price_types:
+                    time_start = time.perf_counter()
+                    number_of_bars = compact_candlesticks(cursor, symbol, price_type, time_from, time_before)
+                    print(f'{symbol} {price_type}: {number_of_bars} bars in {time.perf_counter() - time_start:.2f}s')
+
+    # compact bars are committed
+    for symbol in args.symbols:
+        for price_type in args.price_types:
+            invalidate_series(symbol, price_type)
+
+
+if __name__ == '__main__':
+    main()
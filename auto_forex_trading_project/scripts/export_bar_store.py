@@ -0,0 +1,49 @@
+#!/home/paullam/auto_forex_trading_project/venv/bin/python3
+import sys
+# Connect to existing project utilities
+sys.path.append('/home/paullam/auto_forex_trading_project/auto_forex_trading_project/')
+
+from utils.barstore import export_series
+from utils.constants import *
+from utils.psql import get_pool
+
+import argparse
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Export candlesticks from Database to memory-mappable bar store')
+
+    parser.add_argument('--symbols', '-s', choices=SYMBOLS, nargs='+',
+                        default=SYMBOLS, required=False,
+                        help='symbols to be exported.')
+
+    parser.add_argument('--periods', '-p', choices=PERIODS.keys(), nargs='+',
+                        default=list(PERIODS.keys()), required=False,
+                        help='timeframe periods to be exported.')
+
+    parser.add_argument('--price_types', '-pt', choices=PRICE_TYPES, nargs='+',
+                        default=PRICE_TYPES, required=False,
+                        help='price_types to be exported.')
+
+    parser.add_argument('--root', '-r', default=BAR_STORE_ROOT, required=False,
+                        help='root directory of bar store.')
+
+    return parser.parse_args()
+
+
+def main():
+    # get command *args
+    args = parse_args()
+
+    with get_pool().connection() as conn, conn:
+        for symbol in args.symbols:
+            for period in args.periods:
+                for price_type in args.price_types:
+                    time_start = time.perf_counter()
+                    number_of_bars = export_series(conn, args.root, symbol, period, price_type)
+                    print(f'{symbol} {period} {price_type}: {number_of_bars} bars in {time.perf_counter() - time_start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
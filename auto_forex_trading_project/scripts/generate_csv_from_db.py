@@ -1,11 +1,15 @@
 #!/home/paullam/auto_forex_trading_project/venv/bin/python3
+import sys
+# Connect to existing project utilities
+sys.path.append('/home/paullam/auto_forex_trading_project/auto_forex_trading_project/')
+
 from backtrader import TimeFrame
 from datetime import date
 from psycopg2 import sql
+from utils.psql import get_pool
 
 import argparse
 import csv
-import psycopg2
 
 
 PERIODS = {
@@ -72,10 +76,9 @@ def parse_args():
     return parser.parse_args()
 
 
-def generate_csv(symbol, period, fromdate, todate, price_type):
-    # connect to database
-    conn = psycopg2.connect(database='forex')
-    with conn:
+def generate_csv(symbol, period, fromdate, todate, price_type, source='Dukascopy'):
+    # check out a connection of the pool, time zone set below is reset when it is returned
+    with get_pool().connection() as conn, conn:
         with conn.cursor() as curs:
             # define query
             query = sql.SQL('SELECT {time}, {open}, {high}, {low}, {close}, {volume} '
@@ -83,10 +86,12 @@ def generate_csv(symbol, period, fromdate, todate, price_type):
                             'WHERE ({period} = %s AND '
                             '{price_type} = %s AND '
                             '{symbol} = %s AND '
+                            '{source} = %s AND '
                             '{volume} > 0 AND '
                             '{time} BETWEEN %s AND %s)'
                             'ORDER BY {time}').format(table=sql.Identifier('candlesticks_candlestick'),
                                                       symbol=sql.Identifier('symbol'),
+                                                      source=sql.Identifier('source'),
                                                       price_type=sql.Identifier('price_type'),
                                                       time=sql.Identifier('time'),
                                                       open=sql.Identifier('open'),
@@ -98,7 +103,7 @@ def generate_csv(symbol, period, fromdate, todate, price_type):
 
             # get query results
             curs.execute('SET TIME ZONE \'Hongkong\'')  # Convert to UTC timezone
-            curs.execute(query, (period, price_type, symbol, fromdate, todate))
+            curs.execute(query, (period, price_type, symbol, source, fromdate, todate))
             rows = curs.fetchall()
 
             if rows:
@@ -116,8 +121,6 @@ def generate_csv(symbol, period, fromdate, todate, price_type):
                         # remove timezone info from datetime
                         writer.writerow((row[0].strftime('%Y-%m-%d %H:%M:%S'), ) + row[1:])
 
-    conn.close()
-
 
 def main():
     # get command *args
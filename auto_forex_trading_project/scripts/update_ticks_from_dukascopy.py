@@ -0,0 +1,66 @@
+#!/home/paullam/auto_forex_trading_project/venv/bin/python3
+import sys
+# Connect to existing project utilities
+sys.path.append('/home/paullam/auto_forex_trading_project/auto_forex_trading_project/')
+
+from utils.constants import *
+from utils.dukascopy import DukascopyDownloader
+from utils.tickstore import ingest_day
+
+from datetime import date, datetime, timedelta
+
+import argparse
+import time
+
+# default parameters for data source
+DATA_ROOT = '/home/paullam/auto_forex_trading_project/data'
+REQUESTS_PER_SECOND = 4  # global rate limit of downloads
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Download Dukascopy ticks and write them into tick store')
+
+    parser.add_argument('--symbols', '-s', choices=SYMBOLS, nargs='+',
+                        default=['EURUSD'], required=False,
+                        help='symbols to be updated.')
+
+    parser.add_argument('--start_date', '-sd', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        default=date.today() - timedelta(days=7), required=False,
+                        help='first date to be updated, in YYYY-MM-DD.')
+
+    parser.add_argument('--end_date', '-ed', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        default=date.today(), required=False,
+                        help='date to be updated before, in YYYY-MM-DD.')
+
+    parser.add_argument('--data_root', '-d', default=DATA_ROOT, required=False,
+                        help='root directory of downloaded bi5 files.')
+
+    parser.add_argument('--root', '-r', default=TICK_STORE_ROOT, required=False,
+                        help='root directory of tick store.')
+
+    return parser.parse_args()
+
+
+def main():
+    # get command *args
+    args = parse_args()
+
+    downloader = DukascopyDownloader(args.data_root, rate=REQUESTS_PER_SECOND)
+
+    # a day at a time, so that memory is bounded by ticks of a day of a symbol
+    d = args.start_date
+    while d < args.end_date:
+        time_start = time.perf_counter()
+        downloader.download_ticks([(symbol, d, hour) for symbol in args.symbols for hour in range(24)])
+
+        for symbol in args.symbols:
+            number_of_ticks = ingest_day(args.data_root, args.root, symbol, d)
+            print(f'{symbol} {d}: {number_of_ticks} ticks in {time.perf_counter() - time_start:.2f}s')
+
+        d += timedelta(days=1)
+
+    downloader.close()
+
+
+if __name__ == '__main__':
+    main()
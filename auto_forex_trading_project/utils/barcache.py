@@ -0,0 +1,224 @@
+from utils.constants import *
+
+from collections import OrderedDict
+from pathlib import Path
+
+import io
+import numpy as np
+import os
+import threading
+
+'''
+Two-tier cache of bars read by PSQLData
+
+Bars of a query are cached as float64 columns of line aliases, datetime as backtrader date numbers,
+keyed by series (source, symbol, price_type, period, compact) and the [fromdate, todate] range they were read for.
+    - memory: an LRU of columns per process, e.g. per Celery worker, bounded by BAR_CACHE_MAX_BYTES
+    - disk: compressed `.npz` files shared by processes of the host, bounded by BAR_CACHE_MAX_DISK_BYTES,
+      least recently used files first as a disk hit touches its file
+        {root}/{source}/{symbol}/{price_type}/{period}/{generation}_{fromdate}_{todate}.npz
+A cached range serves any range within it, sliced by time.
+
+Writers of bars call invalidate_series() once their transaction is committed, which bumps the generation of the series
+and removes its files. Entries are tagged with the generation read before bars are queried,
+so entries of an older generation, even those put by a query racing with the write, are never served.
+'''
+
+# bytes of columns kept in memory by a process
+BAR_CACHE_MAX_BYTES = int(os.environ.get('FOREX_BAR_CACHE_MAX_BYTES', 512 * 2 ** 20))
+
+# bytes of files kept on disk by all processes of the host
+BAR_CACHE_MAX_DISK_BYTES = int(os.environ.get('FOREX_BAR_CACHE_MAX_DISK_BYTES', 4 * 2 ** 30))
+
+GENERATION_FILE_NAME = 'generation'
+
+
+def get_series_dir(root, source, symbol, price_type):
+    return Path(root, source, symbol, price_type)
+
+
+def get_generation(root, source, symbol, price_type):
+    try:
+        return int((get_series_dir(root, source, symbol, price_type) / GENERATION_FILE_NAME).read_text())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def get_nbytes(columns):
+    return sum(column.nbytes for column in columns.values())
+
+
+def slice_columns(columns, fromdate, todate):
+    # bars within [fromdate, todate] in date numbers, bars are sorted by time
+    start = np.searchsorted(columns['datetime'], fromdate, side='left')
+    end = np.searchsorted(columns['datetime'], todate, side='right')
+    return {name: column[start:end] for name, column in columns.items()}
+
+
+class BarCache:
+    '''
+    series_key is (source, symbol, price_type, period, compact), fromdate and todate are date numbers
+    '''
+    def __init__(self, root=BAR_CACHE_ROOT, max_bytes=BAR_CACHE_MAX_BYTES, max_disk_bytes=BAR_CACHE_MAX_DISK_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (series_key, generation, fromdate, todate): columns, least recently used first
+        self.nbytes = 0
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'puts': 0, 'evictions': 0, 'disk_evictions': 0, 'invalidations': 0}
+
+    def _get_period_dir(self, series_key):
+        source, symbol, price_type, period, compact = series_key
+        return get_series_dir(self.root, source, symbol, price_type) / (f'{period}_compact' if compact else period)
+
+    def get_generation(self, series_key):
+        source, symbol, price_type, _, _ = series_key
+        return get_generation(self.root, source, symbol, price_type)
+
+    def get(self, series_key, fromdate, todate):
+        # return columns within [fromdate, todate], or None if no cached range covers it
+        generation = self.get_generation(series_key)
+
+        with self.lock:
+            for key in reversed(self.entries):
+                if key[:2] == (series_key, generation) and key[2] <= fromdate and todate <= key[3]:
+                    self.entries.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return slice_columns(self.entries[key], fromdate, todate)
+
+        for path in self._get_period_dir(series_key).glob(f'{generation}_*.npz'):
+            _, cached_fromdate, cached_todate = path.stem.split('_')
+            if float(cached_fromdate) <= fromdate and todate <= float(cached_todate):
+                try:
+                    with np.load(path) as npz:
+                        columns = {name: npz[name] for name in npz.files}
+                    os.utime(path)  # recently used, evicted last
+                except (FileNotFoundError, OSError, ValueError):
+                    # removed by invalidation meanwhile
+                    continue
+
+                self._put_memory((series_key, generation, float(cached_fromdate), float(cached_todate)), columns)
+                with self.lock:
+                    self.stats['disk_hits'] += 1
+                return slice_columns(columns, fromdate, todate)
+
+        with self.lock:
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, series_key, generation, fromdate, todate, columns):
+        # generation is the one read before bars were queried
+        key = (series_key, generation, fromdate, todate)
+        self._put_memory(key, columns)
+
+        period_dir = self._get_period_dir(series_key)
+        period_dir.mkdir(parents=True, exist_ok=True)
+        path = period_dir / f'{generation}_{fromdate!r}_{todate!r}.npz'
+        if not path.exists():
+            # write into a temporary file first, so that readers never see a half written file
+            buffer = io.BytesIO()
+            np.savez_compressed(buffer, **columns)
+            tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+            tmp_path.write_bytes(buffer.getvalue())
+            os.replace(tmp_path, path)
+
+        # ranges within the new one are served by it
+        for other_path in period_dir.glob('*.npz'):
+            other_generation, other_fromdate, other_todate = other_path.stem.split('_')
+            if int(other_generation) < generation or (int(other_generation) == generation and other_path != path
+                                                      and fromdate <= float(other_fromdate) and float(other_todate) <= todate):
+                other_path.unlink(missing_ok=True)
+
+        self._evict_disk(path)
+
+        with self.lock:
+            self.stats['puts'] += 1
+
+    def _evict_disk(self, kept_path):
+        # remove least recently used files of every series until the files fit in max_disk_bytes, except kept_path
+        files = []
+        for path in Path(self.root).glob('*/*/*/*/*.npz'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # removed by another process meanwhile
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        nbytes = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if nbytes <= self.max_disk_bytes:
+                break
+            if path == kept_path:
+                continue
+
+            path.unlink(missing_ok=True)
+            nbytes -= size
+            with self.lock:
+                self.stats['disk_evictions'] += 1
+
+    def _put_memory(self, key, columns):
+        nbytes = get_nbytes(columns)
+        if nbytes > self.max_bytes:
+            return
+
+        with self.lock:
+            series_key, generation, fromdate, todate = key
+            for other_key in list(self.entries):
+                if other_key[0] == series_key and (other_key[1] < generation or (other_key[1] == generation and
+                                                                                 fromdate <= other_key[2] and other_key[3] <= todate)):
+                    self.nbytes -= get_nbytes(self.entries.pop(other_key))
+
+            self.entries[key] = columns
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= get_nbytes(evicted)
+                self.stats['evictions'] += 1
+
+    def invalidate_series(self, source, symbol, price_type):
+        # every period of a series, as writes of M1 bars are followed by writes of longer timeframes
+        series_dir = get_series_dir(self.root, source, symbol, price_type)
+        series_dir.mkdir(parents=True, exist_ok=True)
+
+        generation = get_generation(self.root, source, symbol, price_type) + 1
+        tmp_path = series_dir / f'.{GENERATION_FILE_NAME}.{os.getpid()}.tmp'
+        tmp_path.write_text(str(generation))
+        os.replace(tmp_path, series_dir / GENERATION_FILE_NAME)
+
+        for path in series_dir.glob('*/*.npz'):
+            path.unlink(missing_ok=True)
+
+        with self.lock:
+            for key in list(self.entries):
+                if key[0][:3] == (source, symbol, price_type):
+                    self.nbytes -= get_nbytes(self.entries.pop(key))
+            self.stats['invalidations'] += 1
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats, entries=len(self.entries), nbytes=self.nbytes)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else None
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    # cache of the process, created on first use
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = BarCache()
+        return _cache
+
+
+def invalidate_series(symbol, price_type, source='Dukascopy'):
+    get_cache().invalidate_series(source, symbol, price_type)
+
+
+def get_stats():
+    return get_cache().get_stats()
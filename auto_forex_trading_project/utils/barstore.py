@@ -0,0 +1,131 @@
+from utils.constants import *
+
+from datetime import datetime
+from pathlib import Path
+from psycopg2 import sql
+
+import json
+import numpy as np
+import shutil
+
+'''
+On-disk columnar bar store
+
+Each series (symbol, period, price_type) is kept in its own directory
+    {root}/{symbol}/{period}/{price_type}/
+holding one `.npy` file per line, which can be memory-mapped without parsing.
+`datetime.npy` is stored as backtrader date numbers, and it is also the time index
+of the series since bars are sorted by time.
+'''
+
+BAR_COLUMNS = ('datetime', 'open', 'high', 'low', 'close', 'volume')
+
+ORDINAL_OF_EPOCH = 719163  # datetime(1970, 1, 1).toordinal()
+
+
+def date2num_from_epoch(epoch):
+    # vectorized version of bt.date2num for UTC epoch seconds
+    # the fraction of day is summed in the same order as bt.date2num, so the results are bit-identical
+    epoch = np.asarray(epoch, dtype=np.float64)
+    days, seconds = np.divmod(epoch, 86400)
+    seconds_of_day = np.floor(seconds)
+    microseconds = np.round((seconds - seconds_of_day) * 1e6)
+    hours, seconds_of_hour = np.divmod(seconds_of_day, 3600)
+    minutes, seconds_of_minute = np.divmod(seconds_of_hour, 60)
+
+    return (days + ORDINAL_OF_EPOCH) + (hours / 24 + minutes / 1440 + seconds_of_minute / 86400 + microseconds / 86400000000)
+
+
+def get_series_dir(root, symbol, period, price_type):
+    return Path(root, symbol, period, price_type)
+
+
+def export_series(conn, root, symbol, period, price_type, source='Dukascopy', chunk_size=100000):
+    period_value, _, _ = PERIODS[period]
+    series_dir = get_series_dir(root, symbol, period, price_type)
+
+    query_filter = sql.SQL('WHERE ({period} = %s AND '
+                           '{price_type} = %s AND '
+                           '{symbol} = %s AND '
+                           '{source} = %s AND '
+                           '{volume} > 0)').format(period=sql.Identifier('period'),
+                                                   price_type=sql.Identifier('price_type'),
+                                                   symbol=sql.Identifier('symbol'),
+                                                   source=sql.Identifier('source'),
+                                                   volume=sql.Identifier('volume'),)
+    query_parameters = (period_value, price_type, symbol, source)
+
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL('SELECT COUNT(*) FROM {table} ').format(table=sql.Identifier(MY_TABLE_NAME)) + query_filter,
+                       query_parameters)
+        number_of_bars, = cursor.fetchone()
+
+    if not number_of_bars:
+        return 0
+
+    # write into a temporary directory first, so that readers never see a half exported series
+    tmp_dir = series_dir.with_name(f'{price_type}.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    columns = {name: np.lib.format.open_memmap(tmp_dir / f'{name}.npy', mode='w+', dtype=np.float64, shape=(number_of_bars,))
+               for name in BAR_COLUMNS}
+
+    # stream rows by server-side cursor instead of holding all rows in memory
+    with conn.cursor(name=f'export_{symbol}_{period}_{price_type}') as cursor:
+        cursor.itersize = chunk_size
+        query = sql.SQL('SELECT EXTRACT(EPOCH FROM {time})::DOUBLE PRECISION, {open}, {high}, {low}, {close}, {volume} '
+                        'FROM {table} ').format(table=sql.Identifier(MY_TABLE_NAME),
+                                                time=sql.Identifier('time'),
+                                                open=sql.Identifier('open'),
+                                                high=sql.Identifier('high'),
+                                                low=sql.Identifier('low'),
+                                                close=sql.Identifier('close'),
+                                                volume=sql.Identifier('volume'),)
+        query += query_filter + sql.SQL(' ORDER BY {time}').format(time=sql.Identifier('time'))
+        cursor.execute(query, query_parameters)
+
+        i = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+
+            chunk = np.array(rows, dtype=np.float64)
+            chunk[:, 0] = date2num_from_epoch(chunk[:, 0])
+            for j, name in enumerate(BAR_COLUMNS):
+                columns[name][i:i + len(rows)] = chunk[:, j]
+            i += len(rows)
+
+    for column in columns.values():
+        column.flush()
+    del columns
+
+    meta = {'symbol': symbol,
+            'period': period,
+            'price_type': price_type,
+            'number_of_bars': number_of_bars,
+            'exported_at': datetime.now().isoformat(),
+            }
+    with open(tmp_dir / 'meta.json', 'w') as f:
+        json.dump(meta, f)
+
+    # swap the new series in place of the old one
+    shutil.rmtree(series_dir, ignore_errors=True)
+    tmp_dir.rename(series_dir)
+
+    return number_of_bars
+
+
+def open_series(root, symbol, period, price_type, fromdate=None, todate=None):
+    # return zero-copy views of memory-mapped columns within [fromdate, todate]
+    series_dir = get_series_dir(root, symbol, period, price_type)
+    columns = {name: np.load(series_dir / f'{name}.npy', mmap_mode='r') for name in BAR_COLUMNS}
+
+    start, end = 0, len(columns['datetime'])
+    if fromdate is not None:
+        start = np.searchsorted(columns['datetime'], fromdate, side='left')
+    if todate is not None:
+        end = np.searchsorted(columns['datetime'], todate, side='right')
+
+    return {name: column[start:end] for name, column in columns.items()}
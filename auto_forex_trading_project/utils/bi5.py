@@ -0,0 +1,142 @@
+from datetime import datetime
+
+import lzma
+import numpy as np
+import os
+
+'''
+Vectorized decoder of Dukascopy bi5 candle and tick files
+
+A decompressed candle file is a sequence of 24-byte big-endian records
+    (time shift in seconds, open, close, low, high, volume)
+and a tick file of an hour is a sequence of 20-byte big-endian records
+    (time shift in milliseconds, ask, bid, ask volume, bid volume)
+where prices are integer pipettes and volumes are float32.
+The whole buffer is viewed as a numpy structured array by one `frombuffer` call.
+'''
+
+CANDLE_DTYPE = np.dtype([
+    ('time_shift', '>i4'),
+    ('open', '>i4'),
+    ('close', '>i4'),
+    ('low', '>i4'),
+    ('high', '>i4'),
+    ('volume', '>f4'),
+])
+
+TICK_DTYPE = np.dtype([
+    ('time_shift', '>i4'),
+    ('ask', '>i4'),
+    ('bid', '>i4'),
+    ('ask_volume', '>f4'),
+    ('bid_volume', '>f4'),
+])
+
+
+def read_bi5(path):
+    with lzma.open(path, format=lzma.FORMAT_AUTO, filters=None) as f:
+        return f.read()
+
+
+def decode_candles(decompresseddata):
+    # trailing partial record, if any, is ignored like the struct loop does
+    number_of_records = len(decompresseddata) // CANDLE_DTYPE.itemsize
+    return np.frombuffer(decompresseddata, dtype=CANDLE_DTYPE, count=number_of_records)
+
+
+def candles_to_columns(records, start_datetime, pipette_to_price_ratio):
+    # return column arrays of bar time, prices and volume
+    # prices are divided as float64, so they are identical to `pipettes / pipette_to_price_ratio` in Python
+    columns = {'time': np.datetime64(start_datetime, 's') + records['time_shift'].astype('timedelta64[s]')}
+    for name in ('open', 'high', 'low', 'close'):
+        columns[name] = records[name].astype(np.float64) / pipette_to_price_ratio
+    columns['volume'] = records['volume'].astype(np.float64)
+    return columns
+
+
+def read_candles(path, start_datetime, pipette_to_price_ratio):
+    return candles_to_columns(decode_candles(read_bi5(path)), start_datetime, pipette_to_price_ratio)
+
+
+def decode_ticks(decompresseddata):
+    number_of_records = len(decompresseddata) // TICK_DTYPE.itemsize
+    return np.frombuffer(decompresseddata, dtype=TICK_DTYPE, count=number_of_records)
+
+
+def ticks_to_columns(records, start_datetime):
+    # return column arrays of tick time in milliseconds, prices in integer pipettes and volumes
+    columns = {'time': np.datetime64(start_datetime, 'ms') + records['time_shift'].astype('timedelta64[ms]')}
+    for name in ('ask', 'bid'):
+        columns[name] = records[name].astype(np.int32)
+    for name in ('ask_volume', 'bid_volume'):
+        columns[name] = records[name].astype(np.float32)
+    return columns
+
+
+def read_ticks(path, start_datetime):
+    # an hour without ticks is served as an empty file, which is not a valid lzma stream
+    if not os.path.getsize(path):
+        return ticks_to_columns(np.zeros(0, dtype=TICK_DTYPE), start_datetime)
+    return ticks_to_columns(decode_ticks(read_bi5(path)), start_datetime)
+
+
+def columns_to_rows(columns, symbol, period, source, price_type):
+    # rows in the order of utils.psql.CANDLESTICK_COLUMNS, ready for bulk loading
+    number_of_rows = len(columns['time'])
+    return zip([symbol] * number_of_rows,
+               columns['time'].astype('datetime64[us]').tolist(),
+               columns['open'].tolist(),
+               columns['high'].tolist(),
+               columns['low'].tolist(),
+               columns['close'].tolist(),
+               columns['volume'].tolist(),
+               [period] * number_of_rows,
+               [source] * number_of_rows,
+               [price_type] * number_of_rows)
+
+
+if __name__ == '__main__':
+    # throughput benchmark against the struct loop of update_from_dukascopy.py
+    from datetime import timedelta
+
+    import struct
+    import time
+
+    number_of_days = 250
+    start_datetime = datetime(2021, 3, 2)
+    pipette_to_price_ratio = 10 ** 5
+
+    rng = np.random.default_rng(0)
+    records = np.zeros(1440 * number_of_days, dtype=CANDLE_DTYPE)
+    records['time_shift'] = np.tile(np.arange(1440) * 60, number_of_days)
+    for name in ('open', 'close', 'low', 'high'):
+        records[name] = 120000 + rng.integers(-500, 500, len(records))
+    records['volume'] = rng.random(len(records)).astype(np.float32)
+    decompresseddata = records.tobytes()
+
+    time_start = time.perf_counter()
+    expected = []
+    for i in range(int(len(decompresseddata) / 24)):
+        time_shift, open_price, close, low, high, volume = struct.unpack('!5if', decompresseddata[i * 24: (i + 1) * 24])
+        expected.append((start_datetime + timedelta(seconds=time_shift),
+                         open_price / pipette_to_price_ratio,
+                         high / pipette_to_price_ratio,
+                         low / pipette_to_price_ratio,
+                         close / pipette_to_price_ratio,
+                         volume))
+    struct_time = time.perf_counter() - time_start
+
+    time_start = time.perf_counter()
+    columns = candles_to_columns(decode_candles(decompresseddata), start_datetime, pipette_to_price_ratio)
+    numpy_time = time.perf_counter() - time_start
+
+    time_start = time.perf_counter()
+    rows = list(columns_to_rows(columns, 'EURUSD', 1, 'Dukascopy', 'BID'))
+    rows_time = time.perf_counter() - time_start
+
+    assert [row[1:7] for row in rows] == expected
+
+    print(f'{len(records)} records')
+    print(f'struct loop: {struct_time:.3f}s ({len(records) / struct_time:,.0f} records/s)')
+    print(f'numpy decode: {numpy_time:.3f}s ({len(records) / numpy_time:,.0f} records/s)')
+    print(f'numpy decode + rows: {numpy_time + rows_time:.3f}s ({len(records) / (numpy_time + rows_time):,.0f} records/s)')
@@ -1,6 +1,9 @@
 import backtrader as bt
 
+DATABASE_NAME = 'forex'
+
 MY_TABLE_NAME = 'candlesticks_candlestick'
+COMPACT_TABLE_NAME = 'candlesticks_compactcandlestick'
 
 '''
 structure of tuple value (value for PSQL query, bt.TimeFrame, compression)
@@ -29,7 +32,19 @@ SYMBOLS = [
     'NZDUSD', 'USDCAD', 'USDCHF', 'USDJPY',
 ]
 
+# Dukascopy quotes JPY pairs with 3 decimal places and the others with 5
+PIPETTE_SCALES = {symbol: 10 ** 3 if 'JPY' in symbol else 10 ** 5 for symbol in SYMBOLS}
+
 PRICE_TYPES = [
     'ASK',
     'BID',
 ]
+
+# default root directory of memory-mappable bar store
+BAR_STORE_ROOT = '/home/paullam/auto_forex_trading_project/data/bars'
+
+# default root directory of on-disk cache of bars read by PSQLData
+BAR_CACHE_ROOT = '/home/paullam/auto_forex_trading_project/data/cache'
+
+# default root directory of memory-mappable tick store
+TICK_STORE_ROOT = '/home/paullam/auto_forex_trading_project/data/ticks'
@@ -1,9 +1,13 @@
 from datetime import datetime
 from psycopg2 import sql
+from utils.barcache import get_cache, slice_columns
+from utils.barstore import BAR_COLUMNS, date2num_from_epoch, open_series
 from utils.constants import *
+from utils.psql import get_aggregate_query, get_period, get_pool, read_series_columns
+from utils.tickstore import iter_chunks
 
 import backtrader as bt
-import psycopg2
+import numpy as np
 
 
 class PSQLData(bt.feeds.DataBase):
@@ -28,29 +32,73 @@ class PSQLData(bt.feeds.DataBase):
 
         # specific params
         ('price_type', 'BID'),
+        ('source', 'Dukascopy'),
+        ('compact', False),  # read integer pipettes from candlesticks_compactcandlestick
+        ('stream', False),  # fetch rows lazily by a server-side cursor, use with preload=False to keep memory flat
+        ('itersize', 10000),  # rows fetched at a time while streaming
+        ('cache', False),  # serve bars from the bar cache of utils.barcache, which ingestion invalidates
     )
 
     def start(self):
-        self.p.period, self.p.timeframe, self.p.compression, = PERIODS[self.p.period]
+        # periods other than PERIODS, e.g. H2 or D3, are aggregated in PSQL from a stored finer period
+        self.is_custom = self.p.period not in PERIODS
+        self.p.period, self.p.timeframe, self.p.compression, = get_period(self.p.period)
+
+        # bars of custom periods depend on the range they are aggregated for, so they are not served from a wider range
+        self.use_cache = (self.p.cache and not self.p.stream and not self.is_custom and self.p.openinterest < 0 and
+                          all(getattr(self.p, datafield) == i for i, datafield in enumerate(BAR_COLUMNS)))
 
         if not self.p.name:
             self.p.name = self.p.symbol
 
+        # query is executed on first _load, or by preload with time as epoch seconds
+        self.conn = None
+        self.cursor = None
+        self.executed = False
+
+        self.rows = []
+        self.rows_i = 0
+        super(PSQLData, self).start()
+
+    def _execute(self, epoch=False):
         # connect to PSQL
-        conn = self._connect_db()
-        cursor = conn.cursor()
+        self.conn = self._connect_db()
+        if self.p.stream:
+            # rows are fetched by a server-side cursor, itersize rows at a time as _load consumes them
+            self.cursor = self.conn.cursor(name=f'psqldata_{id(self)}')
+            self.cursor.itersize = self.p.itersize
+        else:
+            self.cursor = self.conn.cursor()
+        self.executed = True
+
+        if self.is_custom:
+            self.cursor.execute(*get_aggregate_query(self.p.symbol, self.p.period, self.p.price_type,
+                                                     self.p.fromdate, self.p.todate, source=self.p.source, epoch=epoch))
+            return
+
+        if self.p.compact:
+            self._execute_compact(self.cursor)
+            return
+
+        if epoch:
+            time = sql.SQL('EXTRACT(EPOCH FROM {time})::DOUBLE PRECISION').format(time=sql.Identifier('time'))
+        else:
+            time = sql.Identifier('time')
 
         # define query
-        query = sql.SQL('SELECT {time}, {open}, {high}, {low}, {close}, {volume}, {price_type} '
+        query = sql.SQL('SELECT {time_column}, {open}, {high}, {low}, {close}, {volume}, {price_type} '
                         'FROM {table} '
                         'WHERE ({period} = %s AND '
                         '{price_type} = %s AND '
                         '{symbol} = %s AND '
+                        '{source} = %s AND '
                         '{volume} > 0 AND '
                         '{time} BETWEEN %s AND %s)'
                         'ORDER BY {time}').format(table=sql.Identifier('candlesticks_candlestick'),
                                                   symbol=sql.Identifier('symbol'),
+                                                  source=sql.Identifier('source'),
                                                   price_type=sql.Identifier('price_type'),
+                                                  time_column=time,
                                                   time=sql.Identifier('time'),
                                                   open=sql.Identifier('open'),
                                                   high=sql.Identifier('high'),
@@ -60,25 +108,50 @@ class PSQLData(bt.feeds.DataBase):
                                                   period=sql.Identifier('period'),)
 
         # execute query template with input parameters
-        cursor.execute(query, (self.p.period, self.p.price_type, self.p.symbol, self.p.fromdate, self.p.todate))
+        self.cursor.execute(query, (self.p.period, self.p.price_type, self.p.symbol, self.p.source, self.p.fromdate, self.p.todate))
 
-        self.rows = cursor.fetchall()
+    def _fetch_rows(self):
+        # next chunk of rows while streaming, otherwise all rows at once
+        if not self.executed:
+            self._execute()
 
-        conn.close()
+        if self.cursor is None:
+            return []
 
-        self.rows_i = 0
-        super(PSQLData, self).start()
+        if self.p.stream:
+            rows = self.cursor.fetchmany(self.p.itersize)
+        else:
+            rows = self.cursor.fetchall()
+
+        # connection is released as soon as the result set is exhausted
+        if not self.p.stream or len(rows) < self.p.itersize:
+            self._close_db()
+
+        if self.p.compact and rows:
+            rows = self._convert_compact(rows)
+        return rows
 
     def _load(self):
-        if self.rows is None or self.rows_i >= len(self.rows):
+        if self.rows is None:
             return False
 
+        if self.rows_i >= len(self.rows):
+            self.rows = self._fetch_cached_rows() if self.use_cache else self._fetch_rows()
+            self.rows_i = 0
+            if not self.rows:
+                self.rows = None
+                return False
+
         row = self.rows[self.rows_i]
 
         for datafield in self.getlinealiases():
 
             if datafield == 'datetime':
-                self.lines.datetime[0] = bt.date2num(row[self.p.datetime])
+                if self.p.compact or self.use_cache:
+                    # already converted to date number
+                    self.lines.datetime[0] = row[self.p.datetime]
+                else:
+                    self.lines.datetime[0] = bt.date2num(row[self.p.datetime])
 
             else:
                 # get column index
@@ -94,12 +167,336 @@ class PSQLData(bt.feeds.DataBase):
         return True
 
     def _connect_db(self):
-        conn = psycopg2.connect(database='forex')
+        # feeds of a run check out connections of the process pool instead of connecting one by one
+        conn = get_pool().getconn()
         return conn
 
+    def _close_db(self):
+        if self.cursor is not None:
+            self.cursor.close()
+        if self.conn is not None:
+            get_pool().putconn(self.conn)
+        self.cursor = None
+        self.conn = None
+
+    def _execute_compact(self, cursor):
+        # bounds are cast to BIGINT, so that integer index on minute is still used for datetime.min and datetime.max
+        query = sql.SQL('SELECT {minute}, {open}, {high}, {low}, {close}, {volume} '
+                        'FROM {table} '
+                        'WHERE ({symbol} = %s AND '
+                        '{period} = %s AND '
+                        '{price_type} = %s AND '
+                        '{source} = %s AND '
+                        '{volume} > 0 AND '
+                        '{minute} BETWEEN FLOOR(EXTRACT(EPOCH FROM %s::TIMESTAMPTZ) / 60)::BIGINT '
+                        'AND FLOOR(EXTRACT(EPOCH FROM %s::TIMESTAMPTZ) / 60)::BIGINT)'
+                        'ORDER BY {minute}').format(table=sql.Identifier(COMPACT_TABLE_NAME),
+                                                    symbol=sql.Identifier('symbol'),
+                                                    source=sql.Identifier('source'),
+                                                    price_type=sql.Identifier('price_type'),
+                                                    minute=sql.Identifier('minute'),
+                                                    open=sql.Identifier('open_pipettes'),
+                                                    high=sql.Identifier('high_pipettes'),
+                                                    low=sql.Identifier('low_pipettes'),
+                                                    close=sql.Identifier('close_pipettes'),
+                                                    volume=sql.Identifier('volume'),
+                                                    period=sql.Identifier('period'),)
+        cursor.execute(query, (self.p.symbol, self.p.period, self.p.price_type, self.p.source, self.p.fromdate, self.p.todate))
+
+    def _convert_compact(self, rows):
+        rows = np.array(rows, dtype=np.float64).reshape(-1, 6)
+
+        # minutes to date numbers and pipettes to prices, same values as reading Candlestick
+        rows[:, 0] = date2num_from_epoch(rows[:, 0] * 60)
+        rows[:, 1:5] /= PIPETTE_SCALES[self.p.symbol]
+        return rows.tolist()
+
     def preload(self):
-        super(PSQLData, self).preload()
+        if self._filters or self._ffilters or self._tzinput is not None:
+            # filters and timezone conversion work bar by bar
+            super(PSQLData, self).preload()
+        else:
+            self._preload_columns()
+            self._last()
+            self.home()
+
         self.rows = None
+        self._close_db()
+
+    def _preload_columns(self):
+        # same bars as load() lets through, appended to line buffers at once
+        columns = slice_columns(self._read_columns() if self.use_cache else self._query_columns(), self.fromdate, self.todate)
+        number_of_bars = len(columns['datetime'])
+
+        for datafield in self.getlinealiases():
+            values = columns.get(datafield)
+            if values is None:
+                values = np.full(number_of_bars, np.nan)
+            # line buffers of preload are array('d'), filled by copying raw doubles rather than float objects
+            getattr(self.lines, datafield).array.frombytes(values.astype(np.float64).tobytes())
+
+    def _query_columns(self):
+        # fetch rows with time as epoch seconds, and convert them to float64 columns of used line aliases
+        self._execute(epoch=True)
+        chunks = []
+        while True:
+            rows = self._fetch_rows()
+            if not len(rows):
+                break
+            chunks.append(np.array(rows, dtype=object))
+            if self.cursor is None:
+                break
+        rows = np.concatenate(chunks) if chunks else np.empty((0, 7), dtype=object)
+
+        columns = {}
+        for datafield in self.getlinealiases():
+            col_idx = getattr(self.p, datafield)
+            if col_idx >= 0:
+                columns[datafield] = rows[:, col_idx].astype(np.float64)
+
+        if not self.p.compact:
+            columns['datetime'] = date2num_from_epoch(columns['datetime'])
+        return columns
+
+    def _fetch_cached_rows(self):
+        # all rows at once, in the default column layout with datetime as date numbers
+        if self.executed:
+            return []
+        columns = self._read_columns()
+        self.executed = True
+        return np.column_stack([columns[name] for name in BAR_COLUMNS]).tolist()
+
+    def _read_columns(self):
+        # columns of [fromdate, todate] from the bar cache, or queried and put into it
+        cache = get_cache()
+        series_key = (self.p.source, self.p.symbol, self.p.price_type, str(self.p.period), self.p.compact)
+        fromdate, todate = bt.date2num(self.p.fromdate), bt.date2num(self.p.todate)
+
+        columns = cache.get(series_key, fromdate, todate)
+        if columns is None:
+            # generation is read before the query, so that bars written meanwhile are not cached as current
+            generation = cache.get_generation(series_key)
+            columns = self._query_columns()
+            cache.put(series_key, generation, fromdate, todate, columns)
+        return columns
+
+    def stop(self):
+        # a run stopped early leaves the cursor open
+        self._close_db()
+        super(PSQLData, self).stop()
+
+
+class BarStoreData(bt.feeds.DataBase):
+    '''
+    Reads bars from the memory-mapped columnar store written by scripts/export_bar_store.py
+    Columns are zero-copy views of the files, so opening years of M1 bars costs only a few page faults
+    '''
+    params = (
+        ('dataname', None),
+        ('name', None),
+        ('symbol', 'EURUSD'),
+        ('period', 'H1'),
+        ('timeframe', bt.TimeFrame.Days),
+        ('compression', 1),
+        ('fromdate', datetime.min),
+        ('todate', datetime.max),
+
+        # specific params
+        ('price_type', 'BID'),
+        ('root', BAR_STORE_ROOT),
+    )
+
+    def start(self):
+        _, self.p.timeframe, self.p.compression, = PERIODS[self.p.period]
+
+        if not self.p.name:
+            self.p.name = self.p.symbol
+
+        self.columns = open_series(self.p.root, self.p.symbol, self.p.period, self.p.price_type,
+                                   fromdate=bt.date2num(self.p.fromdate),
+                                   todate=bt.date2num(self.p.todate))
+
+        self.columns_i = 0
+        super(BarStoreData, self).start()
+
+    def _load(self):
+        if self.columns is None or self.columns_i >= len(self.columns['datetime']):
+            return False
+
+        for datafield, column in self.columns.items():
+            getattr(self.lines, datafield)[0] = column[self.columns_i]
+
+        self.columns_i += 1
+        return True
+
+    def preload(self):
+        super(BarStoreData, self).preload()
+        self.columns = None
+
+
+class SeriesData(bt.feeds.DataBase):
+    '''
+    Feeds bars of one series already read into column arrays, as handed out by PSQLSeriesLoader
+    '''
+    params = (
+        ('dataname', None),
+        ('name', None),
+        ('symbol', 'EURUSD'),
+        ('period', 'H1'),
+        ('timeframe', bt.TimeFrame.Days),
+        ('compression', 1),
+        ('fromdate', datetime.min),
+        ('todate', datetime.max),
+
+        # specific params
+        ('price_type', 'BID'),
+        ('columns', None),  # {name: array} in the layout of BAR_COLUMNS
+    )
+
+    def start(self):
+        _, self.p.timeframe, self.p.compression, = PERIODS[self.p.period]
+
+        if not self.p.name:
+            self.p.name = self.p.symbol
+
+        self.columns = self.p.columns
+        self.columns_i = 0
+        super(SeriesData, self).start()
+
+    def _load(self):
+        if self.columns is None or self.columns_i >= len(self.columns['datetime']):
+            return False
+
+        for datafield, column in self.columns.items():
+            getattr(self.lines, datafield)[0] = column[self.columns_i]
+
+        self.columns_i += 1
+        return True
+
+    def preload(self):
+        if self._filters or self._ffilters or self._tzinput is not None or self.columns is None:
+            # filters and timezone conversion work bar by bar
+            super(SeriesData, self).preload()
+        else:
+            # same bars as load() lets through, bars are sorted by time
+            datetimes = self.columns['datetime']
+            start = np.searchsorted(datetimes, self.fromdate, side='left')
+            end = np.searchsorted(datetimes, self.todate, side='right')
+
+            for datafield in self.getlinealiases():
+                if datafield in self.columns:
+                    values = self.columns[datafield][start:end]
+                else:
+                    values = np.full(max(end - start, 0), np.nan)
+                # line buffers of preload are array('d'), filled by copying raw doubles rather than float objects
+                getattr(self.lines, datafield).array.frombytes(values.astype(np.float64).tobytes())
+
+            self._last()
+            self.home()
+
+        self.columns = None
+
+
+class PSQLSeriesLoader:
+    '''
+    Reads bars of many (symbol, price_type) series of one period by a single query, and hands out a SeriesData per series
+    Strategies on 28 symbols of bid and ask prices, e.g. CurrencyStrength and ACSTrailing, would otherwise
+    start 56 PSQLData which query the same time range one by one.
+
+        loader = PSQLSeriesLoader(SYMBOLS, price_types=('BID', 'ASK'), period='H1', fromdate=fromdate, todate=todate)
+        for data in loader.getdatas():
+            cerebro.adddata(data)
+    '''
+    def __init__(self, symbols, price_types=('BID',), period='H1', fromdate=datetime.min, todate=datetime.max, source='Dukascopy'):
+        if period not in PERIODS:
+            raise ValueError(f'Invalid period: {period}, custom periods are aggregated by PSQLData')
+
+        self.symbols = list(symbols)
+        self.price_types = list(price_types)
+        self.period = period
+        self.fromdate = fromdate
+        self.todate = todate
+        self.source = source
+        self.columns = None
+
+    def load(self):
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                self.columns = read_series_columns(cursor, self.symbols, PERIODS[self.period][0], self.price_types,
+                                                   self.fromdate, self.todate, source=self.source)
+        return self.columns
+
+    def getdata(self, symbol, price_type='BID', **kwargs):
+        if self.columns is None:
+            self.load()
+
+        return SeriesData(columns=self.columns[(symbol, price_type)], symbol=symbol, period=self.period, price_type=price_type,
+                          fromdate=self.fromdate, todate=self.todate, **kwargs)
+
+    def getdatas(self):
+        # all symbols of the first price type come before those of the next one, as CurrencyStrength expects
+        return [self.getdata(symbol, price_type) for price_type in self.price_types for symbol in self.symbols]
+
+
+class TickData(bt.feeds.DataBase):
+    '''
+    Replays bid and ask ticks of the tick store written by scripts/update_ticks_from_dukascopy.py
+    OHLC lines are the price of `price` side, and bid and ask lines are both kept for spread and stop testing.
+    Ticks are converted a chunk at a time from memory-mapped day files, so run cerebro with preload=False
+    to keep memory bounded.
+    '''
+    lines = ('bid', 'ask', 'bid_volume', 'ask_volume')
+
+    params = (
+        ('dataname', None),
+        ('name', None),
+        ('symbol', 'EURUSD'),
+        ('timeframe', bt.TimeFrame.Ticks),
+        ('compression', 1),
+        ('fromdate', datetime.min),
+        ('todate', datetime.max),
+
+        # specific params
+        ('price', 'bid'),  # or 'ask'
+        ('root', TICK_STORE_ROOT),
+        ('chunk_size', 100000),
+    )
+
+    def start(self):
+        if not self.p.name:
+            self.p.name = self.p.symbol
+
+        self.chunks = iter_chunks(self.p.root, self.p.symbol, self.p.fromdate, self.p.todate, self.p.chunk_size)
+        self.chunk = None
+        self.chunk_i = 0
+        super(TickData, self).start()
+
+    def _load(self):
+        while self.chunk is None or self.chunk_i >= len(self.chunk['datetime']):
+            self.chunk = next(self.chunks, None)
+            self.chunk_i = 0
+            if self.chunk is None:
+                return False
+
+        i = self.chunk_i
+        price = self.chunk[self.p.price][i]
+
+        self.lines.datetime[0] = self.chunk['datetime'][i]
+        self.lines.open[0] = price
+        self.lines.high[0] = price
+        self.lines.low[0] = price
+        self.lines.close[0] = price
+        self.lines.volume[0] = self.chunk[f'{self.p.price}_volume'][i]
+        for datafield in ('bid', 'ask', 'bid_volume', 'ask_volume'):
+            getattr(self.lines, datafield)[0] = self.chunk[datafield][i]
+
+        self.chunk_i += 1
+        return True
+
+    def stop(self):
+        self.chunks = None
+        self.chunk = None
+        super(TickData, self).stop()
 
 
 class DownloadedCSVData(bt.feeds.GenericCSVData):
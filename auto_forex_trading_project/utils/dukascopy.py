@@ -0,0 +1,173 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+
+import asyncio
+import os
+import random
+import requests
+import time
+
+'''
+Asynchronous downloader of Dukascopy bi5 candle and tick files
+
+Fetches of all (symbol, date, price_type) are scheduled concurrently on an event loop.
+Blocking requests run in a thread pool sharing one keep-alive `requests.Session`,
+and a global token bucket limits the request rate instead of random sleeps.
+'''
+
+DATAFEED_URL = 'https://datafeed.dukascopy.com/datafeed'
+
+# responses worth retrying, other non 200 responses mean there is no data
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def get_candle_url(base_url, symbol, date, price_type):
+    dukascopy_month = f'{date.month - 1:02d}'  # Month in Dukascopy starts from 00 to 11
+    return f'{base_url}/{symbol}/{date.year}/{dukascopy_month}/{date.day:02d}/{price_type}_candles_min_1.bi5'
+
+
+def get_save_path(data_root, symbol, date, price_type):
+    return Path(data_root, symbol, str(date.year), price_type, f'{date.month:02d}_{date.day:02d}.bi5')
+
+
+def get_tick_url(base_url, symbol, date, hour):
+    # ticks are published in a file per hour
+    dukascopy_month = f'{date.month - 1:02d}'
+    return f'{base_url}/{symbol}/{date.year}/{dukascopy_month}/{date.day:02d}/{hour:02d}h_ticks.bi5'
+
+
+def get_tick_save_path(data_root, symbol, date, hour):
+    return Path(data_root, symbol, str(date.year), 'TICKS', f'{date.month:02d}_{date.day:02d}_{hour:02d}h.bi5')
+
+
+class TokenBucket:
+    '''
+    Allow `rate` acquisitions per second on average, and bursts of up to `capacity`
+    '''
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class DukascopyDownloader:
+    def __init__(self, data_root, base_url=DATAFEED_URL, rate=4.0, burst=8, max_connections=8,
+                 max_retries=5, backoff=1.0, timeout=30, overwrite=False):
+        self.data_root = data_root
+        self.base_url = base_url.rstrip('/')
+        self.rate = rate
+        self.burst = burst
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.overwrite = overwrite
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.stats = {'downloaded': 0, 'skipped': 0, 'missing': 0, 'failed': 0, 'retries': 0}
+        self.missing = []  # jobs which source has no data of, unlike failed jobs they need not be retried soon
+
+    def close(self):
+        self.session.close()
+
+    def _get(self, url):
+        return self.session.get(url, timeout=self.timeout)
+
+    async def fetch(self, symbol, date, price_type):
+        # return path of the bi5 candle file, or None if there is no data
+        return await self._fetch(get_candle_url(self.base_url, symbol, date, price_type),
+                                 get_save_path(self.data_root, symbol, date, price_type),
+                                 (symbol, date, price_type))
+
+    async def fetch_ticks(self, symbol, date, hour):
+        # return path of the bi5 tick file of an hour, or None if there is no data
+        return await self._fetch(get_tick_url(self.base_url, symbol, date, hour),
+                                 get_tick_save_path(self.data_root, symbol, date, hour),
+                                 (symbol, date, hour))
+
+    async def _fetch(self, url, save_path, job):
+        if not self.overwrite and save_path.is_file():
+            self.stats['skipped'] += 1
+            return save_path
+
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats['retries'] += 1
+                # exponential backoff with jitter, so that retries are not synchronized
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+            await self.bucket.acquire()
+            async with self.semaphore:
+                try:
+                    r = await loop.run_in_executor(self.executor, self._get, url)
+                except requests.RequestException:
+                    continue
+
+            if r.status_code == 200:
+                save_path.parent.mkdir(parents=True, exist_ok=True)
+
+                # write then rename, so that an interrupted download never leaves a truncated file
+                tmp_path = save_path.with_suffix('.tmp')
+                with open(tmp_path, 'wb') as f:
+                    f.write(r.content)
+                os.replace(tmp_path, save_path)
+
+                self.stats['downloaded'] += 1
+                return save_path
+
+            if r.status_code not in RETRY_STATUS_CODES:
+                self.stats['missing'] += 1
+                self.missing.append(job)
+                return None
+
+        self.stats['failed'] += 1
+        return None
+
+    async def _download(self, fetch, jobs):
+        # primitives are created here to be bound to the running loop
+        self.bucket = TokenBucket(self.rate, self.burst)
+        self.semaphore = asyncio.Semaphore(self.max_connections)
+
+        with ThreadPoolExecutor(max_workers=self.max_connections) as self.executor:
+            return await asyncio.gather(*(fetch(*job) for job in jobs))
+
+    def download(self, jobs):
+        # jobs are tuples of (symbol, date, price_type), return paths in the same order
+        return asyncio.run(self._download(self.fetch, list(jobs)))
+
+    def download_ticks(self, jobs):
+        # jobs are tuples of (symbol, date, hour), return paths in the same order
+        return asyncio.run(self._download(self.fetch_ticks, list(jobs)))
+
+
+def download_candles(data_root, symbols, price_types, dates, **kwargs):
+    downloader = DukascopyDownloader(data_root, **kwargs)
+    try:
+        jobs = [(symbol, date, price_type) for date in dates for price_type in price_types for symbol in symbols]
+        downloader.download(jobs)
+    finally:
+        downloader.close()
+
+    return downloader.stats
@@ -0,0 +1,104 @@
+from utils.rolling import RollingSums
+
+import itertools
+import numpy as np
+
+'''
+Lines of indicators shared by the strategies of an optimization
+
+Every test case of a sweep builds its own indicators, so that an indicator with the same params on the same data
+is computed again by every test case sharing it. The IndicatorCache of a preloaded data keeps, for the test cases run
+by a process:
+    - the cumulative sums of its close, from which the SMA of any period is one difference of arrays, identical to
+      bt.ind.SMA, so that periods 1..N cost O(N * bars) in total. Read by PrecomputedSMA and by vectorized engines
+    - the line arrays of indicators run over every bar, keyed by (line of the data, indicator class, params),
+      which later indicators of the same key read instead of computing them, see CachedIndicator
+
+IndicatorCaches registers the caches of preloaded datas before an optimization forks its workers.
+A registered cache is pickled as its key, so that test cases carry no sums,
+and every worker reads the inherited cache, filled by the test cases it has run.
+'''
+
+# caches registered by this process, forked workers inherit those of the parent
+_caches = {}
+_keys = itertools.count()
+
+# lookups of SMA and of indicator lines by this process
+_stats = {'hits': 0, 'misses': 0}
+
+
+def attach_indicator_cache(key):
+    # None in a worker which did not inherit the cache, the indicators of its data are computed again
+    return _caches.get(key)
+
+
+def get_indicator_cache(data):
+    # cache of a preloaded data, kept by the data for the next runs
+    cache = getattr(data, 'indicator_cache', None)
+    if cache is None or len(cache) != data.buflen():
+        cache = data.indicator_cache = IndicatorCache(data.lines.close.array[:data.buflen()])
+    return cache
+
+
+def get_hit_ratio(stats):
+    stats = dict(stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else None
+    return stats
+
+
+def get_stats():
+    return get_hit_ratio(_stats)
+
+
+class IndicatorCache:
+    def __init__(self, values):
+        # a copy, as an array.array with exported buffers cannot be extended by the data again
+        self.rolling_sums = RollingSums(np.array(values, dtype=np.float64))
+        self.smas = {}
+        self.indicators = {}
+        self.key = None
+
+    def __reduce__(self):
+        if self.key in _caches:
+            return attach_indicator_cache, (self.key,)
+        return IndicatorCache, (self.rolling_sums.values,)
+
+    def __len__(self):
+        return len(self.rolling_sums.values)
+
+    def get_sma(self, period):
+        if period in self.smas:
+            _stats['hits'] += 1
+        else:
+            _stats['misses'] += 1
+            self.smas[period] = self.rolling_sums.get_means(period)
+        return self.smas[period]
+
+    def get_lines(self, key):
+        # arrays and minperiods of the lines of an indicator, None unless one was run over every bar
+        entry = self.indicators.get(key)
+        if entry is not None and all(len(array) == len(self) for array in entry[0]):
+            _stats['hits'] += 1
+            return entry
+
+        _stats['misses'] += 1
+        return None
+
+    def set_lines(self, key, lines):
+        # arrays are filled as the indicator runs, a run stopped early is computed again by the next lookup
+        self.indicators[key] = ([line.array for line in lines], [line._minperiod for line in lines])
+
+
+class IndicatorCaches:
+    def __init__(self, datas):
+        self.caches = [get_indicator_cache(data) for data in datas]
+        for cache in self.caches:
+            cache.key = next(_keys)
+            _caches[cache.key] = cache
+
+    def close(self):
+        # caches stay with the datas, and are pickled with their values from now on
+        for cache in self.caches:
+            _caches.pop(cache.key, None)
+            cache.key = None
@@ -1,4 +1,8 @@
+from utils.indicatorcache import get_indicator_cache
+
+import array
 import backtrader as bt
+import numpy as np
 
 
 class VolumeWeightedAveragePrice(bt.Indicator):
@@ -21,6 +25,110 @@ class VolumeWeightedAveragePrice(bt.Indicator):
         super(VolumeWeightedAveragePrice, self).__init__()
 
 
+def get_preloaded_source(data):
+    # data and index of the line an indicator is run on, None unless it is a line of a preloaded data
+    index = 0
+    if isinstance(data, bt.LineSeriesStub):
+        line, data = data.lines[0], data._owner
+        index = next((i for i, data_line in enumerate(getattr(data, 'lines', ())) if data_line is line), None)
+
+    if not isinstance(data, bt.AbstractDataBase) or index is None or not data._env._dopreload:
+        return None
+    return data, index
+
+
+def get_line_values(line, start, end):
+    # values of a line over the bars of once(), copied as a numpy array
+    return np.array(line.array[start:end], dtype=np.float64)
+
+
+def set_line_values(line, start, values):
+    line.array[start:start + len(values)] = array.array('d', values.tobytes())
+
+
+class PreloadedLinesIndicator(bt.Indicator):
+    '''
+    Lines which are `preloaded` are filled at once like those of a preloaded data, and only advanced along the bars
+    '''
+    preloaded = False
+
+    def _next(self):
+        if self.preloaded:
+            self.advance(size=len(self._clock) - len(self))
+        else:
+            super(PreloadedLinesIndicator, self)._next()
+
+    def _once(self):
+        # the lines are already full length, and are homed and advanced by the owner
+        if not self.preloaded:
+            super(PreloadedLinesIndicator, self)._once()
+
+
+class PrecomputedSimpleMovingAverage(PreloadedLinesIndicator):
+    '''
+    bt.ind.SMA of the close of a preloaded data, read from its IndicatorCache, see utils.indicatorcache
+
+    Strategies of a sweep sharing a period do not compute its SMA again bar by bar.
+    Other lines, and datas which are not preloaded, are averaged by bt.ind.SMA.
+    '''
+    plotinfo = dict(subplot=False)
+
+    params = (('period', 30), )
+
+    alias = ('PrecomputedSMA',)
+    lines = ('sma',)
+
+    def __init__(self):
+        source = get_preloaded_source(self.data)
+        self.preloaded = source is not None and source[0].lines[source[1]] is source[0].lines.close
+        if self.preloaded:
+            sma = get_indicator_cache(source[0]).get_sma(self.p.period)
+            self.lines.sma.array = array.array('d', sma.tobytes())
+            self.addminperiod(self.p.period)
+        else:
+            self.lines[0] = bt.ind.SMA(self.data, period=self.p.period)
+
+        super(PrecomputedSimpleMovingAverage, self).__init__()
+
+
+class CachedIndicator(PreloadedLinesIndicator):
+    '''
+    Base of an indicator, first of its bases, whose lines are read from the IndicatorCache of a preloaded data
+    once an indicator of the same class and params has been run on the same line over every bar
+
+    Lines are shared with that indicator, not copied. Params which do not change the lines are `uncached_params`.
+    '''
+    uncached_params = ()
+
+    def __init__(self):
+        source, entry = get_preloaded_source(self.data), None
+        if source is not None:
+            data, index = source
+            params = tuple((name, value) for name, value in self.p._getkwargs().items() if name not in self.uncached_params)
+            key, cache = (index, type(self), params), get_indicator_cache(data)
+            entry = cache.get_lines(key)
+
+        self.preloaded = entry is not None
+        if self.preloaded:
+            for line, line_array, minperiod in zip(self.lines, *entry):
+                line.array, line._minperiod = line_array, minperiod
+        else:
+            super(CachedIndicator, self).__init__()
+            if source is not None:
+                cache.set_lines(key, self.lines)
+
+
+class CachedExponentialMovingAverage(CachedIndicator, bt.ind.EMA):
+    alias = ('CachedEMA',)
+
+
+class CachedRelativeStrengthIndex(CachedIndicator, bt.ind.RSI):
+    alias = ('CachedRSI',)
+
+    # bands are only plotted
+    uncached_params = ('upperband', 'lowerband')
+
+
 class EightCurrenciesIndicator(bt.Indicator):
     # Declare indicator lines
     lines = (
@@ -99,7 +207,7 @@ class EightCurrenciesIndicator(bt.Indicator):
 
         for i in range(self.total_number_of_pairs):
             pair_name = self.datas[i]._name[0:6]
-            self.rsi[pair_name] = bt.indicators.RSI(self.datas[i].lines.close, period=self.p.period).rsi()
+            self.rsi[pair_name] = CachedRSI(self.datas[i].lines.close, period=self.p.period).lines.rsi
 
     def next(self):
         # Initialize each line value for today
@@ -115,6 +223,22 @@ class EightCurrenciesIndicator(bt.Indicator):
             getattr(self.lines, base_currency)[0] += self.rsi[pair_name] * getattr(self.p, pair_name) / (self.total_number_of_currencies - 1)
             getattr(self.lines, quot_currency)[0] += (100 - self.rsi[pair_name]) * getattr(self.p, pair_name) / (self.total_number_of_currencies - 1)
 
+    def once(self, start, end):
+        # next() over the arrays of every bar, summed in the same order so that values are identical
+        values = {name: np.zeros(end - start) for name in self.lines.getlinealiases()}
+
+        for symbol in self.datas:
+            pair_name = symbol._name[0:6]
+            base_currency = symbol._name[0:3]
+            quot_currency = symbol._name[3:6]
+            rsi = get_line_values(self.rsi[pair_name], start, end)
+
+            values[base_currency] += rsi * getattr(self.p, pair_name) / (self.total_number_of_currencies - 1)
+            values[quot_currency] += (100 - rsi) * getattr(self.p, pair_name) / (self.total_number_of_currencies - 1)
+
+        for name, line in zip(self.lines.getlinealiases(), self.lines):
+            set_line_values(line, start, values[name])
+
 
 class TwentyeightPairsIndicator(bt.Indicator):
 
@@ -199,8 +323,8 @@ class TwentyeightPairsIndicator(bt.Indicator):
 
         for i in range(self.total_number_of_pairs):
             pair_name = self.datas[i]._name[0:6]
-            self.fast_ema[pair_name] = bt.indicators.EMA(self.datas[i].lines.close, period=self.p.fast_ma_period).ema()
-            self.slow_ema[pair_name] = bt.indicators.EMA(self.datas[i].lines.close, period=self.p.slow_ma_period).ema()
+            self.fast_ema[pair_name] = CachedEMA(self.datas[i].lines.close, period=self.p.fast_ma_period).lines.ema
+            self.slow_ema[pair_name] = CachedEMA(self.datas[i].lines.close, period=self.p.slow_ma_period).lines.ema
 
     def next(self):
         # Initialize each line value for today
@@ -226,3 +350,29 @@ class TwentyeightPairsIndicator(bt.Indicator):
             base_currency = symbol._name[0:3]
             quot_currency = symbol._name[3:6]
             getattr(self.lines, pair_name)[0] = getattr(self.lines, base_currency)[0] - getattr(self.lines, quot_currency)[0]
+
+    def once(self, start, end):
+        # next() over the arrays of every bar, summed in the same order so that values are identical
+        values = {name: np.zeros(end - start) for name in self.lines.getlinealiases()}
+
+        for symbol in self.datas:
+            pair_name = symbol._name[0:6]
+            base_currency = symbol._name[0:3]
+            quot_currency = symbol._name[3:6]
+            fast_ema = get_line_values(self.fast_ema[pair_name], start, end)
+            slow_ema = get_line_values(self.slow_ema[pair_name], start, end)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ma_percentage = np.where(slow_ema != 0, (fast_ema - slow_ema) / slow_ema * getattr(self.p, pair_name), 0.0)
+
+            values[base_currency] += ma_percentage
+            values[quot_currency] -= ma_percentage
+
+        # Calculate 28 symbols values
+        for symbol in self.datas:
+            pair_name = symbol._name[0:6]
+            base_currency = symbol._name[0:3]
+            quot_currency = symbol._name[3:6]
+            values[pair_name] = values[base_currency] - values[quot_currency]
+
+        for name, line in zip(self.lines.getlinealiases(), self.lines):
+            set_line_values(line, start, values[name])
@@ -3,6 +3,9 @@ from celery_progress.backend import ProgressRecorder
 from numbers import Number
 from pathlib import Path
 from tqdm.auto import tqdm
+from utils.indicatorcache import IndicatorCaches, get_hit_ratio, get_stats
+from utils.sharedlines import SharedLines, release_shared_arrays
+from utils.vectorized import get_engine
 
 import backtrader as bt
 import collections
@@ -16,12 +19,36 @@ import pickle
 PBAR = None
 
 
+ENGINES = ('backtrader', 'vectorized')
+
+
 class Optimizer:
-    def start(self):
-        runstrat = self.cerebro.run(runonce=False, stdstats=False)
-        self.strats = [x[0] for x in runstrat]  # flatten 2d list
+    def start(self, runonce=True):
+        if self.engine == 'vectorized':
+            # test cases are simulated as arrays by the engine of the strategy, see utils.vectorized
+            engine = get_engine(self.strategy)(self.cerebro)
+            self.strats = engine.run(self.generator(**self.kwargs), callback=self.bt_opt_callback)
+
+        else:
+            # indicators are computed over every bar at once, custom ones of utils.indicators by their once()
+            runstrat = self.cerebro.run(runonce=runonce, stdstats=False)
+            self.strats = [x[0] for x in runstrat]  # flatten 2d list
+
+        self.indicator_cache_stats = self.get_indicator_cache_stats()
         self.strats_df = self.build_strats_df()
 
+    def get_indicator_cache_stats(self):
+        # lookups of indicator caches by every test case, None if test cases were not run by CeleryCerebro
+        stats = [strat.indicator_cache_stats for strat in self.strats if hasattr(strat, 'indicator_cache_stats')]
+        if not stats:
+            return None
+        return get_hit_ratio({key: sum(x[key] for x in stats) for key in ('hits', 'misses')})
+
+    def get_indicator_cache_description(self):
+        if self.indicator_cache_stats is None or self.indicator_cache_stats['hit_ratio'] is None:
+            return ''
+        return f'indicator cache hit ratio: {self.indicator_cache_stats["hit_ratio"]:.1%}'
+
     def update_progress_bar(self):
         return
 
@@ -68,8 +95,12 @@ class Optimizer:
 
 
 class OptimizerCLI(Optimizer):
-    def __init__(self, cerebro, strategy, generator, **kwargs):
+    def __init__(self, cerebro, strategy, generator, engine='backtrader', **kwargs):
+        if engine not in ENGINES:
+            raise ValueError(f'Unknown engine {engine}, expected one of {ENGINES}')
+
         self.cerebro = cerebro
+        self.strategy, self.generator, self.kwargs, self.engine = strategy, generator, kwargs, engine
 
         total_testcase = sum(1 for _ in generator(**kwargs))
 
@@ -79,14 +110,22 @@ class OptimizerCLI(Optimizer):
         self.cerebro.optstrategy(strategy, optimization_dict=generator(**kwargs))
         self.cerebro.optcallback(cb=self.bt_opt_callback)
 
+    def update_progress_bar(self):
+        global PBAR
+        PBAR.set_postfix_str(self.get_indicator_cache_description(), refresh=False)
+
     def bt_opt_callback(self, cb):
         global PBAR
         PBAR.update()
 
 
 class OptimizerCelery(Optimizer):
-    def __init__(self, celery, cerebro, strategy, generator, **kwargs):
+    def __init__(self, celery, cerebro, strategy, generator, engine='backtrader', **kwargs):
+        if engine not in ENGINES:
+            raise ValueError(f'Unknown engine {engine}, expected one of {ENGINES}')
+
         self.cerebro = cerebro
+        self.strategy, self.generator, self.kwargs, self.engine = strategy, generator, kwargs, engine
         self.progress_recorder = ProgressRecorder(celery)
         self.pregress = 0
         self.total_testcase = sum(1 for _ in generator(**kwargs))
@@ -96,7 +135,7 @@ class OptimizerCelery(Optimizer):
 
     def update_progress_bar(self):
         self.pregress += 1
-        self.progress_recorder.set_progress(self.pregress + 1, self.total_testcase)
+        self.progress_recorder.set_progress(self.pregress + 1, self.total_testcase, description=self.get_indicator_cache_description())
 
     def bt_opt_callback(self, cb):
         self.pregress += 1
@@ -114,11 +153,51 @@ def flatten_dict(d, parent_key='', sep='_'):
     return dict(items)
 
 
+def detach_children(analyzers):
+    # cerebro detaches analyzers of an OptReturn from the strategy but not their children, like TimeReturn of SharpeRatio,
+    # which would pickle the whole strategy and its lines back to the parent for every test case
+    for analyzer in analyzers:
+        for child in analyzer._children:
+            child.strategy = None
+            child._parent = None
+            for attrname in dir(child):
+                if attrname.startswith('data'):
+                    setattr(child, attrname, None)
+        detach_children(analyzer._children)
+
+
 class CeleryCerebro(bt.Cerebro):
     '''
     `billiard.pool.Pool` shall be used instead of multiprocessing.Pool,
     as the later one is not compatible with `celery`
+
+    With `shareddatas`, datas are preloaded once by the parent and their lines are put in shared memory,
+    so that the cerebro pickled for every test case carries no bars, and workers read the same pages.
+    The IndicatorCache of every preloaded data is registered for the workers likewise, see utils.indicatorcache
     '''
+    params = (
+        ('shareddatas', True),
+    )
+
+    def runstrategies(self, iterstrat, predata=False):
+        # a test case stopped by runstop() does not stop the next ones run by the same process
+        self._event_stop = False
+
+        # lookups of indicator caches by the strategies of a test case, returned with them
+        before = get_stats()
+        runstrat = super(CeleryCerebro, self).runstrategies(iterstrat, predata=predata)
+        after = get_stats()
+        for strat in runstrat:
+            strat.indicator_cache_stats = get_hit_ratio({key: after[key] - before[key] for key in ('hits', 'misses')})
+            if self._dooptimize and self.p.optreturn:
+                detach_children(strat.analyzers)
+        return runstrat
+
+    def __call__(self, iterstrat):
+        # datas preloaded by the parent are not loaded again by workers
+        runstrat = self.runstrategies(iterstrat, predata=self._predata)
+        release_shared_arrays(self.datas)
+        return runstrat
 
     def run(self, **kwargs):
         self._event_stop = False  # Stop is requested
@@ -214,7 +293,9 @@ class CeleryCerebro(bt.Cerebro):
                     for cb in self.optcbs:
                         cb(runstrat)  # callback receives finished strategy
         else:
-            if self.p.optdatas and self._dopreload and self._dorunonce:
+            self._predata = self._dopreload and (self.p.shareddatas or (self.p.optdatas and self._dorunonce))
+            shared_lines, indicator_caches = None, None
+            if self._predata:
                 for data in self.datas:
                     data.reset()
                     if self._exactbars < 1:  # datas can be full length
@@ -223,15 +304,31 @@ class CeleryCerebro(bt.Cerebro):
                     if self._dopreload:
                         data.preload()
 
-            pool = Pool(self.p.maxcpus or None)
-            for r in pool.imap(self, iterstrats):
-                self.runstrats.append(r)
-                for cb in self.optcbs:
-                    cb(r)  # callback receives finished strategy
-
-            pool.close()
+                # cumulative sums of the closes are built once, and inherited by workers with the lines they cache
+                indicator_caches = IndicatorCaches(self.datas)
+                if self.p.shareddatas:
+                    shared_lines = SharedLines(self.datas)
 
-            if self.p.optdatas and self._dopreload and self._dorunonce:
+            pool = Pool(self.p.maxcpus or None)
+            try:
+                # results of imap are all credited to one worker, so the others wait ~30s on exit for billiard to count
+                # theirs as consumed, while each result of apply_async is credited to the worker which ran it
+                for result in [pool.apply_async(self, (iterstrat,)) for iterstrat in iterstrats]:
+                    r = result.get()
+                    self.runstrats.append(r)
+                    for cb in self.optcbs:
+                        cb(r)  # callback receives finished strategy
+            finally:
+                # workers are stopped before the shared block is freed, as pending tasks of an error still refer to it
+                # once imap is exhausted no task is pending, and terminate() does not wait ~30s for idle workers like close()
+                pool.terminate()
+                pool.join()
+                if shared_lines is not None:
+                    shared_lines.close()
+                if indicator_caches is not None:
+                    indicator_caches.close()
+
+            if self._predata:
                 for data in self.datas:
                     data.stop()
 
@@ -0,0 +1,415 @@
+from utils.barstore import BAR_COLUMNS, date2num_from_epoch
+from utils.constants import *
+
+from contextlib import contextmanager
+from datetime import datetime
+from psycopg2 import pool, sql
+
+import backtrader as bt
+import io
+import numpy as np
+import os
+import psycopg2
+import re
+import threading
+import time
+
+# columns of candlesticks table written by ingestion, in COPY order
+CANDLESTICK_COLUMNS = ('symbol', 'time', 'open', 'high', 'low', 'close', 'volume', 'period', 'source', 'price_type')
+
+STAGING_TABLE_NAME = 'candlesticks_staging'
+
+# serial column of staging table, numbering rows in COPY order
+STAGING_POSITION_COLUMN = 'copy_position'
+
+# units of custom period names such as M2, H8, D3 or W2, in minutes
+CUSTOM_PERIOD_UNITS = {'M': 1, 'H': 60, 'D': 1440, 'W': 10080}
+
+# custom buckets start from a Sunday midnight like W1 bars, so that they line up with every stored period
+CUSTOM_PERIOD_ORIGIN = datetime(1970, 1, 4)
+
+# size of connection pool of a process, a feed streaming by a server-side cursor holds a connection for the whole run
+POOL_MAX_CONNECTIONS = int(os.environ.get('FOREX_POOL_MAX_CONNECTIONS', 64))
+
+# connections kept open while idle, as many as feeds of bid and ask prices of every symbol stream at once,
+# so that a strategy like CurrencyStrength or ACSTrailing reuses all of them in the next run
+POOL_MAX_IDLE_CONNECTIONS = int(os.environ.get('FOREX_POOL_MAX_IDLE_CONNECTIONS', 2 * len(SYMBOLS)))
+
+# seconds a pooled connection may stay idle before it is checked by a round trip
+POOL_HEALTH_CHECK_INTERVAL = 30
+
+
+class ConnectionPool:
+    '''
+    Process-wide pool of psycopg2 connections to the database
+    Up to maxconn connections are open at once, and up to max_idle of them are kept open while idle, most recently returned reused first.
+    A connection is checked by `SELECT 1` if it has been idle for a while, and replaced if it is broken.
+    A returned connection is rolled back and its session settings are reset, so that it can be reused by anyone.
+    '''
+    def __init__(self, maxconn=POOL_MAX_CONNECTIONS, max_idle=POOL_MAX_IDLE_CONNECTIONS,
+                 health_check_interval=POOL_HEALTH_CHECK_INTERVAL, **kwargs):
+        self.maxconn = maxconn
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.kwargs = kwargs
+        self.lock = threading.Lock()
+        self.connections = None
+        self.inherited_connections = []
+        self._create()
+
+    def _create(self):
+        # connections inherited by a forked process are shared with the parent, so a child opens its own ones
+        # and keeps the inherited ones referenced, as closing them would terminate those of the parent
+        if self.connections is not None:
+            self.inherited_connections.append(self.connections)
+        self.pid = os.getpid()
+        self.connections = set()  # open connections, idle or checked out
+        self.idle = []  # (connection, time returned), least recently returned first
+        self.stats = {'connected': 0, 'reused': 0, 'replaced': 0, 'closed': 0}
+
+    def _is_healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close(self, conn):
+        conn.close()
+        with self.lock:
+            self.connections.discard(conn)
+
+    def getconn(self):
+        while True:
+            with self.lock:
+                if os.getpid() != self.pid:
+                    self._create()
+                if not self.idle:
+                    # connected under the lock like ThreadedConnectionPool, so that threads stay within maxconn
+                    if len(self.connections) >= self.maxconn:
+                        raise pool.PoolError('connection pool exhausted')
+                    conn = psycopg2.connect(**self.kwargs)
+                    self.connections.add(conn)
+                    self.stats['connected'] += 1
+                    return conn
+                conn, returned_at = self.idle.pop()
+
+            if self._is_healthy(conn, returned_at):
+                self.stats['reused'] += 1
+                return conn
+            self._close(conn)
+            self.stats['replaced'] += 1
+
+    def putconn(self, conn):
+        if os.getpid() != self.pid:
+            # connection of the parent pool, left to the parent
+            return
+
+        if not conn.closed:
+            try:
+                conn.rollback()
+                with conn.cursor() as cursor:
+                    cursor.execute('RESET ALL')
+                conn.commit()
+            except psycopg2.Error:
+                conn.close()
+
+        with self.lock:
+            if not conn.closed and len(self.idle) < self.max_idle:
+                self.idle.append((conn, time.monotonic()))
+                return
+            self.stats['closed'] += 1
+        self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # pool of the process, created on first use
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(database=DATABASE_NAME)
+        return _pool
+
+
+def compact_candlesticks(cursor, symbol, price_type, time_from, time_before, source='Dukascopy'):
+    # copy bars of all periods within [time_from, time_before] into compact table as integer pipettes
+    # existing compact bars are overwritten, so it can be re-run after bars are updated
+    query = sql.SQL('INSERT INTO {compact_table} '
+                    '(symbol, minute, open_pipettes, high_pipettes, low_pipettes, close_pipettes, volume, period, source, price_type) '
+                    'SELECT symbol, FLOOR(EXTRACT(EPOCH FROM time) / 60)::INTEGER, '
+                    'ROUND(open * %(scale)s)::INTEGER, ROUND(high * %(scale)s)::INTEGER, '
+                    'ROUND(low * %(scale)s)::INTEGER, ROUND(close * %(scale)s)::INTEGER, '
+                    'volume::REAL, period, source, price_type '
+                    'FROM {table} '
+                    'WHERE (symbol = %(symbol)s AND '
+                    'price_type = %(price_type)s AND '
+                    'source = %(source)s AND '
+                    'volume IS NOT NULL AND '
+                    'time BETWEEN %(time_from)s AND %(time_before)s) '
+                    'ON CONFLICT (symbol, period, price_type, source, minute) DO UPDATE SET '
+                    'open_pipettes = EXCLUDED.open_pipettes, '
+                    'high_pipettes = EXCLUDED.high_pipettes, '
+                    'low_pipettes = EXCLUDED.low_pipettes, '
+                    'close_pipettes = EXCLUDED.close_pipettes, '
+                    'volume = EXCLUDED.volume').format(compact_table=sql.Identifier(COMPACT_TABLE_NAME),
+                                                       table=sql.Identifier(MY_TABLE_NAME),)
+
+    cursor.execute(query, {'scale': PIPETTE_SCALES[symbol],
+                           'symbol': symbol,
+                           'price_type': price_type,
+                           'source': source,
+                           'time_from': time_from,
+                           'time_before': time_before,
+                           })
+    return cursor.rowcount
+
+
+def _to_copy_text(value):
+    # text format of COPY, None is NULL
+    if value is None:
+        return '\\N'
+    return str(value)
+
+
+def copy_candlesticks(cursor, rows, returning=False):
+    '''
+    Bulk upsert bars into candlesticks table
+    rows are tuples in the order of CANDLESTICK_COLUMNS. They are loaded by COPY into a session-local staging table,
+    and then merged by a single INSERT ... ON CONFLICT DO UPDATE, instead of a round trip of update_or_create per bar
+    Bars identical to stored ones are left untouched. Return number of bars inserted or changed,
+    or their times as naive datetime64 if returning is True.
+    '''
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_to_copy_text(value) for value in row))
+        buffer.write('\n')
+
+    if not buffer.tell():
+        return np.array([], dtype='datetime64[s]') if returning else 0
+    buffer.seek(0)
+
+    staging_table = sql.Identifier(STAGING_TABLE_NAME)
+    columns = sql.SQL(', ').join(sql.Identifier(column) for column in CANDLESTICK_COLUMNS)
+    key_columns = sql.SQL(', ').join(sql.Identifier(column) for column in ('symbol', 'time', 'period', 'price_type', 'source'))
+
+    position = sql.Identifier(STAGING_POSITION_COLUMN)
+
+    # temporary table lives as long as the connection, so it is created once per worker
+    cursor.execute(sql.SQL('CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table} AS '
+                           'SELECT {columns} FROM {table} WITH NO DATA').format(staging_table=staging_table,
+                                                                                columns=columns,
+                                                                                table=sql.Identifier(MY_TABLE_NAME),))
+    cursor.execute(sql.SQL('ALTER TABLE {staging_table} '
+                           'ADD COLUMN IF NOT EXISTS {position} BIGSERIAL').format(staging_table=staging_table,
+                                                                                    position=position,))
+    cursor.execute(sql.SQL('TRUNCATE {staging_table} RESTART IDENTITY').format(staging_table=staging_table))
+    cursor.copy_expert(sql.SQL('COPY {staging_table} ({columns}) FROM STDIN').format(staging_table=staging_table,
+                                                                                     columns=columns,),
+                       buffer)
+
+    # a bar may be staged twice, while a single INSERT ... ON CONFLICT can update a row only once,
+    # so the one copied last is kept
+    query = sql.SQL('INSERT INTO {table} AS candlestick ({columns}) '
+                    'SELECT DISTINCT ON ({key_columns}) {columns} FROM {staging_table} '
+                    'ORDER BY {key_columns}, {position} DESC '
+                    'ON CONFLICT ({key_columns}) DO UPDATE SET '
+                    'open = EXCLUDED.open, '
+                    'high = EXCLUDED.high, '
+                    'low = EXCLUDED.low, '
+                    'close = EXCLUDED.close, '
+                    'volume = EXCLUDED.volume '
+                    'WHERE (candlestick.open, candlestick.high, candlestick.low, candlestick.close, candlestick.volume) '
+                    'IS DISTINCT FROM (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, EXCLUDED.close, EXCLUDED.volume)'
+                    ).format(table=sql.Identifier(MY_TABLE_NAME),
+                             staging_table=staging_table,
+                             columns=columns,
+                             key_columns=key_columns,
+                             position=position,)
+
+    if not returning:
+        cursor.execute(query)
+        return cursor.rowcount
+
+    cursor.execute(query + sql.SQL(' RETURNING EXTRACT(EPOCH FROM candlestick.time::TIMESTAMP)::DOUBLE PRECISION'))
+    return np.sort(np.array([row[0] for row in cursor.fetchall()], dtype=np.float64).astype(np.int64).astype('datetime64[s]'))
+
+
+def read_candlestick_columns(cursor, symbol, period, price_type, time_from, time_before, source='Dukascopy'):
+    # return bars within [time_from, time_before] as column arrays, time is naive datetime64 as stored by Django
+    query = sql.SQL('SELECT EXTRACT(EPOCH FROM {time}::TIMESTAMP)::DOUBLE PRECISION, {open}, {high}, {low}, {close}, {volume} '
+                    'FROM {table} '
+                    'WHERE ({period} = %s AND '
+                    '{price_type} = %s AND '
+                    '{symbol} = %s AND '
+                    '{source} = %s AND '
+                    '{time} BETWEEN %s AND %s) '
+                    'ORDER BY {time}').format(table=sql.Identifier(MY_TABLE_NAME),
+                                              symbol=sql.Identifier('symbol'),
+                                              source=sql.Identifier('source'),
+                                              price_type=sql.Identifier('price_type'),
+                                              time=sql.Identifier('time'),
+                                              open=sql.Identifier('open'),
+                                              high=sql.Identifier('high'),
+                                              low=sql.Identifier('low'),
+                                              close=sql.Identifier('close'),
+                                              volume=sql.Identifier('volume'),
+                                              period=sql.Identifier('period'),)
+    cursor.execute(query, (period, price_type, symbol, source, time_from, time_before))
+
+    # NULL prices become NaN
+    rows = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 6)
+    columns = {'time': rows[:, 0].astype(np.int64).astype('datetime64[s]')}
+    for i, name in enumerate(('open', 'high', 'low', 'close', 'volume'), start=1):
+        columns[name] = rows[:, i]
+    return columns
+
+
+def read_series_columns(cursor, symbols, period, price_types, time_from, time_before, source='Dukascopy'):
+    '''
+    Read bars of every (symbol, price_type) of one stored period by a single query, instead of a query per series
+    Return {(symbol, price_type): columns} in the layout of BAR_COLUMNS, datetime as backtrader date numbers in UTC
+    like PSQLData. Series without bars get empty columns.
+    '''
+    # bars of a series are packed in time order into one bytea of big-endian doubles, a row per series,
+    # so that no Python object is created per bar. Groups are read in index order, so they are not sorted again.
+    fields = sql.SQL(' || ').join(sql.SQL('FLOAT8SEND({field})').format(field=field) for field in (
+        sql.SQL('DATE_PART(\'epoch\', {time})').format(time=sql.Identifier('time')),
+        *(sql.SQL('COALESCE({column}, \'NaN\')').format(column=sql.Identifier(column)) for column in ('open', 'high', 'low', 'close')),
+        sql.Identifier('volume'),
+    ))
+    query = sql.SQL('SELECT {symbol}, {price_type}, STRING_AGG({fields}, \'\' ORDER BY {time}) '
+                    'FROM {table} '
+                    'WHERE ({symbol} = ANY(%s) AND '
+                    '{period} = %s AND '
+                    '{price_type} = ANY(%s) AND '
+                    '{source} = %s AND '
+                    '{volume} > 0 AND '
+                    '{time} BETWEEN %s AND %s) '
+                    'GROUP BY {symbol}, {price_type}').format(table=sql.Identifier(MY_TABLE_NAME),
+                                                              symbol=sql.Identifier('symbol'),
+                                                              source=sql.Identifier('source'),
+                                                              price_type=sql.Identifier('price_type'),
+                                                              time=sql.Identifier('time'),
+                                                              volume=sql.Identifier('volume'),
+                                                              period=sql.Identifier('period'),
+                                                              fields=fields,)
+    cursor.execute(query, (list(symbols), period, list(price_types), source, time_from, time_before))
+
+    series = {(symbol, price_type): np.empty((0, len(BAR_COLUMNS))) for symbol in symbols for price_type in price_types}
+    for symbol, price_type, packed in cursor.fetchall():
+        series[(symbol, price_type)] = np.frombuffer(packed, dtype='>f8').reshape(-1, len(BAR_COLUMNS))
+
+    series_columns = {}
+    for series_key, rows in series.items():
+        columns = {name: rows[:, i].astype(np.float64) for i, name in enumerate(BAR_COLUMNS)}
+        columns['datetime'] = date2num_from_epoch(columns['datetime'])
+        series_columns[series_key] = columns
+    return series_columns
+
+
+def get_period(name):
+    # return (value for PSQL query, bt.TimeFrame, compression) of a stored or custom period name
+    if name in PERIODS:
+        return PERIODS[name]
+
+    match = re.fullmatch(r'([MHDW])([1-9][0-9]*)', name)
+    if not match:
+        raise ValueError(f'Invalid period: {name}')
+
+    unit, n = match.group(1), int(match.group(2))
+    minutes = CUSTOM_PERIOD_UNITS[unit] * n
+    if unit == 'D':
+        return minutes, bt.TimeFrame.Days, n
+    elif unit == 'W':
+        return minutes, bt.TimeFrame.Days, 7 * n
+    else:
+        return minutes, bt.TimeFrame.Minutes, minutes
+
+
+def get_period_name(minutes):
+    # stored period name if any, otherwise custom name in the longest unit dividing minutes
+    name = next((key for key, value in PERIODS.items() if value[0] == minutes), None)
+    if name:
+        return name
+
+    unit, unit_minutes = max(((unit, unit_minutes) for unit, unit_minutes in CUSTOM_PERIOD_UNITS.items() if minutes % unit_minutes == 0),
+                             key=lambda item: item[1])
+    return f'{unit}{minutes // unit_minutes}'
+
+
+def get_base_period(minutes):
+    # longest stored period which custom period of minutes can be aggregated from, MN is not a fixed length
+    return max(value[0] for key, value in PERIODS.items() if key != 'MN' and minutes % value[0] == 0)
+
+
+def get_aggregate_query(symbol, period, price_type, time_from, time_before, source='Dukascopy', epoch=False):
+    '''
+    Query and parameters aggregating bars of a custom period in minutes server-side, without materializing them
+    Bars of the base period are binned by date_bin on session time, and open and close are taken by ordered aggregates.
+    A bucket starting before time_from is left out like a stored bar would be. Rows are (time, open, high, low, close, volume),
+    time is in epoch seconds if epoch is True.
+    '''
+    bucket = sql.SQL('DATE_BIN(%(interval)s::INTERVAL, {time}::TIMESTAMP, %(origin)s::TIMESTAMP)').format(time=sql.Identifier('time'))
+    if epoch:
+        time_column = sql.SQL('EXTRACT(EPOCH FROM {bucket}::TIMESTAMPTZ)::DOUBLE PRECISION').format(bucket=bucket)
+    else:
+        time_column = sql.SQL('{bucket}::TIMESTAMPTZ').format(bucket=bucket)
+    query = sql.SQL('SELECT {time_column}, '
+                    '(ARRAY_AGG({open} ORDER BY {time}))[1], MAX({high}), MIN({low}), '
+                    '(ARRAY_AGG({close} ORDER BY {time} DESC))[1], SUM({volume}) '
+                    'FROM {table} '
+                    'WHERE ({period} = %(base_period)s AND '
+                    '{price_type} = %(price_type)s AND '
+                    '{symbol} = %(symbol)s AND '
+                    '{source} = %(source)s AND '
+                    '{volume} > 0 AND '
+                    '{time} BETWEEN %(time_from)s AND %(time_before)s) '
+                    'GROUP BY {bucket} '
+                    'HAVING {bucket} >= %(time_from)s::TIMESTAMP '
+                    'ORDER BY {bucket}').format(table=sql.Identifier(MY_TABLE_NAME),
+                                                bucket=bucket,
+                                                time_column=time_column,
+                                                symbol=sql.Identifier('symbol'),
+                                                source=sql.Identifier('source'),
+                                                price_type=sql.Identifier('price_type'),
+                                                time=sql.Identifier('time'),
+                                                open=sql.Identifier('open'),
+                                                high=sql.Identifier('high'),
+                                                low=sql.Identifier('low'),
+                                                close=sql.Identifier('close'),
+                                                volume=sql.Identifier('volume'),
+                                                period=sql.Identifier('period'),)
+
+    return query, {'interval': f'{period} minutes',
+                   'origin': CUSTOM_PERIOD_ORIGIN,
+                   'base_period': get_base_period(period),
+                   'price_type': price_type,
+                   'symbol': symbol,
+                   'source': source,
+                   'time_from': time_from,
+                   'time_before': time_before,
+                   }
+
+
+def aggregate_candlesticks(cursor, symbol, period, price_type, time_from, time_before, source='Dukascopy'):
+    # return rows of (time, open, high, low, close, volume) of a custom period, see get_aggregate_query
+    cursor.execute(*get_aggregate_query(symbol, period, price_type, time_from, time_before, source=source))
+    return cursor.fetchall()
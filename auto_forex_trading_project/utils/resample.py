@@ -0,0 +1,241 @@
+from utils.bi5 import columns_to_rows
+from utils.psql import copy_candlesticks, read_candlestick_columns
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+'''
+In-memory timeframe cascade
+
+Bars are column arrays {'time': datetime64, 'open', 'high', 'low', 'close', 'volume'} sorted by time.
+M5, M15, M30, H1, H4 and D1 are built in one pass over M1 bars of whole days, each from the previous one,
+then W1 (weeks starting on Sunday) and MN (calendar months) are built from D1.
+Only buckets containing bars are produced.
+'''
+
+# (period, source period) in the order they are built
+INTRADAY_CASCADE = ((5, 1), (15, 5), (30, 15), (60, 30), (240, 60), (1440, 240))
+
+SUNDAY_OF_EPOCH_WEEK = 3  # 1970-01-04 is the first Sunday after epoch
+
+# number of days loaded in memory at once
+MAX_DAYS_PER_PASS = 31
+
+
+def aggregate(columns, buckets):
+    # buckets are the bucket start time of every bar, sorted like bars
+    if not len(buckets):
+        return {name: column[:0] for name, column in columns.items()}
+
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.append(starts[1:], len(buckets)) - 1
+
+    return {'time': buckets[starts],
+            'open': columns['open'][starts],
+            'high': np.maximum.reduceat(columns['high'], starts),
+            'low': np.minimum.reduceat(columns['low'], starts),
+            'close': columns['close'][ends],
+            'volume': np.add.reduceat(columns['volume'], starts),
+            }
+
+
+def get_minute_buckets(time, period):
+    minutes = time.astype('datetime64[m]').astype(np.int64)
+    return (minutes // period * period).astype('datetime64[m]').astype(time.dtype)
+
+
+def get_week_buckets(time):
+    days = time.astype('datetime64[D]').astype(np.int64)
+    return ((days - SUNDAY_OF_EPOCH_WEEK) // 7 * 7 + SUNDAY_OF_EPOCH_WEEK).astype('datetime64[D]').astype(time.dtype)
+
+
+def get_month_buckets(time):
+    return time.astype('datetime64[M]').astype(time.dtype)
+
+
+def resample_cascade(m1_columns):
+    # return {period: columns} of M5 to D1
+    resampled = {}
+    columns = m1_columns
+    for period, _ in INTRADAY_CASCADE:
+        columns = aggregate(columns, get_minute_buckets(columns['time'], period))
+        resampled[period] = columns
+    return resampled
+
+
+def resample_weeks(d1_columns):
+    return aggregate(d1_columns, get_week_buckets(d1_columns['time']))
+
+
+def resample_months(d1_columns):
+    return aggregate(d1_columns, get_month_buckets(d1_columns['time']))
+
+
+def get_start_of_week(date):
+    return date - timedelta(days=date.isoweekday() % 7)
+
+
+def get_start_of_month(date):
+    return date.replace(day=1)
+
+
+def get_start_of_next_month(date):
+    return (date.replace(day=1) + timedelta(days=31)).replace(day=1)
+
+
+def merge_columns(old_columns, new_columns):
+    # bars of new_columns replace bars of old_columns at the same time
+    kept = ~np.isin(old_columns['time'], new_columns['time'])
+    order = np.argsort(np.concatenate((old_columns['time'][kept], new_columns['time'])), kind='stable')
+    return {name: np.concatenate((old_columns[name][kept], new_columns[name]))[order] for name in old_columns}
+
+
+def select_buckets(columns, buckets):
+    selected = np.isin(columns['time'], np.array(sorted(buckets), dtype='datetime64[D]').astype(columns['time'].dtype))
+    return {name: column[selected] for name, column in columns.items()}
+
+
+def concatenate_columns(columns_list):
+    return {name: np.concatenate([columns[name] for columns in columns_list]) for name in columns_list[0]}
+
+
+def merge_appended(old_columns, delta_columns):
+    '''
+    Merge bars aggregated from newly appended bars into stored bars of the same buckets
+    It is valid only if appended bars are later than every bar aggregated into the stored bars,
+    then open of a stored bar is kept, close is taken from the delta, and high, low and volume are combined
+    '''
+    merged = {name: column.copy() for name, column in delta_columns.items()}
+    if not len(old_columns['time']):
+        return merged
+
+    i = np.minimum(np.searchsorted(old_columns['time'], delta_columns['time']), len(old_columns['time']) - 1)
+    found = old_columns['time'][i] == delta_columns['time']
+    i = i[found]
+
+    merged['open'][found] = old_columns['open'][i]
+    merged['high'][found] = np.maximum(old_columns['high'][i], delta_columns['high'][found])
+    merged['low'][found] = np.minimum(old_columns['low'][i], delta_columns['low'][found])
+    merged['volume'][found] = old_columns['volume'][i] + delta_columns['volume'][found]
+    return merged
+
+
+def select_overlapping(columns, period, ranges):
+    # select bars of intraday period whose bucket overlaps any of ranges [time_from, time_before]
+    bucket_starts = columns['time']
+    bucket_ends = bucket_starts + np.timedelta64(period, 'm')
+    selected = np.zeros(len(bucket_starts), dtype=bool)
+    for time_from, time_before in ranges:
+        selected |= (bucket_starts <= time_before) & (bucket_ends > time_from)
+    return {name: column[selected] for name, column in columns.items()}
+
+
+def get_day_runs(dates, max_days=MAX_DAYS_PER_PASS):
+    # split sorted dates into runs of consecutive dates, no longer than max_days
+    runs = []
+    for d in dates:
+        if runs and d - runs[-1][-1] == timedelta(days=1) and len(runs[-1]) < max_days:
+            runs[-1].append(d)
+        else:
+            runs.append([d])
+    return runs
+
+
+def rebuild_timeframes(cursor, symbol, price_type, dates, source='Dukascopy'):
+    '''
+    Rebuild M5 to MN bars of given dates from M1 bars in database
+    Every pass reads M1 of up to MAX_DAYS_PER_PASS consecutive days and D1 of their weeks and months,
+    and writes all resampled bars by one bulk write. Return number of bars written.
+    '''
+    number_of_bars = 0
+    for run in get_day_runs(sorted(set(dates))):
+        time_from = datetime.combine(run[0], datetime.min.time())
+        time_before = datetime.combine(run[-1], datetime.min.time()) + timedelta(days=1, microseconds=-1)
+        m1_columns = read_candlestick_columns(cursor, symbol, 1, price_type, time_from, time_before, source=source)
+        if not len(m1_columns['time']):
+            continue
+
+        resampled = resample_cascade(m1_columns)
+
+        # D1 of the whole weeks and months touched, with D1 just built in place of stored ones
+        span_from = datetime.combine(min(get_start_of_week(run[0]), get_start_of_month(run[0])), datetime.min.time())
+        span_before = datetime.combine(max(get_start_of_week(run[-1]) + timedelta(days=7), get_start_of_next_month(run[-1])),
+                                       datetime.min.time()) - timedelta(microseconds=1)
+        d1_columns = read_candlestick_columns(cursor, symbol, 1440, price_type, span_from, span_before, source=source)
+        d1_columns = merge_columns(d1_columns, resampled[1440])
+
+        resampled[10080] = select_buckets(resample_weeks(d1_columns), {get_start_of_week(d) for d in run})
+        resampled[43200] = select_buckets(resample_months(d1_columns), {get_start_of_month(d) for d in run})
+
+        rows = [row for period, columns in resampled.items() for row in columns_to_rows(columns, symbol, period, source, price_type)]
+        number_of_bars += copy_candlesticks(cursor, rows)
+
+    return number_of_bars
+
+
+def rebuild_months(cursor, symbol, price_type, dates, source='Dukascopy'):
+    '''
+    Rebuild MN bars of the months of given dates from D1 bars in database, leaving other timeframes as they are
+    D1 of all the months is read at once, as there are a few thousand of them at most. Return number of bars written.
+    '''
+    months = {get_start_of_month(d) for d in dates}
+    if not months:
+        return 0
+
+    time_from = datetime.combine(min(months), datetime.min.time())
+    time_before = datetime.combine(get_start_of_next_month(max(months)), datetime.min.time()) - timedelta(microseconds=1)
+    d1_columns = read_candlestick_columns(cursor, symbol, 1440, price_type, time_from, time_before, source=source)
+    if not len(d1_columns['time']):
+        return 0
+
+    mn_columns = select_buckets(resample_months(d1_columns), months)
+    return copy_candlesticks(cursor, list(columns_to_rows(mn_columns, symbol, 43200, source, price_type)))
+
+
+if __name__ == '__main__':
+    # compare against pandas resample, which the update scripts used before
+    import pandas as pd
+    import time
+
+    rng = np.random.default_rng(0)
+    number_of_days = 366
+    bar_time = np.arange(np.datetime64('2020-01-01T00:00'), np.datetime64('2020-01-01T00:00') + np.timedelta64(number_of_days, 'D'),
+                         np.timedelta64(1, 'm')).astype('datetime64[s]')
+    bar_time = bar_time[rng.random(len(bar_time)) < 0.9]  # leave gaps
+    close = 1.1 + np.cumsum(rng.normal(0, 1e-4, len(bar_time)))
+    m1_columns = {'time': bar_time,
+                  'open': close + rng.normal(0, 1e-5, len(bar_time)),
+                  'high': close + 1e-4,
+                  'low': close - 1e-4,
+                  'close': close,
+                  'volume': rng.random(len(bar_time)),
+                  }
+
+    time_start = time.perf_counter()
+    resampled = resample_cascade(m1_columns)
+    resampled[10080] = resample_weeks(resampled[1440])
+    resampled[43200] = resample_months(resampled[1440])
+    numpy_time = time.perf_counter() - time_start
+
+    df = pd.DataFrame({name: column for name, column in m1_columns.items() if name != 'time'}, index=pd.DatetimeIndex(m1_columns['time']))
+
+    def pandas_resample(rule, **kwargs):
+        return df.resample(rule, closed='left', label='left', **kwargs).agg({'open': 'first', 'high': 'max', 'low': 'min',
+                                                                             'close': 'last', 'volume': 'sum'}).dropna()
+
+    time_start = time.perf_counter()
+    expected = {period: pandas_resample(f'{period}min', origin=pd.Timestamp('2019-12-29'))  # weeks start on a Sunday
+                for period in (5, 15, 30, 60, 240, 1440, 10080)}
+    expected[43200] = pandas_resample('MS')
+    pandas_time = time.perf_counter() - time_start
+
+    for period, columns in resampled.items():
+        assert (columns['time'] == expected[period].index.values.astype('datetime64[s]')).all(), period
+        for name in ('open', 'high', 'low', 'close'):
+            assert (columns[name] == expected[period][name].values).all(), (period, name)
+        assert np.allclose(columns['volume'], expected[period]['volume'].values), period
+
+    print(f'{len(bar_time)} M1 bars')
+    print(f'pandas resample: {pandas_time:.3f}s')
+    print(f'numpy cascade: {numpy_time:.3f}s')
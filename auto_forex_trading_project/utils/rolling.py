@@ -0,0 +1,56 @@
+import math
+import numpy as np
+
+'''
+Exact sums of rolling windows, the kernel of SMA derived by IndicatorCache of utils.indicatorcache
+'''
+
+
+class RollingSums:
+    '''
+    Sums of every window of `period` values, rounded once like math.fsum of backtrader indicators
+
+    Values are split into exact integer limbs, whose cumulative sums give the exact sum of any window,
+    so that SMA from these sums are identical to those of bt.ind.SMA.
+    '''
+    LIMB_BITS = 32
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.nans = np.concatenate(([0], np.cumsum(np.isnan(self.values))))
+        finite = np.where(np.isnan(self.values), 0.0, self.values)
+
+        # values are integers times 2 ** -shift, the least significant bit of the smallest value
+        _, exponents = np.frexp(finite[finite != 0])
+        self.shift = 53 - int(exponents.min()) if len(exponents) else 0
+        self.exact = bool(np.isfinite(finite).all()) and (not len(exponents) or int(exponents.max()) + self.shift < 63)
+        if not self.exact:
+            return
+
+        integers = np.ldexp(finite, self.shift).astype(np.int64)
+        high, low = integers >> self.LIMB_BITS, integers & (2 ** self.LIMB_BITS - 1)
+        self.high = np.concatenate(([0], np.cumsum(high)))
+        self.low = np.concatenate(([0], np.cumsum(low)))
+
+    def get_sums(self, period):
+        # sums of windows ending at every value, NaN before the first full window
+        sums = np.full(len(self.values), np.nan)
+        if period > len(self.values):
+            return sums
+
+        if self.exact:
+            high = (self.high[period:] - self.high[:-period]).astype(np.float64)
+            low = (self.low[period:] - self.low[:-period]).astype(np.float64)
+            # limbs are exact in float64, so the only rounding is that of the addition
+            sums[period - 1:] = np.ldexp(np.ldexp(high, self.LIMB_BITS) + low, -self.shift)
+        else:
+            windows = np.lib.stride_tricks.sliding_window_view(self.values, period)
+            sums[period - 1:] = [math.fsum(window) for window in windows]
+
+        # windows with NaN are NaN, like math.fsum
+        nans = self.nans[period:] - self.nans[:-period]
+        sums[period - 1:][nans > 0] = np.nan
+        return sums
+
+    def get_means(self, period):
+        return self.get_sums(period) / period
@@ -0,0 +1,88 @@
+from multiprocessing import resource_tracker, shared_memory
+
+import array
+
+'''
+Preloaded lines of data feeds in shared memory
+
+An optimization pickles the cerebro, datas included, to a worker for every test case.
+SharedLines copies the line buffers of preloaded datas into one shared memory block, and puts SharedArray in their place.
+A SharedArray is pickled as the name and position of its lines, and unpickled as a read-only memoryview of the block,
+so that test cases carry no bars and every worker reads the same pages.
+'''
+
+# blocks created or attached by this process, forked workers inherit those of the parent
+_blocks = {}
+
+
+def attach_shared_array(name, offset, length):
+    block = _blocks.get(name)
+    if block is None:
+        block = shared_memory.SharedMemory(name=name)
+        # the creating process unlinks the block, not the tracker of an attaching one
+        resource_tracker.unregister(block._name, 'shared_memory')
+        _blocks[name] = block
+
+    # indexing a memoryview returns float like array('d'), and writes raise TypeError
+    return block.buf[offset * 8:(offset + length) * 8].cast('d').toreadonly()
+
+
+def release_shared_arrays(datas):
+    # a worker empties lines of its datas once a test case is run, as its result is pickled back to the parent
+    # with references to the datas, e.g. from the child TimeReturn of SharpeRatio, and memoryviews cannot be pickled
+    for data in datas:
+        for line in data.lines:
+            if isinstance(line.array, memoryview):
+                line.array = array.array('d')
+
+
+def load_exhausted():
+    # in place of load() of a preloaded data, which would append to and pop from its lines at the end
+    return False
+
+
+class SharedArray:
+    def __init__(self, name, offset, length):
+        self.name = name
+        self.offset = offset
+        self.length = length
+
+    def __reduce__(self):
+        return attach_shared_array, (self.name, self.offset, self.length)
+
+    def __len__(self):
+        return self.length
+
+
+class SharedLines:
+    def __init__(self, datas):
+        self.datas = datas
+        self.lines = [line for data in datas for line in data.lines]
+        size = sum(len(line.array) for line in self.lines)
+
+        self.block = shared_memory.SharedMemory(create=True, size=max(size, 1) * 8)
+        _blocks[self.block.name] = self.block
+
+        # buffers of the datas are released, so that bars are held once by the parent too
+        offset = 0
+        for line in self.lines:
+            length = len(line.array)
+            self.block.buf[offset * 8:(offset + length) * 8] = line.array.tobytes()
+            line.array = SharedArray(self.block.name, offset, length)
+            offset += length
+
+        for data in datas:
+            data.load = load_exhausted
+
+    def close(self):
+        # give the line buffers back to the datas, and free the block
+        for line in self.lines:
+            shared_array = line.array
+            line.array = array.array('d')
+            line.array.frombytes(self.block.buf[shared_array.offset * 8:(shared_array.offset + shared_array.length) * 8])
+        for data in self.datas:
+            del data.load
+
+        _blocks.pop(self.block.name, None)
+        self.block.close()
+        self.block.unlink()
@@ -148,8 +148,8 @@ class MovingAveragesCrossover(bt.Strategy):
         if 'JPY' in self.datas[0]._name:
             self.p.one_lot_size /= 100
 
-        self.fast_sma = fast_sma = bt.ind.SMA(period=self.p.fast_ma_period)  # fast moving average
-        self.slow_sma = slow_sma = bt.ind.SMA(period=self.p.slow_ma_period)  # slow moving average
+        self.fast_sma = fast_sma = PrecomputedSMA(period=self.p.fast_ma_period)  # fast moving average
+        self.slow_sma = slow_sma = PrecomputedSMA(period=self.p.slow_ma_period)  # slow moving average
         self.crossover = bt.ind.CrossOver(fast_sma, slow_sma)  # crossover signal
 
         if self.p.use_strength:
@@ -271,7 +271,7 @@ class RSIPositionSizing(bt.Strategy):
         self.max_buy_position = self.p.one_lot_size
         self.max_sell_position = self.p.one_lot_size
 
-        self.rsi = bt.ind.RSI(period=self.p.period, upperband=self.p.upperband, lowerband=self.p.lowerband, safediv=True)
+        self.rsi = CachedRSI(period=self.p.period, upperband=self.p.upperband, lowerband=self.p.lowerband, safediv=True)
 
         self.buy_signal = self.rsi <= self.p.lowerband
         self.sell_signal = self.rsi >= self.p.upperband
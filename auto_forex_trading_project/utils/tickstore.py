@@ -0,0 +1,106 @@
+from utils.barstore import date2num_from_epoch
+from utils.bi5 import read_ticks
+from utils.constants import *
+from utils.dukascopy import get_tick_save_path
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import os
+
+'''
+On-disk tick store
+
+Ticks of a symbol are kept in one `.npy` file per day
+    {root}/{symbol}/{year}/{MM_DD}.npy
+holding a structured array of TICK_STORE_DTYPE, 24 bytes a tick instead of a table row:
+time in epoch milliseconds of the Dukascopy clock, bid and ask in integer pipettes, and volumes.
+Day files are memory-mapped, so a replay only touches pages of the ticks it reads.
+'''
+
+TICK_STORE_DTYPE = np.dtype([
+    ('time', '<i8'),
+    ('bid', '<i4'),
+    ('ask', '<i4'),
+    ('bid_volume', '<f4'),
+    ('ask_volume', '<f4'),
+])
+
+
+def get_day_path(root, symbol, date):
+    return Path(root, symbol, str(date.year), f'{date.month:02d}_{date.day:02d}.npy')
+
+
+def write_day(root, symbol, date, columns):
+    # columns as returned by utils.bi5.read_ticks, return number of ticks
+    ticks = np.empty(len(columns['time']), dtype=TICK_STORE_DTYPE)
+    ticks['time'] = columns['time'].astype('datetime64[ms]').astype(np.int64)
+    for name in ('bid', 'ask', 'bid_volume', 'ask_volume'):
+        ticks[name] = columns[name]
+
+    # write then rename, so that readers never see a half written day
+    day_path = get_day_path(root, symbol, date)
+    day_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = day_path.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, ticks)
+    os.replace(tmp_path, day_path)
+
+    return len(ticks)
+
+
+def ingest_day(data_root, root, symbol, date):
+    # decode the hourly bi5 tick files of a day into one day file, hours not downloaded are skipped
+    columns_list = []
+    for hour in range(24):
+        path = get_tick_save_path(data_root, symbol, date, hour)
+        if path.is_file():
+            columns_list.append(read_ticks(path, datetime.combine(date, datetime.min.time()) + timedelta(hours=hour)))
+
+    if not columns_list:
+        return 0
+
+    columns = {name: np.concatenate([columns[name] for columns in columns_list]) for name in columns_list[0]}
+    return write_day(root, symbol, date, columns)
+
+
+def open_day(root, symbol, date):
+    day_path = get_day_path(root, symbol, date)
+    if not day_path.is_file():
+        return None
+    return np.load(day_path, mmap_mode='r')
+
+
+def iter_chunks(root, symbol, fromdate, todate, chunk_size=100000):
+    '''
+    Yield ticks within [fromdate, todate] as column arrays of at most chunk_size ticks
+    datetime is backtrader date numbers and bid and ask are prices, only a chunk is converted at a time
+    '''
+    # only years in store are walked through day by day
+    years = sorted(int(year_dir.name) for year_dir in Path(root, symbol).glob('[0-9][0-9][0-9][0-9]'))
+    if not years:
+        return
+    fromdate = max(fromdate, datetime(years[0], 1, 1))
+    todate = min(todate, datetime(years[-1], 12, 31, 23, 59, 59, 999999))
+    time_from = np.datetime64(fromdate, 'ms').astype(np.int64)
+    time_before = np.datetime64(todate, 'ms').astype(np.int64)
+    scale = PIPETTE_SCALES[symbol]
+
+    date = fromdate.date()
+    while date <= todate.date():
+        ticks = open_day(root, symbol, date)
+        date += timedelta(days=1)
+        if ticks is None:
+            continue
+
+        start = np.searchsorted(ticks['time'], time_from, side='left')
+        end = np.searchsorted(ticks['time'], time_before, side='right')
+        for i in range(start, end, chunk_size):
+            chunk = ticks[i:min(i + chunk_size, end)]
+            yield {'datetime': date2num_from_epoch(chunk['time'] / 1000),
+                   'bid': chunk['bid'] / scale,
+                   'ask': chunk['ask'] / scale,
+                   'bid_volume': chunk['bid_volume'].astype(np.float64),
+                   'ask_volume': chunk['ask_volume'].astype(np.float64),
+                   }
@@ -0,0 +1,727 @@
+from backtrader.cerebro import OptReturn
+from backtrader.mathsupport import average, standarddev
+from backtrader.metabase import ItemCollection
+from backtrader.utils import AutoOrderedDict
+from collections import OrderedDict
+from datetime import datetime
+from utils.commissions import ForexCommission
+from utils.indicatorcache import get_indicator_cache
+from utils.strategies import MovingAveragesCrossover, RSIPositionSizing
+
+import abc
+import backtrader as bt
+import itertools
+import math
+import numpy as np
+import os
+
+'''
+Vectorized backtests of parameter sweeps
+
+An engine simulates test cases of a strategy on the first data of a cerebro, with the cash and commission of its broker,
+as (test cases, bars) arrays rather than bar by bar:
+    - signals of the strategy give the target position decided at every bar
+    - market orders fill at the open of the next bar, as BackBroker does
+    - cash is charged the commission and the daily credit interest of ForexCommission, in the steps of BackBroker
+    - DrawDown, Returns and SharpeRatio are computed from the value series, with the same rets as the analyzers
+Results are OptReturn like those of an optimization by cerebro, so that Optimizer builds the same strats_df.
+
+Orders are assumed to be accepted by the broker. A test case with an order that BackBroker would reject for cash,
+checked at the close of the bar it is created like `checksubmit` does, is simulated again by an Account bar by bar.
+'''
+
+# bytes of one (test cases, bars) array, which bounds the number of test cases simulated at once
+BATCH_MAX_BYTES = int(os.environ.get('FOREX_VECTORIZED_BATCH_MAX_BYTES', 64 * 2 ** 20))
+
+# analyzers which are not in strats_df of Optimizer, trades are not recorded by engines
+SKIPPED_ANALYZERS = ('tradeanalyzer', 'transactions')
+
+# date number of 1970-01-01
+EPOCH_DATE2NUM = bt.date2num(datetime(1970, 1, 1))
+
+
+def forward_fill(values, initial=0.0):
+    # last non-NaN value along the bars of every row, initial before the first
+    index = np.arange(values.shape[-1])
+    last = np.maximum.accumulate(np.where(np.isnan(values), -1, index), axis=-1)
+    filled = np.take_along_axis(values, np.maximum(last, 0), axis=-1)
+    return np.where(last >= 0, filled, initial)
+
+
+def shift_bars(values, fill_value=np.nan):
+    # values of the previous bar along the bars of every row
+    shifted = np.empty_like(values)
+    shifted[..., 0] = fill_value
+    shifted[..., 1:] = values[..., :-1]
+    return shifted
+
+
+def get_crossover(difference, start):
+    # bt.ind.CrossOver of lines with difference from bar start, where NonZeroDifference is seeded
+    index = np.arange(difference.shape[-1])
+    seeded = (index >= start) & ((difference != 0) | (index == start))
+    previous = shift_bars(forward_fill(np.where(seeded, difference, np.nan), np.nan))
+    return ((previous < 0) & (difference > 0)).astype(np.float64) - ((previous > 0) & (difference < 0))
+
+
+def get_column(params_batch, name):
+    # a param of every test case, as a column against bars
+    return np.array([getattr(params, name) for params in params_batch])[:, None]
+
+
+def get_period_keys(datetimes, timeframe, compression=1):
+    # increasing keys, which change at bars where a TimeFrameAnalyzerBase of the timeframe starts a new period
+    # bars are on whole seconds, to which num2date rounds date numbers up, e.g. 01:00 is 00:59:59.999996 as a date number
+    seconds = np.round(np.asarray(datetimes) * 86400).astype(np.int64)
+    days = seconds // 86400
+    if timeframe == bt.TimeFrame.NoTimeFrame:
+        return np.zeros(len(datetimes), dtype=np.int64)
+
+    elif timeframe in (bt.TimeFrame.Years, bt.TimeFrame.Months):
+        dates = (days - int(EPOCH_DATE2NUM)).astype('datetime64[D]')
+        return dates.astype('datetime64[Y]' if timeframe == bt.TimeFrame.Years else 'datetime64[M]').astype(np.int64)
+
+    elif timeframe == bt.TimeFrame.Weeks:
+        # date number 1, 0001-01-01, is a Monday, so weeks are those of isocalendar()
+        return (days - 1) // 7
+
+    elif timeframe == bt.TimeFrame.Days:
+        return days
+
+    elif timeframe in (bt.TimeFrame.Minutes, bt.TimeFrame.Seconds):
+        seconds = seconds % 86400
+        points = (seconds // 60 if timeframe == bt.TimeFrame.Minutes else seconds) // compression
+        return days * 86400 + points
+
+    raise ValueError(f'Timeframe {bt.TimeFrame.getname(timeframe)} is not supported by vectorized analyzers')
+
+
+class Analysis:
+    # in place of an analyzer of a strategy in OptReturn
+    def __init__(self, rets):
+        self.rets = rets
+
+    def get_analysis(self):
+        return self.rets
+
+
+def get_drawdown(values):
+    # rets of bt.analyzers.DrawDown
+    maxvalues = np.maximum.accumulate(values)
+    moneydowns = maxvalues - values
+    drawdowns = 100.0 * moneydowns / maxvalues
+
+    # bars in drawdown since the last bar at a peak
+    in_drawdown = drawdowns != 0
+    index = np.arange(len(values))
+    lengths = index - np.maximum.accumulate(np.where(in_drawdown, -1, index))
+
+    rets = AutoOrderedDict()
+    rets.len = int(lengths[-1])
+    rets.drawdown = float(drawdowns[-1])
+    rets.moneydown = float(moneydowns[-1])
+    rets.max.len = max(0.0, int(lengths.max()))
+    rets.max.drawdown = max(0.0, float(drawdowns.max()))
+    rets.max.moneydown = max(0.0, float(moneydowns.max()))
+    rets._close()
+    return rets
+
+
+def get_returns(values, datetimes, value_start, params, data):
+    # rets of bt.analyzers.Returns
+    timeframe = params.timeframe or data._timeframe
+    compression = params.compression or data._compression
+    keys = get_period_keys(datetimes, timeframe, compression)
+    number_of_periods = 1 + int(np.count_nonzero(np.diff(keys)))
+
+    rets = OrderedDict()
+    nlrtot = values[-1] / value_start
+    rets['rtot'] = rtot = float('-inf') if nlrtot < 0.0 else math.log(nlrtot)
+    rets['ravg'] = ravg = rtot / number_of_periods
+
+    tann = params.tann or bt.analyzers.Returns._TANN.get(timeframe, None)
+    if tann is None:
+        tann = bt.analyzers.Returns._TANN.get(data._timeframe, 1.0)
+
+    rets['rnorm'] = rnorm = math.expm1(ravg * tann) if ravg > float('-inf') else ravg
+    rets['rnorm100'] = rnorm * 100.0
+    return rets
+
+
+def get_sharperatio(values, datetimes, value_start, params, data):
+    # rets of bt.analyzers.SharpeRatio, from returns of TimeReturn over periods of the timeframe
+    if params.legacyannual:
+        raise ValueError('SharpeRatio with legacyannual is not supported by vectorized analyzers')
+
+    keys = get_period_keys(datetimes, params.timeframe, params.compression)
+    last_bars = np.append(np.flatnonzero(np.diff(keys)), len(values) - 1)
+    period_values = values[last_bars]
+    returns = list(period_values / np.concatenate(([value_start], period_values[:-1])) - 1.0)
+
+    rate = params.riskfreerate
+    factor = None
+    if params.timeframe == bt.TimeFrame.Days and params.daysfactor is not None:
+        factor = params.daysfactor
+    elif params.factor is not None:
+        factor = params.factor
+    elif params.timeframe in bt.analyzers.SharpeRatio.RATEFACTORS:
+        factor = bt.analyzers.SharpeRatio.RATEFACTORS[params.timeframe]
+
+    if factor is not None:
+        if params.convertrate:
+            rate = pow(1.0 + rate, 1.0 / factor) - 1.0
+        else:
+            returns = [pow(1.0 + x, factor) - 1.0 for x in returns]
+
+    ratio = None
+    if len(returns) - params.stddev_sample:
+        ret_free = [float(r) - rate for r in returns]
+        ret_free_avg = average(ret_free)
+        retdev = standarddev(ret_free, avgx=ret_free_avg, bessel=params.stddev_sample)
+        try:
+            ratio = ret_free_avg / retdev
+            if factor is not None and params.convertrate and params.annualize:
+                ratio = math.sqrt(factor) * ratio
+        except (ValueError, TypeError, ZeroDivisionError):
+            ratio = None
+
+    rets = OrderedDict()
+    rets['sharperatio'] = ratio
+    return rets
+
+
+ANALYSES = {
+    bt.analyzers.DrawDown: lambda values, datetimes, value_start, params, data: get_drawdown(values),
+    bt.analyzers.Returns: get_returns,
+    bt.analyzers.SharpeRatio: get_sharperatio,
+}
+
+
+def split_size(position, size):
+    # opened and closed parts of an order of size against position, as Position.update splits them
+    new_position = position + size
+    if not new_position:
+        return 0.0, size
+    elif not position or (position > 0) == (size > 0):
+        return size, 0.0
+    elif (position > 0) == (new_position > 0):
+        return 0.0, size
+    return new_position, -position
+
+
+class Account:
+    '''
+    Cash and position of a test case bar by bar, in which orders are checked for cash like BackBroker with `checksubmit`
+    and filled with its arithmetic
+    '''
+    def __init__(self, engine):
+        self.engine = engine
+        self.cash = engine.cash
+        self.broker_position = bt.Position()
+        self.day_bars = engine.day_bars.tolist()
+        self.day = 0  # next of day_bars
+        self.fills = []  # (bar, position after the fill at its open)
+
+    @property
+    def position(self):
+        return self.broker_position.size
+
+    def advance(self, bar):
+        # credit interest of the position, charged at the first bar of every day until bar
+        while self.day < len(self.day_bars) and self.day_bars[self.day] <= bar:
+            if self.broker_position.size:
+                day_bar = self.day_bars[self.day]
+                self.cash -= self.engine.get_interest(self.broker_position.size, self.engine.day_changes[day_bar])
+            self.day += 1
+
+    def execute(self, size, price, pseudo=False):
+        # cash after the closed and after the opened part of a fill, and both parts, like BackBroker._execute
+        # of an unleveraged position, where a pseudo-execution of `checksubmit` has no profit and loss
+        comminfo = self.engine.comminfo
+        pprice_orig = price if pseudo else self.broker_position.price
+        opened, closed = split_size(self.broker_position.size, size)
+
+        cash = self.cash
+        if closed:
+            pnl = 0 if pseudo else comminfo.profitandloss(-closed, pprice_orig, price)
+            cash += comminfo.getvaluesize(-closed, pprice_orig) + pnl * comminfo.stocklike
+            cash -= comminfo.getcommission(closed, price)
+
+        closed_cash = cash
+        if opened:
+            cash -= comminfo.getvaluesize(opened, price)
+            cash -= comminfo.getcommission(opened, price)
+        return closed_cash, cash, closed, opened
+
+    def order(self, bar, target):
+        # market order of the strategy at bar to hold target, filled at the next open as far as the cash allows
+        size = target - self.broker_position.size
+        if not size or bar + 1 >= len(self.engine.close):
+            return
+
+        self.advance(bar)
+        if self.execute(size, self.engine.close[bar], pseudo=True)[1] < 0.0:
+            return  # Margin at submission
+
+        self.advance(bar + 1)
+        price = self.engine.open[bar + 1]
+        closed_cash, cash, closed, opened = self.execute(size, price)
+        if opened and cash < 0.0:
+            opened, cash = 0.0, closed_cash  # Margin, the rest of the order is not filled later
+
+        self.cash = cash
+        if closed or opened:
+            self.broker_position.update(closed + opened, price)
+            self.fills.append((bar + 1, self.broker_position.size))
+
+    def get_positions(self):
+        positions = np.full(len(self.engine.close), np.nan)
+        positions[0] = 0.0
+        for bar, position in self.fills:
+            positions[bar] = position
+        return forward_fill(positions)
+
+
+class VectorizedEngine(abc.ABC):
+    '''
+    Subclasses implement get_positions and scan for their strategy, and get_params if its __init__ changes params
+    '''
+    strategy = None
+
+    def __init__(self, cerebro, batch_size=None):
+        self.data = data = cerebro.datas[0]
+        if not len(data.lines.datetime.array):
+            data._start()
+            data.preload()
+            data.stop()
+
+        self.datetime = np.array(data.lines.datetime.array, dtype=np.float64)
+        self.open = np.array(data.lines.open.array, dtype=np.float64)
+        self.close = np.array(data.lines.close.array, dtype=np.float64)
+        self.days = np.floor(self.datetime)  # credit interest is charged by calendar days of bars
+        self.day_changes = np.diff(self.days, prepend=self.days[:1])
+        self.day_bars = np.flatnonzero(self.day_changes)
+        self.index = np.arange(len(self.close))
+
+        self.cash = cerebro.broker.startingcash
+        self.comminfo = comminfo = cerebro.broker.getcommissioninfo(data)
+        if not isinstance(comminfo, ForexCommission) or not comminfo.stocklike or comminfo.get_leverage() != 1:
+            raise ValueError('Vectorized engines simulate ForexCommission of stocklike, unleveraged positions')
+
+        self.analyzers = []
+        for ancls, anargs, ankwargs in cerebro.analyzers:
+            ankwargs = dict(ankwargs)
+            name = ankwargs.pop('_name', '') or ancls.__name__.lower()
+            if name in SKIPPED_ANALYZERS:
+                continue
+            if ancls not in ANALYSES or anargs:
+                raise ValueError(f'Analyzer {ancls.__name__} is not supported by vectorized engines')
+
+            params = ancls.params()
+            for key, value in ankwargs.items():
+                setattr(params, key, value)
+            self.analyzers.append((name, ANALYSES[ancls], params))
+
+        self.batch_size = batch_size or max(1, BATCH_MAX_BYTES // (8 * max(len(self.close), 1)))
+
+    def get_commission(self, sizes, prices):
+        if self.comminfo._commtype == bt.CommInfoBase.COMM_PERC:
+            return abs(sizes) * self.comminfo.p.commission * prices
+        return abs(sizes) * self.comminfo.p.commission
+
+    def get_interest(self, positions, days):
+        # ForexCommission charges days * interest * abs(size), of longs only with interest_long
+        if not self.comminfo.p.interest_long:
+            positions = np.minimum(positions, 0.0)
+        return days * self.comminfo._creditrate * abs(positions)
+
+    def get_fills(self, positions):
+        # positions before the fills at the open of every bar, and their closed and opened parts, split like Position.update
+        previous = shift_bars(positions, 0.0)
+        sizes = positions - previous
+        reduced = previous * sizes < 0
+        flipped = previous * positions < 0
+        closed = np.where(reduced, np.where(flipped, -previous, sizes), 0.0)
+        opened = np.where(reduced, np.where(flipped, positions, 0.0), sizes)
+        return previous, closed, opened
+
+    def get_prices(self, positions, previous, opened):
+        # average prices of positions after the fills at the open of every bar, like Position.update
+        increased = previous * opened > 0
+        prices = np.where(positions == 0, 0.0, np.where((opened != 0) & ~increased, self.open, np.nan))
+
+        # positions increased in their direction are averaged with the price before, fill by fill
+        for row in np.ndindex(positions.shape[:-1]):
+            if not increased[row].any():
+                continue
+
+            bars = np.flatnonzero(positions[row] != previous[row])
+            price, averages = 0.0, []
+            for is_increased, row_price, position_before, size, position, open_price in zip(
+                    increased[row][bars].tolist(), prices[row][bars].tolist(), previous[row][bars].tolist(),
+                    opened[row][bars].tolist(), positions[row][bars].tolist(), self.open[bars].tolist()):
+                if is_increased:
+                    price = (price * position_before + size * open_price) / position
+                elif not math.isnan(row_price):
+                    price = row_price
+                averages.append(price)
+            prices[row][bars] = averages
+        return forward_fill(prices)
+
+    def get_account(self, positions):
+        '''
+        Cash and value after every bar, of positions after the fills at the open of every bar
+
+        Cash is changed in the steps of BackBroker, each rounded in turn: the credit interest of the position held,
+        the value and the profit and loss of the closed part, its commission, the value of the opened part and its commission,
+        so that values are identical to those of backtrader, ties of DrawDown included.
+        '''
+        previous, closed, opened = self.get_fills(positions)
+        prices = self.get_prices(positions, previous, opened)
+        previous_prices = shift_bars(prices, 0.0)
+        mult = self.comminfo.p.mult
+
+        steps = np.stack((-self.get_interest(previous, self.day_changes),
+                          -closed * previous_prices + -closed * (self.open - previous_prices) * mult,
+                          -self.get_commission(closed, self.open),
+                          -opened * self.open,
+                          -self.get_commission(opened, self.open)), axis=-1)
+        steps = np.concatenate((np.full(positions.shape[:-1] + (1,), self.cash), steps.reshape(positions.shape[:-1] + (-1,))), axis=-1)
+        cash = np.cumsum(steps, axis=-1)[..., 5::5]
+
+        # a long position is valued at its cost plus its profit and loss, a short one at its size times the close
+        position_values = positions * self.close
+        pnl = positions * (self.close - prices) * mult
+        values = cash + np.where(position_values > 0, (position_values - pnl) + pnl, position_values)
+        return cash, values
+
+    def get_rejected(self, positions, ends, cash):
+        # test cases with an order which the broker would not fill in full
+        previous, closed, opened = self.get_fills(positions)
+        ordered = (positions != previous) & (self.index > 0) & (self.index <= ends[:, None])
+
+        # pseudo-executed by `checksubmit` at the close of the bar it is created, with the cash after it
+        created_cash, created_close = shift_bars(cash), shift_bars(self.close)
+        created_cash = created_cash + -closed * created_close
+        created_cash = created_cash - self.get_commission(closed, created_close)
+        created_cash = created_cash - opened * created_close
+        created_cash = created_cash - self.get_commission(opened, created_close)
+        rejected = ordered & (created_cash < 0.0)
+
+        # the opened part of a fill is dropped at the open if the cash is negative after it
+        rejected |= ordered & (opened != 0) & (cash < 0.0)
+        return rejected.any(axis=-1)
+
+    def run(self, testcases, callback=None):
+        results, batch = [], []
+        for testcase in testcases:
+            batch.append(testcase)
+            if len(batch) == self.batch_size:
+                results += self.run_batch(batch, callback)
+                batch = []
+        if batch:
+            results += self.run_batch(batch, callback)
+        return results
+
+    def run_batch(self, testcases, callback=None):
+        params_batch = [self.get_params(testcase) for testcase in testcases]
+        positions, ends = self.get_positions(params_batch)
+        cash, values = self.get_account(positions)
+
+        for row in np.flatnonzero(self.get_rejected(positions, ends, cash)):
+            positions[row], ends[row] = self.scan(params_batch, row)
+            cash[row], values[row] = self.get_account(positions[row])
+
+        results = []
+        for params, row_values, end in zip(params_batch, values, ends):
+            analyzers = ItemCollection()
+            for name, get_analysis, analyzer_params in self.analyzers:
+                rets = get_analysis(row_values[:end + 1], self.datetime[:end + 1], self.cash, analyzer_params, self.data)
+                analyzers.append(Analysis(rets), name)
+
+            result = OptReturn(params, analyzers=analyzers, strategycls=self.strategy)
+            results.append(result)
+            if callback is not None:
+                callback(result)
+        return results
+
+    def get_params(self, testcase):
+        # params of the strategy, as set by its __init__
+        params = self.strategy.params()
+        params.optimization_dict = testcase
+        for key, value in testcase.items():
+            setattr(params, key, value)
+        return params
+
+    def get_bar(self, dt):
+        # first bar at or after dt
+        return np.searchsorted(self.datetime, bt.date2num(dt), side='left')
+
+    def get_closing(self, signals):
+        # positions are closed from datetime_before, and the run is stopped at the first bar without position,
+        # once next() is called and past datetime_from
+        return np.maximum(np.maximum(signals['datetime_before'], signals['first']), signals['datetime_from'])
+
+    def get_ends(self, positions, closing):
+        # last bars, the closing one or the next if a position is closed at it
+        last = len(self.index) - 1
+        closed = np.take_along_axis(positions, np.minimum(closing, last), axis=-1)[:, 0] != 0
+        return np.minimum(closing[:, 0] + closed, last)
+
+    @abc.abstractmethod
+    def get_positions(self, params_batch):
+        # (test cases, bars) positions after the fills at the open of every bar if every order is accepted,
+        # and the last bar of every test case
+        pass
+
+    @abc.abstractmethod
+    def scan(self, params_batch, row):
+        # positions and the last bar of a test case by an Account
+        pass
+
+
+class MovingAveragesCrossoverEngine(VectorizedEngine):
+    '''
+    Positions of MovingAveragesCrossover
+
+    At a crossover, the target is the lot in its direction, or none if use_strength and the signal is weak,
+    which opens, reverses or closes the position, or leaves it flat, as next() does.
+    '''
+    strategy = MovingAveragesCrossover
+
+    def __init__(self, cerebro, batch_size=None):
+        super(MovingAveragesCrossoverEngine, self).__init__(cerebro, batch_size=batch_size)
+        # SMA of every period are derived once from the cache of the data, shared with PrecomputedSMA of strategies
+        self.indicator_cache = get_indicator_cache(self.data)
+
+    def get_sma(self, period):
+        return self.indicator_cache.get_sma(period)
+
+    def get_params(self, testcase):
+        params = super(MovingAveragesCrossoverEngine, self).get_params(testcase)
+        if 'JPY' in self.data._name:
+            params.one_lot_size /= 100
+        return params
+
+    def get_signals(self, params_batch):
+        fast = np.array([self.get_sma(params.fast_ma_period) for params in params_batch])
+        slow = np.array([self.get_sma(params.slow_ma_period) for params in params_batch])
+
+        # next() is called from the first bar of CrossOver, one after the first bar of both SMA
+        first = np.array([max(params.fast_ma_period, params.slow_ma_period) for params in params_batch])[:, None]
+        crossover = get_crossover(fast - slow, first - 1)
+
+        weak = get_column(params_batch, 'use_strength') & (abs(fast - shift_bars(fast)) < get_column(params_batch, 'strength'))
+
+        datetime_from = np.array([self.get_bar(params.datetime_from) for params in params_batch])[:, None]
+        datetime_before = np.array([self.get_bar(params.datetime_before) for params in params_batch])[:, None]
+        return dict(crossover=crossover, weak=weak, first=first, datetime_from=datetime_from, datetime_before=datetime_before)
+
+    def get_positions(self, params_batch):
+        signals = self.get_signals(params_batch)
+        lots = get_column(params_batch, 'one_lot_size')
+
+        closing = self.get_closing(signals)
+        window = (self.index >= signals['datetime_from']) & (self.index < closing)
+
+        targets = np.where(window & (signals['crossover'] != 0), signals['crossover'] * lots * ~signals['weak'], np.nan)
+        targets = forward_fill(np.where(self.index >= closing, 0.0, targets))
+        positions = shift_bars(targets, 0.0)
+        return positions, self.get_ends(positions, closing)
+
+    def scan(self, params_batch, row):
+        params = params_batch[row]
+        signals = self.get_signals([params])
+        crossover, weak = signals['crossover'][0], signals['weak'][0]
+        datetime_from, closing = signals['datetime_from'][0, 0], self.get_closing(signals)[0, 0]
+
+        account = Account(self)
+        end = len(self.index) - 1
+        for bar in np.flatnonzero((crossover != 0) & (self.index >= datetime_from) | (self.index >= closing)):
+            if bar >= closing:
+                if not account.position:
+                    end = bar
+                    break
+                account.order(bar, 0.0)
+
+            elif not account.position:
+                if not weak[bar]:
+                    account.order(bar, crossover[bar] * params.one_lot_size)
+
+            elif account.position * crossover[bar] < 0:
+                # reverse, or close if the signal is weak
+                account.order(bar, 0.0 if weak[bar] else crossover[bar] * params.one_lot_size)
+
+        return account.get_positions(), end
+
+
+class RSIPositionSizingEngine(VectorizedEngine):
+    '''
+    Positions of RSIPositionSizing
+
+    Without use_strength, RSI crossing up lowerband buys and crossing down upperband sells the lot,
+    opening or reversing the position, so that the target is the lot in the direction of the last crossover.
+    With use_strength, a position is opened while RSI is beyond a band, is sized up to the furthest RSI beyond it,
+    and is closed once RSI is at its unwind level. Such positions are followed from entry to exit, test case by test case.
+    '''
+    strategy = RSIPositionSizing
+
+    def __init__(self, cerebro, batch_size=None):
+        super(RSIPositionSizingEngine, self).__init__(cerebro, batch_size=batch_size)
+        self.rsis = {}
+
+    @staticmethod
+    def get_smoothed(values, period):
+        # bt.ind.SmoothedMovingAverage of values from the second, seeded by the math.fsum mean of the first period values
+        smoothed = np.full(len(values), np.nan)
+        if period >= len(values):
+            return smoothed
+
+        alpha = 1.0 / period
+        alpha1 = 1.0 - alpha
+        seed = math.fsum(values[1:period + 1]) / period
+        # the recursion of next(), in floats rounded step by step
+        smoothed[period:] = list(itertools.accumulate(values[period + 1:].tolist(),
+                                                      lambda previous, value: previous * alpha1 + value * alpha, initial=seed))
+        return smoothed
+
+    def get_rsi(self, period):
+        # bt.ind.RSI with safediv, 100 if the average down move is 0 and 50 if both averages are
+        if period not in self.rsis:
+            changes = np.diff(self.close, prepend=np.nan)
+            maup = self.get_smoothed(np.maximum(changes, 0.0), period)
+            madown = self.get_smoothed(np.maximum(-changes, 0.0), period)
+            with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+                rsi = 100.0 - 100.0 / (1.0 + maup / madown)
+            rsi[(maup == 0.0) & (madown == 0.0)] = 50.0
+            self.rsis[period] = rsi
+        return self.rsis[period]
+
+    def get_signals(self, params_batch):
+        rsi = np.array([self.get_rsi(params.period) for params in params_batch])
+
+        # next() is called from the first bar of CrossOver, one after the first bar of RSI
+        first = get_column(params_batch, 'period') + 1
+        buy = get_crossover(rsi - get_column(params_batch, 'lowerband'), first - 1)
+        sell = get_crossover(rsi - get_column(params_batch, 'upperband'), first - 1)
+
+        datetime_from = np.array([self.get_bar(params.datetime_from) for params in params_batch])[:, None]
+        datetime_before = np.array([self.get_bar(params.datetime_before) for params in params_batch])[:, None]
+        return dict(rsi=rsi, buy=buy, sell=sell, first=first, datetime_from=datetime_from, datetime_before=datetime_before)
+
+    def get_positions(self, params_batch):
+        signals = self.get_signals(params_batch)
+        lots = get_column(params_batch, 'one_lot_size')
+
+        closing = self.get_closing(signals)
+        window = (self.index >= np.maximum(signals['datetime_from'], signals['first'])) & (self.index < closing)
+
+        targets = np.where(window & (signals['buy'] > 0), lots, np.where(window & (signals['sell'] < 0), -lots, np.nan))
+        targets = forward_fill(np.where(self.index >= closing, 0.0, targets))
+        for row, params in enumerate(params_batch):
+            if params.use_strength:
+                targets[row] = self.get_sized_targets(params, signals['rsi'][row], window[row], closing[row, 0])
+
+        positions = shift_bars(targets, 0.0)
+        ends = self.get_ends(positions, closing)
+        for row, params in enumerate(params_batch):
+            if not params.use_strength and params.lowerband >= params.upperband:
+                # both crossovers may be at a bar, which next() takes by the position
+                positions[row], ends[row] = self.scan(params_batch, row)
+        return positions, ends
+
+    def get_sized_targets(self, params, rsi, window, closing):
+        # targets of a test case with use_strength, assuming that every order is accepted
+        lot = params.one_lot_size
+        buys = window & (rsi <= params.lowerband)
+        sells = window & (rsi >= params.upperband)
+        buy_sizes = np.where(buys, np.maximum(lot, lot * (1 + (params.lowerband - rsi) * params.size_multiplier)), 0.0)
+        sell_sizes = np.where(sells, np.maximum(lot, lot * (1 + (rsi - params.upperband) * params.size_multiplier)), 0.0)
+
+        entries = np.flatnonzero(buys | sells)
+        buy_exits = np.flatnonzero(window & (rsi >= params.lower_unwind))
+        sell_exits = np.flatnonzero(window & (rsi <= params.upper_unwind))
+
+        targets = np.zeros(len(rsi))
+        i = 0
+        while i < len(entries):
+            entry = entries[i]
+            sign, sizes, exits = (1.0, buy_sizes, buy_exits) if buys[entry] else (-1.0, sell_sizes, sell_exits)
+
+            # held at the largest size since entry until the first exit after it, or until closing
+            j = np.searchsorted(exits, entry, side='right')
+            stop = exits[j] if j < len(exits) else closing
+            targets[entry:stop] = sign * np.maximum.accumulate(sizes[entry:stop])
+
+            # flat from the bar after the exit
+            i = np.searchsorted(entries, stop + 1, side='left')
+        return targets
+
+    def scan(self, params_batch, row):
+        params = params_batch[row]
+        signals = self.get_signals([params])
+        rsi, buy, sell = signals['rsi'][0], signals['buy'][0], signals['sell'][0]
+        datetime_from, closing = max(signals['datetime_from'][0, 0], signals['first'][0, 0]), self.get_closing(signals)[0, 0]
+
+        if params.use_strength:
+            events = ((rsi <= params.lowerband) | (rsi >= params.upperband) |
+                      (rsi >= params.lower_unwind) | (rsi <= params.upper_unwind))
+        else:
+            events = (buy > 0) | (sell < 0)
+
+        lot = params.one_lot_size
+        max_buy_position, max_sell_position = lot, lot
+        account = Account(self)
+        end = len(self.index) - 1
+        for bar in np.flatnonzero(events & (self.index >= datetime_from) | (self.index >= closing)):
+            if bar >= closing:
+                if not account.position:
+                    end = bar
+                    break
+                account.order(bar, 0.0)
+
+            elif not params.use_strength:
+                if not account.position:
+                    if buy[bar] > 0:
+                        account.order(bar, lot)
+                    elif sell[bar] < 0:
+                        account.order(bar, -lot)
+                elif (account.position > 0 and sell[bar] < 0) or (account.position < 0 and buy[bar] > 0):
+                    account.order(bar, -account.position)
+
+            elif not account.position:
+                max_buy_position, max_sell_position = lot, lot
+                if rsi[bar] <= params.lowerband:
+                    max_buy_position = max(max_buy_position, lot * (1 + (params.lowerband - rsi[bar]) * params.size_multiplier))
+                    account.order(bar, max_buy_position)
+                elif rsi[bar] >= params.upperband:
+                    max_sell_position = max(max_sell_position, lot * (1 + (rsi[bar] - params.upperband) * params.size_multiplier))
+                    account.order(bar, -max_sell_position)
+
+            elif account.position > 0:
+                if rsi[bar] >= params.lower_unwind:
+                    account.order(bar, 0.0)
+                elif rsi[bar] <= params.lowerband:
+                    max_buy_position = max(max_buy_position, lot * (1 + (params.lowerband - rsi[bar]) * params.size_multiplier))
+                    account.order(bar, max_buy_position)
+
+            elif rsi[bar] <= params.upper_unwind:
+                account.order(bar, 0.0)
+            elif rsi[bar] >= params.upperband:
+                max_sell_position = max(max_sell_position, lot * (1 + (rsi[bar] - params.upperband) * params.size_multiplier))
+                account.order(bar, -max_sell_position)
+
+        return account.get_positions(), end
+
+
+ENGINES = {
+    MovingAveragesCrossover: MovingAveragesCrossoverEngine,
+    RSIPositionSizing: RSIPositionSizingEngine,
+}
+
+
+def get_engine(strategy):
+    try:
+        return ENGINES[strategy]
+    except KeyError:
+        raise ValueError(f'No vectorized engine for {strategy.__name__}')